@@ -0,0 +1,260 @@
+# admin_panel/analytics.py
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from delivery.models import UserProfile, Delivery
+from .models import DeliveryDailyRollup
+
+RIDER_TYPES = ['rider', 'both']
+CUSTOMER_TYPES = ['customer', 'both']
+PENDING_STATUSES = ['pending', 'assigned', 'picked_up', 'in_transit']
+
+TREND_GRANULARITIES = {
+    'day': TruncDate,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+MAX_TREND_DAYS = 366
+
+
+def analytics_timezone():
+    """Timezone that dashboard day buckets are computed in"""
+    return ZoneInfo(settings.ANALYTICS_TIME_ZONE)
+
+
+def local_day_bounds(day=None, tz=None):
+    """
+    Return the half-open [start, end) datetime range covering a local day.
+
+    Filtering on ``field__gte=start, field__lt=end`` keeps the predicate
+    sargable, unlike ``field__date=day`` which wraps the column in a cast.
+    """
+    tz = tz or analytics_timezone()
+    if day is None:
+        day = timezone.localtime(timezone.now(), tz).date()
+    start = timezone.make_aware(datetime.combine(day, time.min), tz)
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min), tz)
+    return start, end
+
+
+def profile_counts():
+    """User counts for the dashboards in one conditional aggregate"""
+    return UserProfile.objects.aggregate(
+        total_customers=Count('id', filter=Q(user_type__in=CUSTOMER_TYPES)),
+        total_drivers=Count('id', filter=Q(user_type__in=RIDER_TYPES)),
+        pending_riders=Count('id', filter=Q(user_type__in=RIDER_TYPES, status='pending_approval')),
+        active_drivers=Count('id', filter=Q(status='active', is_available=True)),
+    )
+
+
+def local_today(tz=None):
+    """Today's date in the analytics timezone (or ``tz``)"""
+    return timezone.localtime(timezone.now(), tz or analytics_timezone()).date()
+
+
+def dashboard_stats():
+    """
+    Admin dashboard statistics. Delivery and revenue figures come from the
+    daily rollup table, so the cost does not grow with delivery history.
+    """
+    today = local_today()
+    window_start = today - timedelta(days=29)
+
+    profiles = profile_counts()
+    rollup = DeliveryDailyRollup.objects.aggregate(
+        total_deliveries=Sum('created_count'),
+        pending_deliveries=Sum('created_count', filter=Q(status__in=PENDING_STATUSES)),
+        completed_deliveries_today=Sum('delivered_count', filter=Q(date=today)),
+        total_revenue_today=Sum('paid_total', filter=Q(date=today)),
+        total_deliveries_30_days=Sum('created_count', filter=Q(date__gte=window_start)),
+        successful_deliveries_30_days=Sum('created_count', filter=Q(date__gte=window_start, status='delivered')),
+        distance_km_today=Sum('distance_total', filter=Q(date=today)),
+        distance_km_30_days=Sum('distance_total', filter=Q(date__gte=window_start)),
+        measured_deliveries_30_days=Sum('measured_count', filter=Q(date__gte=window_start)),
+    )
+    rollup = {key: value or 0 for key, value in rollup.items()}
+
+    delivery_success_rate = 0
+    if rollup['total_deliveries_30_days'] > 0:
+        delivery_success_rate = (
+            rollup['successful_deliveries_30_days'] / rollup['total_deliveries_30_days']
+        ) * 100
+
+    average_distance_km = 0
+    if rollup['measured_deliveries_30_days'] > 0:
+        average_distance_km = rollup['distance_km_30_days'] / rollup['measured_deliveries_30_days']
+
+    return {
+        'total_customers': profiles['total_customers'],
+        'total_drivers': profiles['total_drivers'],
+        'pending_riders': profiles['pending_riders'],
+        'total_deliveries': rollup['total_deliveries'],
+        'pending_deliveries': rollup['pending_deliveries'],
+        'completed_deliveries_today': rollup['completed_deliveries_today'],
+        'total_revenue_today': float(rollup['total_revenue_today']),
+        'active_drivers': profiles['active_drivers'],
+        'delivery_success_rate': round(delivery_success_rate, 2),
+        'distance_km_today': float(rollup['distance_km_today']),
+        'average_distance_km_30_days': round(float(average_distance_km), 2),
+    }
+
+
+def rider_dashboard_stats(rider):
+    """
+    Job counts and today's completions for one rider. Riders poll this while
+    working, so it is a live COUNT over the (rider, status) index rather
+    than a read of the periodically refreshed rollups.
+    """
+    start, end = local_day_bounds()
+    return Delivery.objects.filter(rider=rider).filter(
+        Q(status__in=['assigned', 'in_transit']) |
+        Q(status='delivered', actual_delivery__gte=start, actual_delivery__lt=end)
+    ).aggregate(
+        assigned=Count('id', filter=Q(status='assigned')),
+        in_transit=Count('id', filter=Q(status='in_transit')),
+        delivered_today=Count('id', filter=Q(status='delivered')),
+    )
+
+
+def operations_dashboard_stats():
+    """Network-wide figures for the non-rider dashboard, from the rollups"""
+    profiles = UserProfile.objects.aggregate(
+        total_customers=Count('id', filter=Q(user_type='customer')),
+        total_riders=Count('id', filter=Q(user_type__in=RIDER_TYPES)),
+    )
+    rollup = DeliveryDailyRollup.objects.aggregate(
+        active_deliveries=Sum('created_count', filter=~Q(status__in=['delivered', 'cancelled'])),
+        revenue_today=Sum('paid_total', filter=Q(date=local_today())),
+    )
+    return {
+        **profiles,
+        'active_deliveries': rollup['active_deliveries'] or 0,
+        'revenue_today': rollup['revenue_today'] or 0,
+    }
+
+
+def driver_performance(limit=10):
+    """Riders with the most completed deliveries, from the rollups"""
+    rows = list(
+        DeliveryDailyRollup.objects.filter(rider__isnull=False)
+        .values('rider_id')
+        .annotate(
+            total_deliveries=Sum('created_count'),
+            completed_deliveries=Sum('created_count', filter=Q(status='delivered')),
+            pending_deliveries=Sum('created_count', filter=Q(status__in=PENDING_STATUSES)),
+            distance_km=Sum('distance_total', filter=Q(status='delivered')),
+        )
+        .order_by('-completed_deliveries')[:limit]
+    )
+    riders = UserProfile.objects.select_related('user').in_bulk([row['rider_id'] for row in rows])
+
+    driver_data = []
+    for row in rows:
+        driver = riders.get(row['rider_id'])
+        if driver is None:
+            continue
+        total = row['total_deliveries'] or 0
+        completed = row['completed_deliveries'] or 0
+        success_rate = (completed / total * 100) if total > 0 else 0
+        driver_data.append({
+            'id': driver.id,
+            'name': driver.user.get_full_name() or driver.user.username,
+            'total_deliveries': total,
+            'completed_deliveries': completed,
+            'pending_deliveries': row['pending_deliveries'] or 0,
+            'success_rate': round(success_rate, 2),
+            'distance_km': float(row['distance_km'] or 0),
+            'is_available': driver.is_available,
+        })
+    return driver_data
+
+
+def bucket_start(day, granularity):
+    """First day of the bucket that ``day`` falls into"""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(day, granularity):
+    """First day of the bucket following the one starting at ``day``"""
+    if granularity == 'week':
+        return day + timedelta(days=7)
+    if granularity == 'month':
+        return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+    return day + timedelta(days=1)
+
+
+def _grouped_counts(queryset, field, granularity, tz):
+    trunc = TREND_GRANULARITIES[granularity]
+    rows = queryset.annotate(
+        bucket=trunc(field, tzinfo=tz)
+    ).values('bucket').annotate(total=Count('id')).order_by()
+
+    counts = {}
+    for row in rows:
+        bucket = row['bucket']
+        if isinstance(bucket, datetime):
+            bucket = timezone.localtime(bucket, tz).date() if timezone.is_aware(bucket) else bucket.date()
+        counts[bucket] = counts.get(bucket, 0) + row['total']
+    return counts
+
+
+def _fill_trend_buckets(first_day, today, granularity, created, completed):
+    trend_data = []
+    bucket = bucket_start(first_day, granularity)
+    while bucket <= today:
+        trend_data.append({
+            'date': bucket.isoformat(),
+            'created': created.get(bucket, 0),
+            'completed': completed.get(bucket, 0),
+        })
+        bucket = next_bucket(bucket, granularity)
+    trend_data.reverse()
+    return trend_data
+
+
+def delivery_trends(days=30, granularity='day', tz=None):
+    """
+    Created/completed delivery counts for the last ``days`` local days,
+    newest bucket first, with empty buckets zero-filled.
+
+    Reads the daily rollups when bucketing in the analytics timezone; any
+    other timezone falls back to one GROUP BY per series on the raw table.
+    """
+    tz = tz or analytics_timezone()
+    today = local_today(tz)
+    first_day = today - timedelta(days=days - 1)
+
+    created = {}
+    completed = {}
+    if str(tz) == str(analytics_timezone()):
+        rows = DeliveryDailyRollup.objects.filter(
+            date__gte=first_day, date__lte=today
+        ).values('date').annotate(
+            created=Sum('created_count'), completed=Sum('delivered_count')
+        ).order_by()
+        for row in rows:
+            bucket = bucket_start(row['date'], granularity)
+            created[bucket] = created.get(bucket, 0) + (row['created'] or 0)
+            completed[bucket] = completed.get(bucket, 0) + (row['completed'] or 0)
+    else:
+        start, _ = local_day_bounds(first_day, tz)
+        _, end = local_day_bounds(today, tz)
+        created = _grouped_counts(
+            Delivery.objects.filter(created_at__gte=start, created_at__lt=end),
+            'created_at', granularity, tz,
+        )
+        completed = _grouped_counts(
+            Delivery.objects.filter(status='delivered', actual_delivery__gte=start, actual_delivery__lt=end),
+            'actual_delivery', granularity, tz,
+        )
+
+    return _fill_trend_buckets(first_day, today, granularity, created, completed)
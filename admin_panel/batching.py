@@ -0,0 +1,448 @@
+# admin_panel/batching.py
+import math
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from delivery.models import UserProfile, Delivery
+from delivery.transitions import CLAIM_ATTEMPTS, DeliveryTransitionError, assign_rider, on_open_run
+from .dispatch import SIZE_RANKS, VEHICLE_LIMITS
+from .models import AuditLog, DeliveryRoute
+from .routing import RoutePlan, distance_matrix, optimize_route, parse_waypoints
+
+# Two deliveries can share a run when their pickups, drop-offs and pickup
+# times are all this close
+PICKUP_RADIUS_KM = 1.0
+DROPOFF_RADIUS_KM = 3.0
+WINDOW_MINUTES = 60
+
+# Smallest group worth turning into a run
+MIN_BATCH_SIZE = 2
+MAX_BATCH_SIZE = 12
+
+# Load volume per vehicle, in cubic cm; weights come from VEHICLE_LIMITS
+VEHICLE_VOLUME_CM3 = {
+    'bicycle': 40_000,
+    'motorcycle': 120_000,
+    'car': 800_000,
+    'van': 5_000_000,
+    'truck': 20_000_000,
+}
+# Stand-in volume of packages without dimensions
+SIZE_VOLUME_CM3 = {'small': 2_000, 'medium': 15_000, 'large': 60_000, 'xlarge': 200_000}
+DEFAULT_VEHICLE_TYPE = 'motorcycle'
+
+KMEANS_ITERATIONS = 25
+
+
+def project_km(lats, lngs, origin_lat):
+    """Equirectangular (x, y) in km; accurate enough at city scale"""
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+    return np.column_stack([lngs * 111.320 * math.cos(math.radians(origin_lat)), lats * 110.574])
+
+
+def dbscan(features, cells, min_samples=MIN_BATCH_SIZE):
+    """
+    DBSCAN over pre-scaled features where neighbours are within 1.0 in
+    every feature (Chebyshev distance).
+
+    ``cells`` gives each point's integer grid cell, sized so that all of a
+    point's neighbours lie in the 3x3 block of cells around it; only those
+    are compared. Returns a label per point, -1 for noise.
+    """
+    buckets = {}
+    for index, cell in enumerate(map(tuple, cells)):
+        buckets.setdefault(cell, []).append(index)
+
+    def neighbours(index):
+        x, y = cells[index]
+        candidates = np.array([
+            other
+            for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+            for other in buckets.get((x + dx, y + dy), ())
+        ])
+        close = np.abs(features[candidates] - features[index]).max(axis=1) <= 1.0
+        return candidates[close]
+
+    labels = np.full(len(features), -1)
+    visited = np.zeros(len(features), dtype=bool)
+    cluster = 0
+    for index in range(len(features)):
+        if visited[index]:
+            continue
+        visited[index] = True
+        found = neighbours(index)
+        if len(found) < min_samples:
+            continue
+        labels[index] = cluster
+        queue = list(found)
+        while queue:
+            other = queue.pop()
+            if labels[other] == -1:
+                labels[other] = cluster
+            if visited[other]:
+                continue
+            visited[other] = True
+            more = neighbours(other)
+            if len(more) >= min_samples:
+                queue.extend(more[labels[more] == -1])
+        cluster += 1
+    return labels
+
+
+def kmeans(points, k, seed=0):
+    """Lloyd's k-means with k-means++ seeding; returns a label per point"""
+    points = np.asarray(points, dtype=float)
+    if k >= len(points):
+        return np.arange(len(points))
+    rng = np.random.default_rng(seed)
+    centres = [points[rng.integers(len(points))]]
+    for _ in range(1, k):
+        distances = np.min([((points - centre) ** 2).sum(axis=1) for centre in centres], axis=0)
+        total = distances.sum()
+        if total == 0:
+            centres.append(points[rng.integers(len(points))])
+        else:
+            centres.append(points[rng.choice(len(points), p=distances / total)])
+    centres = np.array(centres)
+
+    labels = np.full(len(points), -1)
+    for _ in range(KMEANS_ITERATIONS):
+        distances = ((points[:, None, :] - centres[None, :, :]) ** 2).sum(axis=2)
+        new_labels = distances.argmin(axis=1)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        for label in range(k):
+            members = points[labels == label]
+            if len(members):
+                centres[label] = members.mean(axis=0)
+    return labels
+
+
+def package_volume(package):
+    volume = package.volume
+    if volume:
+        return float(volume)
+    return SIZE_VOLUME_CM3.get(package.size_category, SIZE_VOLUME_CM3['medium'])
+
+
+def vehicle_capacity(vehicle_type):
+    """(max weight kg, max volume cm3, largest size category) a vehicle carries"""
+    max_weight, largest_size = VEHICLE_LIMITS[vehicle_type]
+    return float(max_weight), float(VEHICLE_VOLUME_CM3[vehicle_type]), largest_size
+
+
+def split_by_capacity(members, weights, volumes, dropoffs, max_weight, max_volume):
+    """
+    Split one cluster into groups a single vehicle can carry.
+
+    The number of groups comes from the load; k-means on the drop-off
+    positions keeps each group geographically tight, and any group still
+    over capacity is cut greedily in pickup-time order.
+    """
+    members = np.asarray(members)
+    k = max(
+        math.ceil(weights[members].sum() / max_weight),
+        math.ceil(volumes[members].sum() / max_volume),
+        math.ceil(len(members) / MAX_BATCH_SIZE),
+        1,
+    )
+    labels = kmeans(dropoffs[members], k) if k > 1 else np.zeros(len(members), dtype=int)
+
+    groups = []
+    for label in np.unique(labels):
+        group, weight, volume = [], 0.0, 0.0
+        for index in members[labels == label]:
+            full = (
+                weight + weights[index] > max_weight
+                or volume + volumes[index] > max_volume
+                or len(group) >= MAX_BATCH_SIZE
+            )
+            if full and group:
+                groups.append(group)
+                group, weight, volume = [], 0.0, 0.0
+            group.append(int(index))
+            weight += weights[index]
+            volume += volumes[index]
+        groups.append(group)
+    return groups
+
+
+def batchable_deliveries(limit=500):
+    """Unassigned pending deliveries with coordinates that are not already on an open run"""
+    return list(
+        Delivery.objects.filter(
+            status='pending',
+            rider__isnull=True,
+            pickup_latitude__isnull=False,
+            pickup_longitude__isnull=False,
+            delivery_latitude__isnull=False,
+            delivery_longitude__isnull=False,
+        )
+        .exclude(on_open_run())
+        .select_related('package')
+        .order_by('estimated_pickup', 'id')[:limit]
+    )
+
+
+def fleet_vehicle_type():
+    """The most common vehicle among active, available riders"""
+    row = (
+        UserProfile.objects.filter(user_type__in=['rider', 'both'], status='active', is_available=True)
+        .exclude(vehicle_type='none')
+        .values('vehicle_type')
+        .annotate(riders=Count('id'))
+        .order_by('-riders', 'vehicle_type')
+        .first()
+    )
+    return row['vehicle_type'] if row else DEFAULT_VEHICLE_TYPE
+
+
+def plan_batches(deliveries, vehicle_type, pickup_radius_km=PICKUP_RADIUS_KM,
+                 dropoff_radius_km=DROPOFF_RADIUS_KM, window_minutes=WINDOW_MINUTES):
+    """
+    Group deliveries into runs one vehicle of ``vehicle_type`` can serve.
+
+    Deliveries are bucketed on a pickup grid, clustered DBSCAN-style on
+    pickup position, drop-off position and pickup time, then split to fit
+    the vehicle. Returns lists of deliveries; singletons are left out.
+    """
+    max_weight, max_volume, largest_size = vehicle_capacity(vehicle_type)
+    deliveries = [
+        delivery for delivery in deliveries
+        if float(delivery.package.weight) <= max_weight
+        and SIZE_RANKS.get(delivery.package.size_category, 1) <= SIZE_RANKS[largest_size]
+        and package_volume(delivery.package) <= max_volume
+    ]
+    if len(deliveries) < MIN_BATCH_SIZE:
+        return []
+
+    origin_lat = float(np.mean([float(delivery.pickup_latitude) for delivery in deliveries]))
+    pickups = project_km(
+        [delivery.pickup_latitude for delivery in deliveries],
+        [delivery.pickup_longitude for delivery in deliveries],
+        origin_lat,
+    )
+    dropoffs = project_km(
+        [delivery.delivery_latitude for delivery in deliveries],
+        [delivery.delivery_longitude for delivery in deliveries],
+        origin_lat,
+    )
+    start = min(delivery.estimated_pickup for delivery in deliveries)
+    minutes = np.array([(delivery.estimated_pickup - start).total_seconds() / 60 for delivery in deliveries])
+
+    features = np.column_stack([
+        pickups / pickup_radius_km,
+        dropoffs / dropoff_radius_km,
+        minutes / window_minutes,
+    ])
+    # Pickup cells one radius wide hold every neighbour within the 3x3 block
+    cells = np.floor(pickups / pickup_radius_km).astype(int)
+    labels = dbscan(features, cells)
+
+    weights = np.array([float(delivery.package.weight) for delivery in deliveries])
+    volumes = np.array([package_volume(delivery.package) for delivery in deliveries])
+    batches = []
+    for label in np.unique(labels[labels >= 0]):
+        members = np.flatnonzero(labels == label)
+        for group in split_by_capacity(members, weights, volumes, dropoffs, max_weight, max_volume):
+            if len(group) >= MIN_BATCH_SIZE:
+                batches.append([deliveries[index] for index in group])
+    return batches
+
+
+def _stop(delivery, kind):
+    if kind == 'pickup':
+        lat, lng, address = delivery.pickup_latitude, delivery.pickup_longitude, delivery.pickup_address
+    else:
+        lat, lng, address = delivery.delivery_latitude, delivery.delivery_longitude, delivery.delivery_address
+    stop = {
+        'kind': kind,
+        'delivery_id': delivery.id,
+        'tracking_number': delivery.tracking_number,
+        'address': address,
+        'latitude': float(lat),
+        'longitude': float(lng),
+    }
+    if kind == 'dropoff':
+        stop['window_end'] = delivery.estimated_delivery.isoformat()
+    return stop
+
+
+def order_batch(deliveries, start_time):
+    """
+    Ordered waypoints for one run: every pickup, then every drop-off.
+
+    Pickups are sequenced as an open path ending nearest the drop-offs;
+    drop-offs are then optimized from the last pickup, honouring each
+    delivery's estimated delivery time as a window.
+    """
+    pickups = [_stop(delivery, 'pickup') for delivery in deliveries]
+    dropoffs = [_stop(delivery, 'dropoff') for delivery in deliveries]
+
+    lats, lngs, _, _, _ = parse_waypoints(pickups, start_time)
+    pickup_order = optimize_route(RoutePlan(distance_matrix(lats, lngs)))
+    centre = np.mean([[stop['latitude'], stop['longitude']] for stop in dropoffs], axis=0)
+    first, last = pickups[pickup_order[0]], pickups[pickup_order[-1]]
+    if (np.hypot(first['latitude'] - centre[0], first['longitude'] - centre[1])
+            < np.hypot(last['latitude'] - centre[0], last['longitude'] - centre[1])):
+        pickup_order.reverse()
+    pickups = [pickups[index] for index in pickup_order]
+
+    # Drop-offs are routed with the last pickup pinned as the start
+    legs = [pickups[-1]] + dropoffs
+    lats, lngs, opens, closes, service = parse_waypoints(legs, start_time)
+    dropoff_order = optimize_route(RoutePlan(distance_matrix(lats, lngs), opens, closes, service), start=0)
+    waypoints = pickups + [legs[index] for index in dropoff_order[1:]]
+
+    lats, lngs, opens, closes, service = parse_waypoints(waypoints, start_time)
+    plan = RoutePlan(distance_matrix(lats, lngs), opens, closes, service)
+    order = list(range(len(waypoints)))
+    duration, _, _ = plan.schedule(order)
+    return waypoints, plan.length(order), int(math.ceil(duration))
+
+
+def run_batching(user, vehicle_type=None, limit=500, dry_run=False, **radii):
+    """
+    Cluster pending deliveries into multi-stop runs and save each as a
+    DeliveryRoute linked to its deliveries.
+
+    ``radii`` may override pickup_radius_km, dropoff_radius_km and
+    window_minutes.
+    """
+    vehicle_type = vehicle_type or fleet_vehicle_type()
+    if vehicle_type not in VEHICLE_LIMITS:
+        raise ValueError(f'Unknown vehicle type {vehicle_type}')
+
+    deliveries = batchable_deliveries(limit)
+    batches = plan_batches(deliveries, vehicle_type, **radii)
+    now = timezone.now()
+
+    result = {'vehicle_type': vehicle_type, 'pending': len(deliveries), 'routes': []}
+    planned = []
+    for number, batch in enumerate(batches, start=1):
+        waypoints, distance, duration = order_batch(batch, now)
+        planned.append((batch, waypoints, distance, duration))
+        result['routes'].append({
+            'name': f"Run {now:%Y-%m-%d %H:%M} #{number}",
+            'deliveries': [delivery.id for delivery in batch],
+            'estimated_distance': round(distance, 2),
+            'estimated_duration': duration,
+        })
+    result['batched'] = sum(len(route['deliveries']) for route in result['routes'])
+    if dry_run or not planned:
+        return result
+
+    with transaction.atomic():
+        for summary, (batch, waypoints, distance, duration) in zip(result['routes'], planned):
+            route = DeliveryRoute.objects.create(
+                name=summary['name'],
+                description=f"{len(batch)} deliveries batched for a {vehicle_type}",
+                waypoints=waypoints,
+                estimated_distance=round(distance, 2),
+                estimated_duration=duration,
+                is_optimized=True,
+                priority=max(delivery.priority for delivery in batch),
+                vehicle_type=vehicle_type,
+                created_by=user,
+            )
+            route.deliveries.set(batch)
+            summary['id'] = route.id
+        AuditLog.objects.bulk_create([
+            AuditLog(
+                user=user,
+                action='create',
+                model_name='DeliveryRoute',
+                object_id=str(summary['id']),
+                details={'action': 'batch', 'deliveries': summary['deliveries'], 'vehicle_type': vehicle_type},
+            )
+            for summary in result['routes']
+        ])
+    return result
+
+
+def route_fits(deliveries, vehicle_type):
+    """Whether one vehicle of ``vehicle_type`` carries every delivery at once"""
+    if vehicle_type not in VEHICLE_LIMITS:
+        return False
+    max_weight, max_volume, largest_size = vehicle_capacity(vehicle_type)
+    return (
+        sum(float(delivery.package.weight) for delivery in deliveries) <= max_weight
+        and sum(package_volume(delivery.package) for delivery in deliveries) <= max_volume
+        and all(
+            SIZE_RANKS.get(delivery.package.size_category, 1) <= SIZE_RANKS[largest_size]
+            for delivery in deliveries
+        )
+    )
+
+
+def _hand_over(route, rider, user, notes):
+    """Assign every delivery on a locked route to ``rider``, or none of them"""
+    deliveries = list(route.deliveries.select_related('package').order_by('id'))
+    if not deliveries:
+        raise DeliveryTransitionError('Route has no deliveries')
+    if not route_fits(deliveries, rider.vehicle_type):
+        raise DeliveryTransitionError(f'Route does not fit on a {rider.get_vehicle_type_display().lower()}')
+    for delivery in deliveries:
+        assign_rider(delivery.pk, rider, user, notes=notes, only_if_unassigned=True)
+    route.rider = rider
+    route.assigned_at = timezone.now()
+    route.save(update_fields=['rider', 'assigned_at', 'updated_at'])
+    return route
+
+
+def assign_route(route_id, rider, user):
+    """
+    Give a whole open run to ``rider``.
+
+    The route row is locked first so two dispatchers cannot hand the same
+    run out twice; if any stop was meanwhile assigned on its own, nothing
+    is assigned.
+    """
+    with transaction.atomic():
+        try:
+            route = DeliveryRoute.objects.select_for_update().get(pk=route_id)
+        except DeliveryRoute.DoesNotExist:
+            raise DeliveryTransitionError('Route not found')
+        if not route.is_active:
+            raise DeliveryTransitionError('Route is not active')
+        if route.rider_id is not None:
+            raise DeliveryTransitionError('Route already has a rider')
+        return _hand_over(route, rider, user, notes=f'Assigned with {route.name}')
+
+
+def claim_next_route(rider, user):
+    """
+    Assign the most urgent open run that fits ``rider``'s vehicle.
+
+    Like claim_next_delivery, routes are locked with SKIP LOCKED so riders
+    claiming together take different runs. A run whose stops were already
+    taken one by one is closed, which releases its remaining deliveries to
+    single dispatch. Returns None when no run is open.
+    """
+    if rider.vehicle_type not in VEHICLE_LIMITS:
+        return None
+    max_weight = VEHICLE_LIMITS[rider.vehicle_type][0]
+    vehicle_types = [vehicle for vehicle, (weight, _) in VEHICLE_LIMITS.items() if weight <= max_weight]
+
+    for _ in range(CLAIM_ATTEMPTS):
+        with transaction.atomic():
+            route = (
+                DeliveryRoute.objects.select_for_update(skip_locked=True)
+                .filter(is_active=True, rider__isnull=True, vehicle_type__in=vehicle_types)
+                .order_by('-priority', 'created_at', 'id')
+                .first()
+            )
+            if route is None:
+                return None
+            try:
+                with transaction.atomic():
+                    return _hand_over(route, rider, user, notes=f'Claimed with {route.name}')
+            except DeliveryTransitionError:
+                route.is_active = False
+                route.save(update_fields=['is_active', 'updated_at'])
+    return None
@@ -0,0 +1,273 @@
+# admin_panel/dispatch.py
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+import numpy as np
+
+from delivery.geo import haversine_km
+from delivery.models import UserProfile, Delivery
+from delivery.rider_locations import LOCATION_MAX_AGE
+from delivery.transitions import RIDER_STATUSES, DeliveryTransitionError, assign_rider, on_open_run
+from .models import AuditLog
+
+RIDER_TYPES = ['rider', 'both']
+# Every status in which a rider is holding the delivery
+ACTIVE_JOB_STATUSES = sorted(RIDER_STATUSES - {'delivered'})
+
+# Pairs at or above this cost are never assigned
+INFEASIBLE = 1e9
+
+# Riders further than this from a pickup are not considered for it
+MAX_PICKUP_KM = 15
+# Stand-in distance for deliveries without pickup coordinates
+UNKNOWN_PICKUP_KM = 10
+
+# Costs are expressed in km of pickup distance; higher priorities and
+# better rated riders "shorten" the trip so they win close calls
+PRIORITY_BONUS_KM = {1: 0, 2: 2, 3: 5, 4: 8}
+RATING_BONUS_KM = 0.5
+# Per size step by which a vehicle is larger than the package needs
+OVERSIZED_VEHICLE_KM = 0.75
+
+SIZE_RANKS = {'small': 0, 'medium': 1, 'large': 2, 'xlarge': 3}
+VEHICLE_LIMITS = {
+    # vehicle: (max weight in kg, largest size category)
+    'bicycle': (5, 'medium'),
+    'motorcycle': (20, 'large'),
+    'car': (100, 'xlarge'),
+    'van': (500, 'xlarge'),
+    'truck': (2000, 'xlarge'),
+}
+
+# The Hungarian solver is O(n^2 m); beyond this many rows or columns the
+# greedy pass is used instead
+HUNGARIAN_MAX_SIZE = 400
+
+
+def hungarian_assignment(cost):
+    """
+    Minimum-cost assignment of a rectangular cost matrix.
+
+    Shortest augmenting path with row/column potentials (Kuhn-Munkres in
+    its O(n^2 m) form), with the inner column scans vectorised. Returns
+    (row, col) pairs sorted by row; every row of the smaller dimension
+    is matched.
+    """
+    cost = np.asarray(cost, dtype=float)
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+    if n == 0:
+        return []
+
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    match = np.zeros(m + 1, dtype=int)  # 1-based row matched to each column
+    way = np.zeros(m + 1, dtype=int)
+
+    for row in range(1, n + 1):
+        match[0] = row
+        col = 0
+        min_slack = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[col] = True
+            current_row = match[col]
+            free = ~used[1:]
+            slack = cost[current_row - 1] - u[current_row] - v[1:]
+
+            improved = free & (slack < min_slack[1:])
+            min_slack[1:][improved] = slack[improved]
+            way[1:][improved] = col
+
+            candidates = np.where(free, min_slack[1:], np.inf)
+            next_col = int(np.argmin(candidates)) + 1
+            delta = candidates[next_col - 1]
+
+            used_cols = np.flatnonzero(used)
+            u[match[used_cols]] += delta
+            v[used_cols] -= delta
+            min_slack[1:][free] -= delta
+
+            col = next_col
+            if match[col] == 0:
+                break
+
+        while col:
+            previous = way[col]
+            match[col] = match[previous]
+            col = previous
+
+    pairs = [(match[col] - 1, col - 1) for col in range(1, m + 1) if match[col]]
+    if transposed:
+        pairs = [(col, row) for row, col in pairs]
+    return sorted(pairs)
+
+
+def greedy_assignment(cost):
+    """Cheapest-pair-first assignment, for matrices too large for the exact solver"""
+    cost = np.asarray(cost, dtype=float)
+    if cost.size == 0:
+        return []
+    rows_used = np.zeros(cost.shape[0], dtype=bool)
+    cols_used = np.zeros(cost.shape[1], dtype=bool)
+    pairs = []
+    limit = min(cost.shape)
+    for index in np.argsort(cost, axis=None, kind='stable'):
+        row, col = divmod(int(index), cost.shape[1])
+        if cost[row, col] >= INFEASIBLE:
+            break
+        if rows_used[row] or cols_used[col]:
+            continue
+        rows_used[row] = cols_used[col] = True
+        pairs.append((row, col))
+        if len(pairs) == limit:
+            break
+    return sorted(pairs)
+
+
+def dispatchable_riders(max_active_jobs=1):
+    """
+    Riders that pass ``can_make_deliveries`` and ``is_online``, reported
+    their position within ``LOCATION_MAX_AGE`` and have fewer than
+    ``max_active_jobs`` jobs in hand.
+    """
+    riders = UserProfile.objects.filter(
+        user_type__in=RIDER_TYPES,
+        status='active',
+        is_available=True,
+        current_latitude__isnull=False,
+        current_longitude__isnull=False,
+        last_location_update__gte=timezone.now() - LOCATION_MAX_AGE,
+    ).exclude(
+        Q(license_number__isnull=True) | Q(license_number='') |
+        Q(vehicle_plate__isnull=True) | Q(vehicle_plate='') |
+        Q(identity_number__isnull=True) | Q(identity_number='')
+    ).annotate(
+        active_jobs=Count('assigned_deliveries', filter=Q(assigned_deliveries__status__in=ACTIVE_JOB_STATUSES))
+    ).filter(active_jobs__lt=max_active_jobs).select_related('user')
+    return [rider for rider in riders if rider.is_online]
+
+
+def pending_deliveries(limit=500):
+    """Unassigned pending deliveries, most urgent first; open runs are assigned whole"""
+    return list(
+        Delivery.objects.filter(status='pending', rider__isnull=True)
+        .exclude(on_open_run())
+        .select_related('package')
+        .order_by('-priority', 'estimated_pickup', 'id')[:limit]
+    )
+
+
+def build_cost_matrix(deliveries, riders):
+    """(deliveries x riders) cost matrix in km-equivalents; INFEASIBLE marks impossible pairs"""
+    if not deliveries or not riders:
+        return np.zeros((len(deliveries), len(riders)))
+
+    rider_lats = np.array([float(rider.current_latitude) for rider in riders])
+    rider_lngs = np.array([float(rider.current_longitude) for rider in riders])
+    rider_ratings = np.array([float(rider.rating) for rider in riders])
+    limits = [VEHICLE_LIMITS.get(rider.vehicle_type, (0, 'small')) for rider in riders]
+    max_weights = np.array([limit[0] for limit in limits], dtype=float)
+    max_sizes = np.array([SIZE_RANKS[limit[1]] for limit in limits])
+
+    cost = np.empty((len(deliveries), len(riders)))
+    for index, delivery in enumerate(deliveries):
+        if delivery.pickup_latitude is not None and delivery.pickup_longitude is not None:
+            distance = haversine_km(
+                float(delivery.pickup_latitude), float(delivery.pickup_longitude), rider_lats, rider_lngs
+            )
+        else:
+            distance = np.full(len(riders), float(UNKNOWN_PICKUP_KM))
+
+        size = SIZE_RANKS.get(delivery.package.size_category, 1)
+        row = (
+            distance
+            - PRIORITY_BONUS_KM.get(delivery.priority, 0)
+            - RATING_BONUS_KM * rider_ratings
+            + OVERSIZED_VEHICLE_KM * np.maximum(max_sizes - size, 0)
+        )
+        infeasible = (
+            (distance > MAX_PICKUP_KM)
+            | (max_weights < float(delivery.package.weight))
+            | (max_sizes < size)
+        )
+        row[infeasible] = INFEASIBLE
+        cost[index] = row
+    return cost
+
+
+def plan_dispatch(deliveries, riders, solver=None):
+    """
+    Match deliveries to riders in one pass.
+
+    Returns ``(pairs, solver)`` where pairs are (delivery, rider, cost)
+    tuples. The exact solver is used unless the batch is too large.
+    """
+    cost = build_cost_matrix(deliveries, riders)
+    if solver is None:
+        solver = 'hungarian' if max(cost.shape, default=0) <= HUNGARIAN_MAX_SIZE else 'greedy'
+    assign = hungarian_assignment if solver == 'hungarian' else greedy_assignment
+
+    pairs = [
+        (deliveries[row], riders[col], float(cost[row, col]))
+        for row, col in assign(cost)
+        if cost[row, col] < INFEASIBLE
+    ]
+    return pairs, solver
+
+
+def run_dispatch(user=None, batch_size=500, max_active_jobs=1, solver=None, dry_run=False):
+    """
+    Assign pending deliveries to available riders and commit the batch.
+
+    Assignments go through the delivery state machine and refuse rows
+    that gained a rider since planning, so concurrent changes are skipped
+    rather than overwritten. All assignments, status updates and audit
+    entries of a batch commit together.
+    """
+    deliveries = pending_deliveries(batch_size)
+    riders = dispatchable_riders(max_active_jobs)
+    pairs, solver = plan_dispatch(deliveries, riders, solver)
+
+    result = {
+        'solver': solver,
+        'pending': len(deliveries),
+        'riders': len(riders),
+        'assignments': [],
+        'skipped': 0,
+    }
+    if dry_run or not pairs:
+        result['assignments'] = [
+            {'delivery_id': delivery.id, 'tracking_number': delivery.tracking_number,
+             'rider_id': rider.id, 'cost': round(cost, 3)}
+            for delivery, rider, cost in pairs
+        ]
+        return result
+
+    audit_entries = []
+    with transaction.atomic():
+        for delivery, rider, cost in pairs:
+            try:
+                assign_rider(delivery.pk, rider, user, notes='Auto-dispatched', only_if_unassigned=True)
+            except DeliveryTransitionError:
+                # Changed by someone else since planning
+                result['skipped'] += 1
+                continue
+
+            audit_entries.append(AuditLog(
+                user=user,
+                action='update',
+                model_name='Delivery',
+                object_id=str(delivery.id),
+                details={'action': 'auto_dispatch', 'rider_id': rider.id, 'cost': round(cost, 3), 'solver': solver}
+            ))
+            result['assignments'].append({
+                'delivery_id': delivery.id, 'tracking_number': delivery.tracking_number,
+                'rider_id': rider.id, 'cost': round(cost, 3),
+            })
+
+        AuditLog.objects.bulk_create(audit_entries)
+
+    return result
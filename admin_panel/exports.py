@@ -0,0 +1,298 @@
+# admin_panel/exports.py
+"""
+Exports of deliveries, payments and audit logs as CSV, JSON Lines or XLSX.
+
+Rows are read as ``values_list()`` tuples through ``.iterator()``, which
+uses a server-side cursor on PostgreSQL, and written out as they arrive,
+so memory stays flat however many rows an export holds. CSV and JSONL are
+streamed straight to the client. XLSX is written with xlsxwriter's
+constant_memory mode to a temporary file first, because the zip container
+can only be finished once every row is in, and then streamed from disk.
+Large ranges can run as ExportJobs instead (see ``run_export_job``).
+
+Under ASGI a plain generator would be drained into a list before the
+first byte is sent, so there the chunks are pulled one at a time through
+``sync_to_async`` (see ``async_chunks``).
+"""
+import csv
+import json
+import tempfile
+from datetime import datetime
+from decimal import Decimal
+
+import xlsxwriter
+from asgiref.sync import sync_to_async
+from django.core.files import File
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from delivery.models import Delivery, Payment
+from .filters import filter_audit_logs, filter_deliveries, filter_payments
+from .models import AuditLog, ExportJob
+
+EXPORT_CHUNK_SIZE = 2000
+# Rows written per chunk of a streamed CSV/JSONL response
+STREAM_BATCH_ROWS = 500
+# Data rows per XLSX sheet; larger exports continue on a new sheet
+XLSX_MAX_ROWS = 1048575
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# (column header, values() path) per dataset
+DATASET_COLUMNS = {
+    'deliveries': (
+        ('id', 'id'),
+        ('tracking_number', 'tracking_number'),
+        ('status', 'status'),
+        ('priority', 'priority'),
+        ('sender', 'sender__user__username'),
+        ('recipient_name', 'recipient_name'),
+        ('recipient_phone', 'recipient_phone'),
+        ('rider', 'rider__user__username'),
+        ('pickup_address', 'pickup_address'),
+        ('delivery_address', 'delivery_address'),
+        ('package', 'package__description'),
+        ('weight_kg', 'package__weight'),
+        ('delivery_fee', 'delivery_fee'),
+        ('distance_km', 'distance_km'),
+        ('estimated_duration_minutes', 'estimated_duration_minutes'),
+        ('payment_method', 'payment__payment_method'),
+        ('payment_status', 'payment__status'),
+        ('cod_amount', 'payment__cod_amount'),
+        ('estimated_pickup', 'estimated_pickup'),
+        ('estimated_delivery', 'estimated_delivery'),
+        ('actual_pickup', 'actual_pickup'),
+        ('actual_delivery', 'actual_delivery'),
+        ('cancelled_at', 'cancelled_at'),
+        ('created_at', 'created_at'),
+    ),
+    'payments': (
+        ('id', 'id'),
+        ('tracking_number', 'delivery__tracking_number'),
+        ('customer', 'delivery__sender__user__username'),
+        ('amount', 'amount'),
+        ('currency', 'currency'),
+        ('payment_method', 'payment_method'),
+        ('status', 'status'),
+        ('transaction_id', 'transaction_id'),
+        ('gateway_reference', 'gateway_reference'),
+        ('cod_amount', 'cod_amount'),
+        ('cod_collected', 'cod_collected'),
+        ('paid_at', 'paid_at'),
+        ('refunded_at', 'refunded_at'),
+        ('created_at', 'created_at'),
+    ),
+    'audit_logs': (
+        ('id', 'id'),
+        ('timestamp', 'timestamp'),
+        ('user', 'user__username'),
+        ('action', 'action'),
+        ('model_name', 'model_name'),
+        ('object_id', 'object_id'),
+        ('details', 'details'),
+        ('ip_address', 'ip_address'),
+    ),
+}
+
+DATASET_QUERYSETS = {
+    'deliveries': lambda params: filter_deliveries(Delivery.objects.all(), params),
+    'payments': lambda params: filter_payments(Payment.objects.all(), params),
+    'audit_logs': lambda params: filter_audit_logs(AuditLog.objects.all(), params),
+}
+
+# Admin permission needed to export each dataset, matching the list it comes from
+DATASET_PERMISSIONS = {
+    'deliveries': 'manage_deliveries',
+    'payments': 'manage_deliveries',
+    'audit_logs': 'view_reports',
+}
+
+
+class ExportError(ValueError):
+    pass
+
+
+def validate_export(dataset, export_format):
+    if dataset not in DATASET_COLUMNS:
+        raise ExportError(f'dataset must be one of {", ".join(DATASET_COLUMNS)}')
+    if export_format not in CONTENT_TYPES:
+        raise ExportError(f'type must be one of {", ".join(CONTENT_TYPES)}')
+
+
+def export_rows(dataset, params):
+    """Column headers and an iterator over the matching rows, oldest first"""
+    columns = DATASET_COLUMNS[dataset]
+    rows = (
+        DATASET_QUERYSETS[dataset](params)
+        .order_by('id')
+        .values_list(*[path for _, path in columns])
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    return [header for header, _ in columns], rows
+
+
+def _text_cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return timezone.localtime(value).isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, cls=DjangoJSONEncoder)
+    return value
+
+
+def _xlsx_cell(value):
+    if isinstance(value, datetime):
+        # xlsx has no time zones; write local wall-clock time
+        return timezone.localtime(value).replace(tzinfo=None)
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, cls=DjangoJSONEncoder)
+    return value
+
+
+class _Echo:
+    """File-like object whose write() hands back the line for the generator to yield"""
+
+    def write(self, value):
+        return value
+
+
+def csv_chunks(headers, rows):
+    writer = csv.writer(_Echo())
+    chunk = [writer.writerow(headers)]
+    for row in rows:
+        chunk.append(writer.writerow([_text_cell(value) for value in row]))
+        if len(chunk) >= STREAM_BATCH_ROWS:
+            yield ''.join(chunk)
+            chunk = []
+    yield ''.join(chunk)
+
+
+def jsonl_chunks(headers, rows):
+    chunk = []
+    for row in rows:
+        chunk.append(json.dumps(dict(zip(headers, row)), cls=DjangoJSONEncoder) + '\n')
+        if len(chunk) >= STREAM_BATCH_ROWS:
+            yield ''.join(chunk)
+            chunk = []
+    yield ''.join(chunk)
+
+
+async def async_chunks(chunks):
+    """
+    Hand a sync chunk generator to an ASGI response one chunk at a time.
+
+    Each chunk is produced on the thread-sensitive executor, the thread the
+    view ran on, so the rows' server-side cursor stays on its connection.
+    """
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    try:
+        while True:
+            chunk = await next_chunk(chunks, None)
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        # Closes the cursor if the client went away part way through
+        await sync_to_async(chunks.close, thread_sensitive=True)()
+
+
+def write_xlsx(headers, rows, file):
+    """Write rows to ``file`` as a workbook, holding only one row in memory at a time"""
+    workbook = xlsxwriter.Workbook(file, {
+        'constant_memory': True,
+        'default_date_format': 'yyyy-mm-dd hh:mm:ss',
+        'strings_to_numbers': False,
+        'strings_to_formulas': False,
+    })
+    bold = workbook.add_format({'bold': True})
+    sheet, row_index = None, XLSX_MAX_ROWS
+    for row in rows:
+        if row_index >= XLSX_MAX_ROWS:
+            sheet = workbook.add_worksheet()
+            sheet.write_row(0, 0, headers, bold)
+            row_index = 0
+        row_index += 1
+        sheet.write_row(row_index, 0, [_xlsx_cell(value) for value in row])
+    if sheet is None:
+        workbook.add_worksheet().write_row(0, 0, headers, bold)
+    workbook.close()
+
+
+def export_filename(dataset, export_format):
+    return f"{dataset}-{timezone.localtime().strftime('%Y%m%d-%H%M%S')}.{export_format}"
+
+
+def export_response(dataset, export_format, params, asynchronous=False):
+    """
+    Download response for an export, streamed as rows are read. Pass
+    ``asynchronous`` when the request is served through ASGI.
+    """
+    validate_export(dataset, export_format)
+    headers, rows = export_rows(dataset, params)
+    filename = export_filename(dataset, export_format)
+
+    if export_format == 'xlsx':
+        file = tempfile.TemporaryFile()
+        write_xlsx(headers, rows, file)
+        file.seek(0)
+        # FileResponse streams the file in blocks and closes (deletes) it afterwards
+        return FileResponse(file, as_attachment=True, filename=filename, content_type=CONTENT_TYPES['xlsx'])
+
+    chunks = csv_chunks(headers, rows) if export_format == 'csv' else jsonl_chunks(headers, rows)
+    if asynchronous:
+        chunks = async_chunks(chunks)
+    response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+class _Counted:
+    def __init__(self, rows):
+        self.rows = rows
+        self.count = 0
+
+    def __iter__(self):
+        for row in self.rows:
+            self.count += 1
+            yield row
+
+
+def claim_export_job(job_id):
+    """Mark a pending job as running; False if another worker got it first"""
+    return bool(ExportJob.objects.filter(pk=job_id, status='pending').update(
+        status='running', started_at=timezone.now()
+    ))
+
+
+def run_export_job(job):
+    """Write a claimed job's export to its file; failures are recorded on the job"""
+    try:
+        validate_export(job.dataset, job.export_format)
+        headers, rows = export_rows(job.dataset, job.params)
+        rows = _Counted(rows)
+        with tempfile.TemporaryFile() as file:
+            if job.export_format == 'xlsx':
+                write_xlsx(headers, rows, file)
+            else:
+                chunks = csv_chunks if job.export_format == 'csv' else jsonl_chunks
+                for chunk in chunks(headers, rows):
+                    file.write(chunk.encode())
+            file.seek(0)
+            job.file.save(export_filename(job.dataset, job.export_format), File(file), save=False)
+    except Exception as e:
+        job.status = 'failed'
+        job.error = str(e)
+    else:
+        job.status = 'completed'
+        job.row_count = rows.count
+    job.completed_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'file', 'row_count', 'completed_at'])
+    return job
@@ -0,0 +1,75 @@
+# admin_panel/filters.py
+"""
+Query-parameter filters shared by the admin list endpoints and exports,
+so an export of a filtered list holds exactly the rows the list shows.
+``params`` is any mapping of query parameters (request.query_params or the
+params stored on an ExportJob).
+"""
+from datetime import datetime
+
+from django.db.models import Q
+
+from delivery.search import search_deliveries
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def _filter_date_range(queryset, params, field):
+    start_date = _parse_date(params.get('start_date'))
+    if start_date:
+        queryset = queryset.filter(**{f'{field}__date__gte': start_date})
+    end_date = _parse_date(params.get('end_date'))
+    if end_date:
+        queryset = queryset.filter(**{f'{field}__date__lte': end_date})
+    return queryset
+
+
+def filter_deliveries(queryset, params):
+    search = params.get('search')
+    if search:
+        queryset = search_deliveries(queryset, search)
+
+    status = params.get('status')
+    if status:
+        queryset = queryset.filter(status=status)
+
+    priority = params.get('priority')
+    if priority:
+        queryset = queryset.filter(priority=priority)
+
+    return queryset
+
+
+def filter_audit_logs(queryset, params):
+    user_id = params.get('user_id')
+    if user_id:
+        queryset = queryset.filter(user_id=user_id)
+
+    action = params.get('action')
+    if action:
+        queryset = queryset.filter(action=action)
+
+    return _filter_date_range(queryset, params, 'timestamp')
+
+
+def filter_payments(queryset, params):
+    search = params.get('search')
+    if search:
+        queryset = queryset.filter(
+            Q(delivery__tracking_number__icontains=search) | Q(transaction_id__icontains=search)
+        )
+
+    status = params.get('status')
+    if status:
+        queryset = queryset.filter(status=status)
+
+    payment_method = params.get('payment_method')
+    if payment_method:
+        queryset = queryset.filter(payment_method=payment_method)
+
+    return _filter_date_range(queryset, params, 'created_at')
@@ -0,0 +1,32 @@
+# admin_panel/management/commands/backfill_phone_numbers.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from delivery.models import UserProfile
+from delivery.phones import backfill_phone_e164
+
+
+class Command(BaseCommand):
+    help = 'Fill UserProfile.phone_e164 from phone for existing profiles, in pk chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Profiles normalized and written per transaction')
+        parser.add_argument('--start-after', type=int, default=0,
+                            help='Resume after this profile id (printed by earlier runs)')
+        parser.add_argument('--country-code',
+                            help='Calling code for numbers without one (default PHONE_DEFAULT_COUNTRY_CODE)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        done = invalid = 0
+        for done, invalid, last_id in backfill_phone_e164(
+            UserProfile.objects.all(), options['chunk_size'], options['start_after'], options['country_code']
+        ):
+            self.stdout.write(f'{done} profiles updated, last id {last_id}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Normalized {done} phone numbers in {time.perf_counter() - started:.2f}s '
+            f'({invalid} profiles have no valid number)'
+        ))
@@ -0,0 +1,69 @@
+# admin_panel/management/commands/backfill_trip_estimates.py
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from delivery.estimates import estimate_trips
+from delivery.models import Delivery
+
+COLUMNS = (
+    'id', 'pickup_latitude', 'pickup_longitude', 'delivery_latitude', 'delivery_longitude',
+    'rider__vehicle_type',
+)
+
+
+class Command(BaseCommand):
+    help = 'Fill distance_km and estimated_duration_minutes from coordinates for existing deliveries, in pk chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Deliveries computed and written per transaction')
+        parser.add_argument('--start-after', type=int, default=0,
+                            help='Resume after this delivery id (printed by earlier runs)')
+        parser.add_argument('--limit', type=int, help='Stop after this many deliveries')
+        parser.add_argument('--recompute', action='store_true',
+                            help='Also overwrite deliveries that already have a distance')
+        parser.add_argument('--dry-run', action='store_true', help='Compute and count without writing')
+
+    def handle(self, *args, **options):
+        queryset = Delivery.objects.filter(
+            pickup_latitude__isnull=False, pickup_longitude__isnull=False,
+            delivery_latitude__isnull=False, delivery_longitude__isnull=False,
+        )
+        if not options['recompute']:
+            queryset = queryset.filter(distance_km__isnull=True)
+
+        started = time.perf_counter()
+        last_id = options['start_after']
+        done = 0
+        while options['limit'] is None or done < options['limit']:
+            size = options['chunk_size']
+            if options['limit'] is not None:
+                size = min(size, options['limit'] - done)
+            rows = list(queryset.filter(pk__gt=last_id).order_by('pk').values_list(*COLUMNS)[:size])
+            if not rows:
+                break
+
+            ids, pickup_lats, pickup_lngs, dropoff_lats, dropoff_lngs, vehicle_types = zip(*rows)
+            distances, minutes = estimate_trips(pickup_lats, pickup_lngs, dropoff_lats, dropoff_lngs, vehicle_types)
+            # bulk_update leaves updated_at alone, so this does not look like a change to the rollups
+            deliveries = [
+                Delivery(pk=pk, distance_km=Decimal(f'{distance:.2f}'), estimated_duration_minutes=int(duration))
+                for pk, distance, duration in zip(ids, distances, minutes)
+            ]
+            if not options['dry_run']:
+                with transaction.atomic():
+                    Delivery.objects.bulk_update(deliveries, ['distance_km', 'estimated_duration_minutes'])
+
+            done += len(rows)
+            last_id = ids[-1]
+            self.stdout.write(f'{done} deliveries estimated, last id {last_id}')
+
+        verb = 'Computed' if options['dry_run'] else 'Backfilled'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} trip estimates for {done} deliveries in {time.perf_counter() - started:.2f}s'
+        ))
+        if done and not options['dry_run']:
+            self.stdout.write('Run refresh_delivery_rollups --full to include the distances in the dashboards')
@@ -0,0 +1,47 @@
+# admin_panel/management/commands/batch_deliveries.py
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from admin_panel.batching import (
+    DROPOFF_RADIUS_KM, PICKUP_RADIUS_KM, VEHICLE_LIMITS, WINDOW_MINUTES, run_batching
+)
+
+
+class Command(BaseCommand):
+    help = 'Cluster pending deliveries into multi-stop runs saved as delivery routes (run on a tick)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', required=True, help='Username recorded as the routes\' creator')
+        parser.add_argument('--vehicle-type', choices=sorted(VEHICLE_LIMITS),
+                            help='Vehicle to size runs for (default: most common among available riders)')
+        parser.add_argument('--limit', type=int, default=500, help='Maximum number of pending deliveries considered')
+        parser.add_argument('--pickup-radius-km', type=float, default=PICKUP_RADIUS_KM)
+        parser.add_argument('--dropoff-radius-km', type=float, default=DROPOFF_RADIUS_KM)
+        parser.add_argument('--window-minutes', type=float, default=WINDOW_MINUTES)
+        parser.add_argument('--dry-run', action='store_true', help='Plan and print without saving routes')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user']} does not exist")
+
+        result = run_batching(
+            user,
+            vehicle_type=options['vehicle_type'],
+            limit=options['limit'],
+            dry_run=options['dry_run'],
+            pickup_radius_km=options['pickup_radius_km'],
+            dropoff_radius_km=options['dropoff_radius_km'],
+            window_minutes=options['window_minutes'],
+        )
+        for route in result['routes']:
+            self.stdout.write(
+                f"{route['name']}: {len(route['deliveries'])} deliveries, "
+                f"{route['estimated_distance']} km, {route['estimated_duration']} min"
+            )
+        verb = 'Planned' if options['dry_run'] else 'Created'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {len(result['routes'])} {result['vehicle_type']} runs covering "
+            f"{result['batched']} of {result['pending']} pending deliveries"
+        ))
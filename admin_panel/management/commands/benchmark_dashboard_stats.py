@@ -0,0 +1,198 @@
+# admin_panel/management/commands/benchmark_dashboard_stats.py
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries
+from django.db.models import Count, F, Q, Sum
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from admin_panel.analytics import (
+    CUSTOMER_TYPES, PENDING_STATUSES, RIDER_TYPES, dashboard_stats, local_day_bounds,
+)
+from admin_panel.rollups import refresh_rollups
+from delivery.models import UserProfile, Package, Delivery, Payment
+
+BENCH_USERNAME = 'bench_dashboard_sender'
+
+
+def legacy_dashboard_stats():
+    """The pre-aggregation implementation, kept only as the benchmark baseline"""
+    total_customers = UserProfile.objects.filter(user_type__in=['customer', 'both']).count()
+    total_riders = UserProfile.objects.filter(user_type__in=['rider', 'both']).count()
+    pending_riders = UserProfile.objects.filter(user_type__in=['rider', 'both'], status='pending_approval').count()
+    total_deliveries = Delivery.objects.count()
+    pending_deliveries = Delivery.objects.filter(
+        status__in=['pending', 'assigned', 'picked_up', 'in_transit']
+    ).count()
+    today = timezone.now().date()
+    completed_deliveries_today = Delivery.objects.filter(
+        status='delivered',
+        actual_delivery__date=today
+    ).count()
+    total_revenue_today = Payment.objects.filter(
+        status='paid',
+        paid_at__date=today
+    ).aggregate(total=Sum('amount'))['total'] or 0
+    active_riders = UserProfile.objects.filter(status='active', is_available=True).count()
+    total_deliveries_30_days = Delivery.objects.filter(
+        created_at__gte=timezone.now() - timedelta(days=30)
+    ).count()
+    successful_deliveries_30_days = Delivery.objects.filter(
+        status='delivered',
+        created_at__gte=timezone.now() - timedelta(days=30)
+    ).count()
+    return (
+        total_customers, total_riders, pending_riders, total_deliveries, pending_deliveries,
+        completed_deliveries_today, total_revenue_today, active_riders,
+        total_deliveries_30_days, successful_deliveries_30_days,
+    )
+
+
+def raw_dashboard_stats():
+    """One conditional aggregate per table over the live rows, the version the rollups replaced"""
+    today_start, today_end = local_day_bounds()
+    window_start = timezone.now() - timedelta(days=30)
+    profiles = UserProfile.objects.aggregate(
+        total_customers=Count('id', filter=Q(user_type__in=CUSTOMER_TYPES)),
+        total_drivers=Count('id', filter=Q(user_type__in=RIDER_TYPES)),
+        pending_riders=Count('id', filter=Q(user_type__in=RIDER_TYPES, status='pending_approval')),
+        active_drivers=Count('id', filter=Q(status='active', is_available=True)),
+    )
+    deliveries = Delivery.objects.aggregate(
+        total_deliveries=Count('id'),
+        pending_deliveries=Count('id', filter=Q(status__in=PENDING_STATUSES)),
+        completed_deliveries_today=Count('id', filter=Q(
+            status='delivered', actual_delivery__gte=today_start, actual_delivery__lt=today_end,
+        )),
+        total_deliveries_30_days=Count('id', filter=Q(created_at__gte=window_start)),
+        successful_deliveries_30_days=Count('id', filter=Q(status='delivered', created_at__gte=window_start)),
+    )
+    revenue = Payment.objects.filter(
+        status='paid', paid_at__gte=today_start, paid_at__lt=today_end,
+    ).aggregate(total=Sum('amount'))['total'] or 0
+    return profiles, deliveries, revenue
+
+
+def timed(func, repeat):
+    """(queries per call, sorted timings in ms) for ``repeat`` calls of ``func``"""
+    timings = []
+    for _ in range(repeat):
+        # CaptureQueriesContext miscounts once the bounded query log is full
+        reset_queries()
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+    return len(ctx.captured_queries), sorted(timings)
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the admin dashboard stats: the legacy queries, the live aggregates, '
+        'the rollup read and the rollup refresh'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Insert this many synthetic deliveries before benchmarking')
+        parser.add_argument('--days', type=int, default=365,
+                            help='Spread seeded deliveries over this many past days')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--cleanup', action='store_true',
+                            help='Delete previously seeded benchmark rows and exit')
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            deleted, _ = Package.objects.filter(delivery__sender__user__username=BENCH_USERNAME).delete()
+            User.objects.filter(username=BENCH_USERNAME).delete()
+            refresh_rollups(full=True)
+            self.stdout.write(f'Deleted {deleted} benchmark rows')
+            return
+
+        if options['seed']:
+            self.seed(options['seed'], options['days'], options['batch_size'])
+
+        self.stdout.write(f'Deliveries in table: {Delivery.objects.count()}')
+
+        # dashboard_stats reads the rollups, so build them from the rows just seeded
+        queries, timings = timed(lambda: refresh_rollups(full=True), 1)
+        self.report('full refresh', queries, timings)
+        queries, timings = timed(refresh_rollups, options['repeat'])
+        self.report('incremental', queries, timings)
+
+        for label, func in [
+            ('legacy', legacy_dashboard_stats),
+            ('raw', raw_dashboard_stats),
+            ('rollup', dashboard_stats),
+        ]:
+            queries, timings = timed(func, options['repeat'])
+            self.report(label, queries, timings)
+
+        live_total = raw_dashboard_stats()[1]['total_deliveries']
+        rollup_total = dashboard_stats()['total_deliveries']
+        if live_total != rollup_total:
+            self.stdout.write(self.style.WARNING(
+                f'Rollups count {rollup_total} deliveries but the table holds {live_total}'
+            ))
+
+    def report(self, label, queries, timings):
+        self.stdout.write(
+            f'{label:>12}: {queries} queries, '
+            f'median {timings[len(timings) // 2]:.1f} ms, best {timings[0]:.1f} ms'
+        )
+
+    def seed(self, count, days, batch_size):
+        user, _ = User.objects.get_or_create(username=BENCH_USERNAME)
+        sender, _ = UserProfile.objects.get_or_create(
+            user=user, defaults={'user_type': 'customer', 'phone': '0700000000', 'address': 'Benchmark'}
+        )
+        statuses = [choice for choice, _ in Delivery.STATUS_CHOICES]
+        now = timezone.now()
+        rng = random.Random(42)
+        created = 0
+        while created < count:
+            size = min(batch_size, count - created)
+            packages = Package.objects.bulk_create([
+                Package(description='Benchmark parcel', weight=Decimal('1.50'), package_type='parcel')
+                for _ in range(size)
+            ])
+            deliveries = []
+            for package in packages:
+                created_at = now - timedelta(seconds=rng.randint(0, days * 86400))
+                status = rng.choice(statuses)
+                deliveries.append(Delivery(
+                    tracking_number=f'BENCH-{package.pk}',
+                    sender=sender,
+                    recipient_name='Benchmark',
+                    recipient_phone='0711111111',
+                    package=package,
+                    pickup_address='A',
+                    delivery_address='B',
+                    estimated_pickup=created_at,
+                    estimated_delivery=created_at + timedelta(hours=4),
+                    actual_delivery=created_at + timedelta(hours=2) if status == 'delivered' else None,
+                    status=status,
+                    delivery_fee=Decimal('15.00'),
+                    created_by=user,
+                ))
+            deliveries = Delivery.objects.bulk_create(deliveries)
+            Payment.objects.bulk_create([
+                Payment(
+                    delivery=delivery,
+                    amount=delivery.delivery_fee,
+                    payment_method='cash',
+                    status='paid' if delivery.status == 'delivered' else 'pending',
+                    paid_at=delivery.actual_delivery,
+                )
+                for delivery in deliveries
+            ])
+            # auto_now_add overrides created_at on insert, so backdate in bulk
+            Delivery.objects.filter(pk__in=[d.pk for d in deliveries]).update(created_at=F('estimated_pickup'))
+            created += size
+            self.stdout.write(f'Seeded {created}/{count}')
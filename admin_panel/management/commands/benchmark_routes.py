@@ -0,0 +1,49 @@
+# admin_panel/management/commands/benchmark_routes.py
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from admin_panel.routing import RoutePlan, distance_matrix, nearest_neighbour, optimize_route
+
+# Random stops are drawn from roughly greater Nairobi
+BOUNDS = ((-1.40, -1.15), (36.65, 37.00))
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the route optimizer on random stops: tour length improvement and runtime by stop count'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10,25,50,100,200',
+                            help='Comma separated stop counts')
+        parser.add_argument('--runs', type=int, default=5, help='Random routes per size')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+
+        self.stdout.write(
+            f"{'stops':>6} {'input km':>10} {'nn km':>9} {'final km':>9} "
+            f"{'vs input':>9} {'vs nn':>7} {'avg ms':>8} {'max ms':>8}"
+        )
+        for size in sizes:
+            inputs, constructed, finals, timings = [], [], [], []
+            for _ in range(options['runs']):
+                lats = rng.uniform(*BOUNDS[0], size)
+                lngs = rng.uniform(*BOUNDS[1], size)
+                started = time.perf_counter()
+                plan = RoutePlan(distance_matrix(lats, lngs))
+                path = optimize_route(plan, start=0)
+                timings.append((time.perf_counter() - started) * 1000)
+
+                inputs.append(plan.length(list(range(size))))
+                constructed.append(plan.length(nearest_neighbour(plan, start=0)))
+                finals.append(plan.length(path))
+
+            input_km, nn_km, final_km = np.mean(inputs), np.mean(constructed), np.mean(finals)
+            self.stdout.write(
+                f'{size:>6} {input_km:>10.1f} {nn_km:>9.1f} {final_km:>9.1f} '
+                f'{1 - final_km / input_km:>9.1%} {1 - final_km / nn_km:>7.1%} '
+                f'{np.mean(timings):>8.1f} {max(timings):>8.1f}'
+            )
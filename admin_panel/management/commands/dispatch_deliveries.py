@@ -0,0 +1,50 @@
+# admin_panel/management/commands/dispatch_deliveries.py
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from admin_panel.dispatch import run_dispatch
+
+
+class Command(BaseCommand):
+    help = 'Assign pending deliveries to available riders in one optimised batch (run on a tick)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Maximum number of pending deliveries planned per run')
+        parser.add_argument('--max-active-jobs', type=int, default=1,
+                            help='Skip riders already holding this many active deliveries')
+        parser.add_argument('--solver', choices=['hungarian', 'greedy'],
+                            help='Force a solver instead of choosing by batch size')
+        parser.add_argument('--user', help='Username recorded on status updates and audit entries')
+        parser.add_argument('--dry-run', action='store_true', help='Plan and print without assigning')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']} does not exist")
+
+        started = time.perf_counter()
+        result = run_dispatch(
+            user=user,
+            batch_size=options['batch_size'],
+            max_active_jobs=options['max_active_jobs'],
+            solver=options['solver'],
+            dry_run=options['dry_run'],
+        )
+        elapsed = time.perf_counter() - started
+
+        for assignment in result['assignments']:
+            self.stdout.write(
+                f"{assignment['tracking_number']} -> rider {assignment['rider_id']} (cost {assignment['cost']})"
+            )
+        verb = 'Planned' if options['dry_run'] else 'Assigned'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {len(result['assignments'])} of {result['pending']} pending deliveries "
+            f"to {result['riders']} riders with the {result['solver']} solver in {elapsed:.2f}s"
+            + (f", {result['skipped']} changed concurrently" if result['skipped'] else '')
+        ))
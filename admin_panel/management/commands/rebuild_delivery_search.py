@@ -0,0 +1,40 @@
+# admin_panel/management/commands/rebuild_delivery_search.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from delivery.models import Delivery
+from delivery.search import rebuild_search_documents
+
+
+class Command(BaseCommand):
+    help = 'Build the admin search document for existing deliveries, in pk chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Deliveries built and written per transaction')
+        parser.add_argument('--start-after', type=int, default=0,
+                            help='Resume after this delivery id (printed by earlier runs)')
+        parser.add_argument('--limit', type=int, help='Stop after this many deliveries')
+        parser.add_argument('--sender', type=int,
+                            help='Only rebuild deliveries from this sender profile id (after a rename)')
+        parser.add_argument('--all', action='store_true',
+                            help='Also rebuild deliveries that already have a search document')
+
+    def handle(self, *args, **options):
+        queryset = Delivery.objects.all()
+        if options['sender'] is not None:
+            queryset = queryset.filter(sender_id=options['sender'])
+        elif not options['all']:
+            queryset = queryset.filter(search_document='')
+
+        started = time.perf_counter()
+        done = 0
+        for done, last_id in rebuild_search_documents(
+            queryset, options['chunk_size'], options['start_after'], options['limit']
+        ):
+            self.stdout.write(f'{done} deliveries indexed, last id {last_id}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Built search documents for {done} deliveries in {time.perf_counter() - started:.2f}s'
+        ))
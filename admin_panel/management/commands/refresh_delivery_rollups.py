@@ -0,0 +1,22 @@
+# admin_panel/management/commands/refresh_delivery_rollups.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from admin_panel.rollups import refresh_rollups
+
+
+class Command(BaseCommand):
+    help = 'Incrementally refresh the daily delivery/revenue rollup table used by the dashboards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Rebuild every day instead of only days touched since the last run')
+        parser.add_argument('--chunk-days', type=int, default=31,
+                            help='Number of days rebuilt per transaction')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        days = refresh_rollups(full=options['full'], chunk_days=options['chunk_days'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {days} day(s) of rollups in {elapsed:.2f}s'))
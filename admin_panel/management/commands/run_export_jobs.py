@@ -0,0 +1,41 @@
+# admin_panel/management/commands/run_export_jobs.py
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from admin_panel.exports import claim_export_job, run_export_job
+from admin_panel.models import ExportJob
+
+
+class Command(BaseCommand):
+    help = 'Write pending export jobs to files and expire old ones (run on a tick)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=10, help='Maximum number of jobs run per invocation')
+        parser.add_argument('--expire-days', type=int, default=7,
+                            help='Delete export files older than this many days')
+
+    def handle(self, *args, **options):
+        ran = 0
+        pending = ExportJob.objects.filter(status='pending').order_by('created_at').values_list('id', flat=True)
+        for job_id in list(pending[:options['limit']]):
+            # Another worker may have picked the job up in the meantime
+            if not claim_export_job(job_id):
+                continue
+            job = run_export_job(ExportJob.objects.get(pk=job_id))
+            ran += 1
+            if job.status == 'completed':
+                self.stdout.write(f'Export {job.id}: {job.row_count} {job.dataset} rows to {job.file.name}')
+            else:
+                self.stderr.write(f'Export {job.id} failed: {job.error}')
+
+        expired = 0
+        cutoff = timezone.now() - timedelta(days=options['expire_days'])
+        for job in ExportJob.objects.filter(status='completed', completed_at__lt=cutoff):
+            job.file.delete(save=False)
+            job.status = 'expired'
+            job.save(update_fields=['file', 'status'])
+            expired += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Ran {ran} export jobs, expired {expired}'))
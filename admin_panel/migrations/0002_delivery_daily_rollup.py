@@ -0,0 +1,48 @@
+# Generated by Django 6.0 on 2026-10-18 15:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_panel', '0001_initial'),
+        ('delivery', '0002_dashboard_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('high_water', models.DateTimeField(blank=True, null=True)),
+                ('last_run_at', models.DateTimeField(blank=True, null=True)),
+                ('last_run_days', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DeliveryDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('searching', 'Searching for Rider'), ('assigned', 'Assigned to Rider'), ('accepted', 'Accepted by Rider'), ('picked_up', 'Picked Up'), ('in_transit', 'In Transit'), ('arrived', 'Arrived at Destination'), ('delivered', 'Delivered'), ('failed', 'Delivery Failed'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('payment_method', models.CharField(blank=True, max_length=20)),
+                ('created_count', models.IntegerField(default=0)),
+                ('fee_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cod_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('delivered_count', models.IntegerField(default=0)),
+                ('timed_delivery_count', models.IntegerField(default=0, help_text='Delivered with both pickup and delivery times')),
+                ('delivery_time_seconds', models.BigIntegerField(default=0)),
+                ('paid_count', models.IntegerField(default=0)),
+                ('paid_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('rider', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='delivery.userprofile')),
+            ],
+            options={
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date', 'status'], name='admin_panel_date_e32adc_idx'), models.Index(fields=['rider', 'date'], name='admin_panel_rider_i_6221b5_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-18 15:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_panel', '0002_delivery_daily_rollup'),
+        ('delivery', '0007_delivery_tracks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliveryroute',
+            name='deliveries',
+            field=models.ManyToManyField(blank=True, related_name='routes', to='delivery.delivery'),
+        ),
+        migrations.AddField(
+            model_name='deliveryroute',
+            name='vehicle_type',
+            field=models.CharField(blank=True, choices=[('bicycle', 'Bicycle'), ('motorcycle', 'Motorcycle'), ('car', 'Car'), ('van', 'Van'), ('truck', 'Truck'), ('none', 'No Vehicle')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 15:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_panel', '0003_route_batches'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliverydailyrollup',
+            name='distance_total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='deliverydailyrollup',
+            name='measured_count',
+            field=models.IntegerField(default=0, help_text='Created with a distance estimate'),
+        ),
+    ]
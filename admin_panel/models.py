@@ -5,6 +5,27 @@ from django.contrib.contenttypes.models import ContentType
 from django.utils import timezone
 import json
 
+from core.cache_versions import bump_version
+from delivery.models import UserProfile, Delivery
+
+
+# Permissions granted by each built-in admin role, on top of any custom role
+DEFAULT_ROLE_PERMISSIONS = {
+    'admin': frozenset([
+        'view_dashboard', 'manage_customers', 'manage_drivers',
+        'manage_deliveries', 'manage_packages', 'view_reports',
+        'manage_settings', 'manage_users'
+    ]),
+    'manager': frozenset([
+        'view_dashboard', 'manage_customers', 'manage_drivers',
+        'manage_deliveries', 'manage_packages', 'view_reports'
+    ]),
+    'operator': frozenset([
+        'view_dashboard', 'manage_customers', 'manage_deliveries'
+    ]),
+    'viewer': frozenset(['view_dashboard', 'view_reports']),
+}
+
 
 class AdminRole(models.Model):
     """Custom admin roles for fine-grained permissions"""
@@ -25,6 +46,17 @@ class AdminRole(models.Model):
         """Check if role has specific permission"""
         return self.permissions.get(permission_key, False)
 
+    def save(self, *args, **kwargs):
+        """Override save to invalidate cached permissions"""
+        super().save(*args, **kwargs)
+        bump_version('permissions')
+
+    def delete(self, *args, **kwargs):
+        """Override delete to invalidate cached permissions"""
+        result = super().delete(*args, **kwargs)
+        bump_version('permissions')
+        return result
+
 
 class AdminUser(models.Model):
     """Extended admin user profile"""
@@ -71,23 +103,18 @@ class AdminUser(models.Model):
             return True
         
         # Default role permissions
-        role_permissions = {
-            'admin': [
-                'view_dashboard', 'manage_customers', 'manage_drivers', 
-                'manage_deliveries', 'manage_packages', 'view_reports',
-                'manage_settings', 'manage_users'
-            ],
-            'manager': [
-                'view_dashboard', 'manage_customers', 'manage_drivers',
-                'manage_deliveries', 'manage_packages', 'view_reports'
-            ],
-            'operator': [
-                'view_dashboard', 'manage_customers', 'manage_deliveries'
-            ],
-            'viewer': ['view_dashboard', 'view_reports']
-        }
-        
-        return permission_key in role_permissions.get(self.role, [])
+        return permission_key in DEFAULT_ROLE_PERMISSIONS.get(self.role, ())
+
+    def save(self, *args, **kwargs):
+        """Override save to invalidate cached permissions"""
+        super().save(*args, **kwargs)
+        bump_version('permissions')
+
+    def delete(self, *args, **kwargs):
+        """Override delete to invalidate cached permissions"""
+        result = super().delete(*args, **kwargs)
+        bump_version('permissions')
+        return result
 
 
 class SystemSettings(models.Model):
@@ -117,6 +144,17 @@ class SystemSettings(models.Model):
     def __str__(self):
         return f"{self.key} ({self.category})"
 
+    def save(self, *args, **kwargs):
+        """Override save to invalidate cached settings"""
+        super().save(*args, **kwargs)
+        bump_version('system_settings')
+
+    def delete(self, *args, **kwargs):
+        """Override delete to invalidate cached settings"""
+        result = super().delete(*args, **kwargs)
+        bump_version('system_settings')
+        return result
+
     def get_typed_value(self):
         """Return the value with proper type conversion"""
         if self.setting_type == 'integer':
@@ -187,6 +225,15 @@ class DeliveryRoute(models.Model):
     is_active = models.BooleanField(default=True)
     is_optimized = models.BooleanField(default=False)
     priority = models.IntegerField(default=1)
+
+    # Batched runs: the deliveries served and the vehicle they were sized for
+    deliveries = models.ManyToManyField(Delivery, blank=True, related_name='routes')
+    vehicle_type = models.CharField(max_length=20, choices=UserProfile.VEHICLE_TYPES, blank=True)
+    # Rider the whole run was handed to; an open run has none yet
+    rider = models.ForeignKey(
+        UserProfile, on_delete=models.SET_NULL, null=True, blank=True, related_name='assigned_routes'
+    )
+    assigned_at = models.DateTimeField(null=True, blank=True)
     
     # Audit
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -266,3 +313,105 @@ class SystemBackup(models.Model):
 
     def __str__(self):
         return f"{self.name} - {self.get_status_display()}"
+
+
+class DeliveryDailyRollup(models.Model):
+    """
+    Pre-aggregated delivery and revenue figures per local day.
+
+    Rows are keyed by (date, status, rider, payment_method). A delivery adds
+    to the row for the day it was created (created/fee/COD totals), the day
+    it was delivered (delivered count and delivery time) and the day its
+    payment was made (paid totals). Rebuilt by ``refresh_delivery_rollups``.
+    """
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=Delivery.STATUS_CHOICES)
+    rider = models.ForeignKey(
+        UserProfile, on_delete=models.DO_NOTHING, null=True, blank=True,
+        db_constraint=False, related_name='+'
+    )
+    payment_method = models.CharField(max_length=20, blank=True)
+
+    created_count = models.IntegerField(default=0)
+    fee_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cod_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    measured_count = models.IntegerField(default=0, help_text="Created with a distance estimate")
+    distance_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    delivered_count = models.IntegerField(default=0)
+    timed_delivery_count = models.IntegerField(default=0, help_text="Delivered with both pickup and delivery times")
+    delivery_time_seconds = models.BigIntegerField(default=0)
+
+    paid_count = models.IntegerField(default=0)
+    paid_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-date']
+        indexes = [
+            models.Index(fields=['date', 'status']),
+            models.Index(fields=['rider', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.status} rider={self.rider_id} {self.payment_method}"
+
+
+class RollupWatermark(models.Model):
+    """High-water mark of source ``updated_at`` values already rolled up"""
+    name = models.CharField(max_length=100, unique=True)
+    high_water = models.DateTimeField(null=True, blank=True)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    last_run_days = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} @ {self.high_water}"
+
+
+class ExportJob(models.Model):
+    """
+    An export written to a file in the background by ``run_export_jobs``,
+    for ranges too large to download in one request.
+    """
+    DATASETS = [
+        ('deliveries', 'Deliveries'),
+        ('payments', 'Payments'),
+        ('audit_logs', 'Audit Logs'),
+    ]
+
+    FORMATS = [
+        ('csv', 'CSV'),
+        ('jsonl', 'JSON Lines'),
+        ('xlsx', 'Excel'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+        ('expired', 'Expired'),
+    ]
+
+    dataset = models.CharField(max_length=20, choices=DATASETS)
+    export_format = models.CharField(max_length=10, choices=FORMATS, default='csv')
+    params = models.JSONField(default=dict, blank=True, help_text="List filters, as query parameters")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    file = models.FileField(upload_to='exports/', blank=True)
+    row_count = models.IntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='export_jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_dataset_display()} export ({self.export_format}, {self.status})"
@@ -0,0 +1,345 @@
+# admin_panel/pricing.py
+"""
+Delivery pricing.
+
+Fare rules live in SystemSettings (category ``pricing``) and are compiled
+into a PricingEngine once per settings version. The engine keeps the rates
+as zone-to-zone lookup matrices, so pricing a batch of orders is a few
+numpy operations regardless of how many orders or zones there are.
+
+    fare = (base_fare + per_km * distance + per_kg * chargeable_kg)
+           * (1 + priority surcharge), at least the minimum fare
+    fee  = fare + insurance_rate * declared_value (insured packages only)
+
+``chargeable_kg`` is the larger of the actual and volumetric weight.
+
+Each rule is checked by ``clean_rule`` when a setting is saved through the
+admin API and again when the engine is compiled; a rule that is still
+malformed is logged and replaced by its default.
+"""
+import math
+import threading
+
+import numpy as np
+
+from core.cache_versions import get_version
+from core.logging_utils import log_app_error
+from delivery.estimates import estimate_trips, parse_trip_coordinates
+from .settings_cache import SETTINGS_NAMESPACE, get_setting
+
+# Settings keys read by the engine and their defaults. The defaults keep
+# the original flat rate of 10 per kg.
+DEFAULT_RULES = {
+    'pricing_base_fare': 0.0,
+    'pricing_per_km': 0.0,
+    'pricing_per_kg': 10.0,
+    'pricing_minimum_fare': 0.0,
+    # cm³ per chargeable kg (5000 is the courier norm); 0 disables it
+    'pricing_volumetric_divisor': 0,
+    'pricing_insurance_rate': 0.0,
+    # {"<priority>": fraction added to the fare}, e.g. {"4": 0.5}
+    'pricing_priority_surcharges': {},
+    # {"<zone>": [min_lat, min_lng, max_lat, max_lng]}; the first match wins
+    'pricing_zones': {},
+    # [{"from": zone, "to": zone, "base_fare"?, "per_km"?, "per_kg"?}]
+    'pricing_zone_fares': [],
+}
+RATE_COMPONENTS = ('base_fare', 'per_km', 'per_kg')
+NUMERIC_RULES = (
+    'pricing_base_fare', 'pricing_per_km', 'pricing_per_kg', 'pricing_minimum_fare',
+    'pricing_volumetric_divisor', 'pricing_insurance_rate',
+)
+
+MAX_QUOTES = 1000
+MAX_PRIORITY = 4
+
+_engine_lock = threading.Lock()
+_compiled = None
+
+
+class PricingError(ValueError):
+    pass
+
+
+def _rule_number(key, value, minimum=0):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise PricingError(f'{key} must be a number')
+    if not math.isfinite(value) or value < minimum:
+        raise PricingError(f'{key} must be at least {minimum}')
+    return value
+
+
+def clean_rule(key, value):
+    """
+    ``value`` of the pricing setting ``key`` in the form the engine uses.
+    Raises PricingError naming the key if it is malformed.
+    """
+    if key in NUMERIC_RULES:
+        return _rule_number(key, value)
+
+    if key == 'pricing_priority_surcharges':
+        value = value or {}
+        if not isinstance(value, dict):
+            raise PricingError(f'{key} must be an object of priority to fraction')
+        surcharges = {}
+        for priority, fraction in value.items():
+            try:
+                priority = int(priority)
+            except (TypeError, ValueError):
+                raise PricingError(f'{key}: priority {priority!r} must be an integer')
+            if not 0 <= priority <= MAX_PRIORITY:
+                raise PricingError(f'{key}: priority {priority} must be between 0 and {MAX_PRIORITY}')
+            # A fraction down to -1 is a discount; below that fares turn negative
+            surcharges[priority] = _rule_number(f'{key}[{priority}]', fraction, minimum=-1)
+        return surcharges
+
+    if key == 'pricing_zones':
+        value = value or {}
+        if not isinstance(value, dict):
+            raise PricingError(f'{key} must be an object of zone to bounding box')
+        zones = {}
+        for name, box in value.items():
+            if not isinstance(box, (list, tuple)) or len(box) != 4:
+                raise PricingError(f'{key}[{name}] must be [min_lat, min_lng, max_lat, max_lng]')
+            box = [_rule_number(f'{key}[{name}]', corner, minimum=-180) for corner in box]
+            if box[0] > box[2] or box[1] > box[3]:
+                raise PricingError(f'{key}[{name}] has a minimum above its maximum')
+            zones[name] = box
+        return zones
+
+    if key == 'pricing_zone_fares':
+        value = value or []
+        if not isinstance(value, list):
+            raise PricingError(f'{key} must be a list of overrides')
+        overrides = []
+        for position, override in enumerate(value):
+            if not isinstance(override, dict) or 'from' not in override or 'to' not in override:
+                raise PricingError(f'{key}[{position}] must be an object with "from" and "to"')
+            cleaned = {'from': override['from'], 'to': override['to']}
+            for component in RATE_COMPONENTS:
+                if override.get(component) is not None:
+                    cleaned[component] = _rule_number(f'{key}[{position}].{component}', override[component])
+            overrides.append(cleaned)
+        return overrides
+
+    raise PricingError(f'{key} is not a pricing setting')
+
+
+class PricingEngine:
+    """Pricing rules compiled into arrays; build one with ``get_pricing_engine``"""
+
+    def __init__(self, rules, version=None):
+        rules = {key: clean_rule(key, rules[key]) for key in DEFAULT_RULES}
+        self.version = version
+        self.minimum_fare = rules['pricing_minimum_fare']
+        self.volumetric_divisor = rules['pricing_volumetric_divisor']
+        self.insurance_rate = rules['pricing_insurance_rate']
+
+        self.surcharges = np.zeros(MAX_PRIORITY + 1)
+        for priority, fraction in rules['pricing_priority_surcharges'].items():
+            self.surcharges[priority] = fraction
+
+        zones = rules['pricing_zones']
+        self.zone_names = list(zones)
+        self.zone_boxes = np.array([zones[name] for name in self.zone_names], dtype=float).reshape(-1, 4)
+
+        # Index 0 is "outside every zone"; rows are pickup zones, columns drop-off zones
+        size = len(self.zone_names) + 1
+        self.rates = {
+            component: np.full((size, size), rules[f'pricing_{component}'])
+            for component in RATE_COMPONENTS
+        }
+        index = {name: position + 1 for position, name in enumerate(self.zone_names)}
+        for override in rules['pricing_zone_fares']:
+            source, target = index.get(override['from']), index.get(override['to'])
+            if source is None or target is None:
+                continue
+            for component, matrix in self.rates.items():
+                if component in override:
+                    matrix[source, target] = override[component]
+
+    def zone_of(self, lats, lngs):
+        """Zone index (0 for none) of each point; missing coordinates fall outside"""
+        lats, lngs = np.asarray(lats, dtype=float), np.asarray(lngs, dtype=float)
+        if not self.zone_names:
+            return np.zeros(len(lats), dtype=int)
+        boxes = self.zone_boxes
+        inside = (
+            (lats[:, None] >= boxes[:, 0]) & (lngs[:, None] >= boxes[:, 1])
+            & (lats[:, None] <= boxes[:, 2]) & (lngs[:, None] <= boxes[:, 3])
+        )
+        return np.where(inside.any(axis=1), inside.argmax(axis=1) + 1, 0)
+
+    def zone_name(self, index):
+        return self.zone_names[index - 1] if index else None
+
+    def price(self, weights, distances, priorities, volumes=None, declared_values=None, insured=None,
+              pickup_lats=None, pickup_lngs=None, dropoff_lats=None, dropoff_lngs=None):
+        """
+        Price arrays of orders. Unknown distances, volumes and coordinates
+        are NaN. Returns a dict of arrays: fee, fare, insurance,
+        chargeable_weight and the pickup/dropoff zone indexes.
+        """
+        weights = np.asarray(weights, dtype=float)
+        count = len(weights)
+        distances = np.nan_to_num(np.asarray(distances, dtype=float))
+        priorities = np.clip(np.asarray(priorities, dtype=int), 0, MAX_PRIORITY)
+
+        chargeable = weights
+        if self.volumetric_divisor > 0 and volumes is not None:
+            # fmax ignores the NaN of packages without dimensions
+            chargeable = np.fmax(weights, np.asarray(volumes, dtype=float) / self.volumetric_divisor)
+
+        missing = np.full(count, np.nan)
+        source = self.zone_of(
+            missing if pickup_lats is None else pickup_lats, missing if pickup_lngs is None else pickup_lngs
+        )
+        target = self.zone_of(
+            missing if dropoff_lats is None else dropoff_lats, missing if dropoff_lngs is None else dropoff_lngs
+        )
+        fare = (
+            self.rates['base_fare'][source, target]
+            + self.rates['per_km'][source, target] * distances
+            + self.rates['per_kg'][source, target] * chargeable
+        ) * (1 + self.surcharges[priorities])
+        fare = np.maximum(fare, self.minimum_fare)
+
+        insurance = np.zeros(count)
+        if declared_values is not None and insured is not None:
+            insurance = np.where(
+                np.asarray(insured, dtype=bool), np.asarray(declared_values, dtype=float) * self.insurance_rate, 0.0
+            )
+
+        return {
+            'fee': np.round(fare + insurance, 2),
+            'fare': np.round(fare, 2),
+            'insurance': np.round(insurance, 2),
+            'chargeable_weight': np.round(chargeable, 2),
+            'pickup_zone': source,
+            'dropoff_zone': target,
+        }
+
+
+def get_pricing_engine():
+    """Engine for the current pricing settings, recompiled when they change"""
+    global _compiled
+    version = get_version(SETTINGS_NAMESPACE)
+    engine = _compiled
+    if engine is None or engine.version != version:
+        with _engine_lock:
+            if _compiled is None or _compiled.version != version:
+                rules = {}
+                for key, default in DEFAULT_RULES.items():
+                    rules[key] = get_setting(key, default)
+                    try:
+                        clean_rule(key, rules[key])
+                    except PricingError as e:
+                        # One bad setting must not take every quote down with it
+                        log_app_error(f'Invalid pricing setting, using the default: {e}')
+                        rules[key] = default
+                _compiled = PricingEngine(rules, version)
+            engine = _compiled
+    return engine
+
+
+def _number(order, field, default=None, minimum=0):
+    value = order.get(field)
+    if value in (None, ''):
+        return default
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise PricingError(f'{field} must be a number')
+    if not np.isfinite(value) or value < minimum:
+        raise PricingError(f'{field} must be at least {minimum}')
+    return value
+
+
+def _parse_order(order):
+    if not isinstance(order, dict):
+        raise PricingError('each order must be an object')
+    weight = _number(order, 'weight')
+    if weight is None:
+        raise PricingError('weight is required')
+    dimensions = [_number(order, field) for field in ('length', 'width', 'height')]
+    try:
+        priority = int(order.get('priority') or 1)
+    except (TypeError, ValueError):
+        raise PricingError('priority must be an integer')
+    if not 1 <= priority <= MAX_PRIORITY:
+        raise PricingError(f'priority must be between 1 and {MAX_PRIORITY}')
+    insured = order.get('requires_insurance', False)
+    if isinstance(insured, str):
+        insured = insured.lower() in ('true', '1', 'yes', 'on')
+    try:
+        coordinates = parse_trip_coordinates(order)
+    except ValueError as e:
+        raise PricingError(str(e))
+
+    return (
+        weight,
+        np.prod(dimensions) if None not in dimensions else np.nan,
+        _number(order, 'declared_value', default=0),
+        bool(insured),
+        priority,
+        _number(order, 'distance_km', default=np.nan),
+        coordinates.get('pickup_latitude', np.nan),
+        coordinates.get('pickup_longitude', np.nan),
+        coordinates.get('delivery_latitude', np.nan),
+        coordinates.get('delivery_longitude', np.nan),
+    )
+
+
+def quote_orders(orders):
+    """
+    Price a list of order dicts in one pass.
+
+    Each order takes ``weight`` and optionally ``length``/``width``/``height``
+    (cm), ``declared_value``, ``requires_insurance``, ``priority``,
+    ``distance_km`` and pickup/delivery coordinates. Without a distance the
+    trip estimate from the coordinates is used, as on saved deliveries.
+    Raises PricingError naming the first invalid order.
+    """
+    if len(orders) > MAX_QUOTES:
+        raise PricingError(f'At most {MAX_QUOTES} orders per request')
+    rows = []
+    for position, order in enumerate(orders):
+        try:
+            rows.append(_parse_order(order))
+        except PricingError as e:
+            raise PricingError(f'Order {position}: {e}')
+    if not rows:
+        return []
+
+    (weights, volumes, declared_values, insured, priorities,
+     distances, pickup_lats, pickup_lngs, dropoff_lats, dropoff_lngs) = (np.array(column) for column in zip(*rows))
+    estimate = np.isnan(distances) & ~np.isnan(pickup_lats) & ~np.isnan(dropoff_lats)
+    if estimate.any():
+        distances[estimate], _ = estimate_trips(
+            pickup_lats[estimate], pickup_lngs[estimate], dropoff_lats[estimate], dropoff_lngs[estimate]
+        )
+
+    engine = get_pricing_engine()
+    prices = engine.price(
+        weights, distances, priorities, volumes=volumes, declared_values=declared_values, insured=insured,
+        pickup_lats=pickup_lats, pickup_lngs=pickup_lngs, dropoff_lats=dropoff_lats, dropoff_lngs=dropoff_lngs,
+    )
+    return [
+        {
+            'delivery_fee': float(prices['fee'][i]),
+            'fare': float(prices['fare'][i]),
+            'insurance': float(prices['insurance'][i]),
+            'chargeable_weight': float(prices['chargeable_weight'][i]),
+            'distance_km': None if np.isnan(distances[i]) else round(float(distances[i]), 2),
+            'pickup_zone': engine.zone_name(prices['pickup_zone'][i]),
+            'dropoff_zone': engine.zone_name(prices['dropoff_zone'][i]),
+        }
+        for i in range(len(rows))
+    ]
+
+
+def quote_order(order):
+    """Price a single order dict; see ``quote_orders``"""
+    return quote_orders([order])[0]
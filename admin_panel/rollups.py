@@ -0,0 +1,168 @@
+# admin_panel/rollups.py
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Min, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from delivery.models import Delivery, Payment
+from .analytics import analytics_timezone, local_day_bounds
+from .models import DeliveryDailyRollup, RollupWatermark
+
+WATERMARK_NAME = 'delivery_daily'
+
+# Rows written by transactions that were still open when the previous run
+# started can carry an updated_at just below its watermark, so each run
+# looks back a little further. Recomputing a day is idempotent.
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+
+def _contiguous_runs(days):
+    """Split sorted dates into runs of consecutive days"""
+    runs = []
+    for day in sorted(days):
+        if runs and day - runs[-1][-1] == timedelta(days=1):
+            runs[-1].append(day)
+        else:
+            runs.append([day])
+    return runs
+
+
+def _touched_days(since, tz):
+    """Local dates whose rollup rows may be affected by changes after ``since``"""
+    days = set()
+    sources = [
+        (Delivery.objects.filter(updated_at__gt=since), ['created_at', 'actual_delivery']),
+        (Payment.objects.filter(updated_at__gt=since), ['paid_at', 'delivery__created_at', 'delivery__actual_delivery']),
+    ]
+    for queryset, fields in sources:
+        for field in fields:
+            days.update(
+                queryset.filter(**{f'{field}__isnull': False})
+                .annotate(day=TruncDate(field, tzinfo=tz))
+                .order_by()
+                .values_list('day', flat=True)
+                .distinct()
+            )
+    return days
+
+
+def _compute_run(days, tz):
+    """Aggregate raw rows for a run of consecutive days into rollup instances"""
+    start, _ = local_day_bounds(days[0], tz)
+    _, end = local_day_bounds(days[-1], tz)
+    rows = {}
+
+    def row_for(day, status, rider_id, payment_method):
+        key = (day, status, rider_id, payment_method or '')
+        if key not in rows:
+            rows[key] = DeliveryDailyRollup(
+                date=day, status=status, rider_id=rider_id, payment_method=payment_method or ''
+            )
+        return rows[key]
+
+    created = Delivery.objects.filter(
+        created_at__gte=start, created_at__lt=end
+    ).annotate(
+        day=TruncDate('created_at', tzinfo=tz)
+    ).values('day', 'status', 'rider_id', 'payment__payment_method').annotate(
+        created_count=Count('id'),
+        fee_total=Sum('delivery_fee'),
+        cod_total=Sum('payment__cod_amount'),
+        measured_count=Count('id', filter=Q(distance_km__isnull=False)),
+        distance_total=Sum('distance_km'),
+    ).order_by()
+    for values in created:
+        row = row_for(values['day'], values['status'], values['rider_id'], values['payment__payment_method'])
+        row.created_count = values['created_count']
+        row.fee_total = values['fee_total'] or Decimal('0')
+        row.cod_total = values['cod_total'] or Decimal('0')
+        row.measured_count = values['measured_count']
+        row.distance_total = values['distance_total'] or Decimal('0')
+
+    delivered = Delivery.objects.filter(
+        status='delivered', actual_delivery__gte=start, actual_delivery__lt=end
+    ).annotate(
+        day=TruncDate('actual_delivery', tzinfo=tz)
+    ).values('day', 'status', 'rider_id', 'payment__payment_method').annotate(
+        delivered_count=Count('id'),
+        timed_delivery_count=Count('id', filter=Q(actual_pickup__isnull=False)),
+        delivery_time=Sum(
+            ExpressionWrapper(F('actual_delivery') - F('actual_pickup'), output_field=DurationField()),
+            filter=Q(actual_pickup__isnull=False),
+        ),
+    ).order_by()
+    for values in delivered:
+        row = row_for(values['day'], values['status'], values['rider_id'], values['payment__payment_method'])
+        row.delivered_count = values['delivered_count']
+        row.timed_delivery_count = values['timed_delivery_count']
+        if values['delivery_time'] is not None:
+            row.delivery_time_seconds = int(values['delivery_time'].total_seconds())
+
+    paid = Payment.objects.filter(
+        status='paid', paid_at__gte=start, paid_at__lt=end
+    ).annotate(
+        day=TruncDate('paid_at', tzinfo=tz)
+    ).values('day', 'delivery__status', 'delivery__rider_id', 'payment_method').annotate(
+        paid_count=Count('id'),
+        paid_total=Sum('amount'),
+    ).order_by()
+    for values in paid:
+        row = row_for(values['day'], values['delivery__status'], values['delivery__rider_id'], values['payment_method'])
+        row.paid_count = values['paid_count']
+        row.paid_total = values['paid_total'] or Decimal('0')
+
+    return list(rows.values())
+
+
+def rebuild_days(days, tz=None, batch_size=1000):
+    """Replace the rollup rows for ``days`` with freshly aggregated ones"""
+    tz = tz or analytics_timezone()
+    for run in _contiguous_runs(days):
+        with transaction.atomic():
+            DeliveryDailyRollup.objects.filter(date__gte=run[0], date__lte=run[-1]).delete()
+            DeliveryDailyRollup.objects.bulk_create(_compute_run(run, tz), batch_size=batch_size)
+
+
+def refresh_rollups(full=False, chunk_days=31):
+    """
+    Bring the rollup table up to date and return the number of days rebuilt.
+
+    Incremental runs only reprocess days touched by Delivery/Payment rows
+    whose ``updated_at`` moved past the stored watermark. A full run (or the
+    first run) rebuilds everything from the earliest delivery onwards.
+    """
+    tz = analytics_timezone()
+    run_started = timezone.now()
+    watermark, _ = RollupWatermark.objects.get_or_create(name=WATERMARK_NAME)
+
+    if full or watermark.high_water is None:
+        first = Delivery.objects.aggregate(first=Min('created_at'))['first']
+        days = []
+        if first is None:
+            DeliveryDailyRollup.objects.all().delete()
+        else:
+            day = timezone.localtime(first, tz).date()
+            today = timezone.localtime(run_started, tz).date()
+            while day <= today:
+                days.append(day)
+                day += timedelta(days=1)
+            DeliveryDailyRollup.objects.filter(date__lt=days[0]).delete()
+    else:
+        days = sorted(_touched_days(watermark.high_water - WATERMARK_OVERLAP, tz))
+
+    for offset in range(0, len(days), chunk_days):
+        rebuild_days(days[offset:offset + chunk_days], tz)
+
+    watermark.high_water = run_started
+    watermark.last_run_at = timezone.now()
+    watermark.last_run_days = len(days)
+    watermark.save()
+    return len(days)
+
+
+def rollup_freshness():
+    """When the rollups were last refreshed, or None if never"""
+    return RollupWatermark.objects.filter(name=WATERMARK_NAME).values_list('high_water', flat=True).first()
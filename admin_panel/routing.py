@@ -0,0 +1,356 @@
+# admin_panel/routing.py
+import math
+import time
+from datetime import datetime
+
+import numpy as np
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from delivery.geo import haversine_km
+
+# Average urban riding speed used to turn distances into durations
+AVERAGE_SPEED_KMH = 25
+DEFAULT_SERVICE_MINUTES = 3
+
+# Each minute past a stop's window costs as much as this many km of riding
+LATE_PENALTY_KM_PER_MIN = 2.0
+# Waiting for a window to open is cheaper than lateness but not free
+WAIT_PENALTY_KM_PER_MIN = 0.1
+
+# Edge weight that keeps non-pinned stops away from the route's ends
+_DETACHED = 1e6
+_EPSILON = 1e-9
+
+# Local search stops improving once this budget is spent
+MAX_SEARCH_SECONDS = 0.5
+# With time windows, at most this many distance-improving moves per
+# position are re-checked against the full schedule
+WINDOW_CANDIDATES = 3
+
+
+class RouteError(ValueError):
+    """Raised when waypoints cannot be optimized"""
+
+
+def distance_matrix(lats, lngs):
+    """Symmetric great-circle distance matrix in km"""
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+    return haversine_km(lats[:, None], lngs[:, None], lats[None, :], lngs[None, :])
+
+
+def _minutes_after(value, start_time):
+    if value in (None, ''):
+        return None
+    parsed = value if isinstance(value, datetime) else parse_datetime(str(value))
+    if parsed is None:
+        raise RouteError(f'Invalid time window {value!r}')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return (parsed - start_time).total_seconds() / 60
+
+
+def parse_waypoints(waypoints, start_time):
+    """
+    Coordinates, windows and service times of route waypoints.
+
+    Waypoints are dicts with ``latitude``/``longitude`` (or ``lat``/``lng``)
+    and optional ``window_start``/``window_end`` datetimes and
+    ``service_minutes``. Windows come back as minutes after ``start_time``.
+    """
+    lats, lngs, opens, closes, service = [], [], [], [], []
+    for index, waypoint in enumerate(waypoints):
+        try:
+            lats.append(float(waypoint.get('latitude', waypoint.get('lat'))))
+            lngs.append(float(waypoint.get('longitude', waypoint.get('lng'))))
+            service.append(float(waypoint.get('service_minutes', DEFAULT_SERVICE_MINUTES)))
+        except (AttributeError, TypeError, ValueError):
+            raise RouteError(f'Waypoint {index} needs numeric latitude and longitude')
+        window_start = _minutes_after(waypoint.get('window_start'), start_time)
+        window_end = _minutes_after(waypoint.get('window_end'), start_time)
+        opens.append(-np.inf if window_start is None else window_start)
+        closes.append(np.inf if window_end is None else window_end)
+    return (
+        np.array(lats), np.array(lngs),
+        np.array(opens, dtype=float), np.array(closes, dtype=float), np.array(service),
+    )
+
+
+class RoutePlan:
+    """Distances and schedule constraints of one route, plus cost evaluation"""
+
+    def __init__(self, dist, opens=None, closes=None, service=None, speed_kmh=AVERAGE_SPEED_KMH):
+        self.dist = dist
+        self.n = len(dist)
+        self.opens = opens if opens is not None else np.full(self.n, -np.inf)
+        self.closes = closes if closes is not None else np.full(self.n, np.inf)
+        self.service = service if service is not None else np.full(self.n, float(DEFAULT_SERVICE_MINUTES))
+        self.minutes_per_km = 60.0 / speed_kmh
+        self.has_windows = bool(np.isfinite(self.opens).any() or np.isfinite(self.closes).any())
+
+    def length(self, path):
+        path = np.asarray(path)
+        return float(self.dist[path[:-1], path[1:]].sum()) if len(path) > 1 else 0.0
+
+    def schedule(self, path):
+        """(duration, waiting, lateness) in minutes of visiting ``path`` in order"""
+        clock = waiting = lateness = 0.0
+        previous = None
+        for stop in path:
+            if previous is not None:
+                clock += self.dist[previous, stop] * self.minutes_per_km
+            if clock < self.opens[stop]:
+                waiting += self.opens[stop] - clock
+                clock = self.opens[stop]
+            if clock > self.closes[stop]:
+                lateness += clock - self.closes[stop]
+            clock += self.service[stop]
+            previous = stop
+        return clock, waiting, lateness
+
+    def cost(self, path):
+        if not self.has_windows:
+            return self.length(path)
+        _, waiting, lateness = self.schedule(path)
+        return self.length(path) + LATE_PENALTY_KM_PER_MIN * lateness + WAIT_PENALTY_KM_PER_MIN * waiting
+
+
+def nearest_neighbour(plan, start=None, end=None):
+    """
+    Greedy construction: repeatedly visit the closest remaining stop.
+
+    With time windows "closest" also weighs the waiting and lateness the
+    next stop would cause. ``end`` is held back and appended last.
+    """
+    first = start if start is not None else 0
+    remaining = np.ones(plan.n, dtype=bool)
+    remaining[first] = False
+    if end is not None and end != first:
+        remaining[end] = False
+
+    path = [first]
+    clock = plan.service[first]
+    while remaining.any():
+        candidates = np.flatnonzero(remaining)
+        distances = plan.dist[path[-1], candidates]
+        scores = distances
+        if plan.has_windows:
+            arrival = clock + distances * plan.minutes_per_km
+            waiting = np.maximum(plan.opens[candidates] - arrival, 0)
+            lateness = np.maximum(arrival - plan.closes[candidates], 0)
+            scores = distances + LATE_PENALTY_KM_PER_MIN * lateness + WAIT_PENALTY_KM_PER_MIN * waiting
+        best = int(np.argmin(scores))
+        stop = int(candidates[best])
+        if plan.has_windows:
+            clock = max(arrival[best], plan.opens[stop]) + plan.service[stop]
+        path.append(stop)
+        remaining[stop] = False
+    if end is not None and end != first:
+        path.append(end)
+    return path
+
+
+class _Tour:
+    """
+    A route as a cycle through a dummy depot at position 0.
+
+    The depot's edges are free to the stops allowed at an end of the route
+    and prohibitively long to all others, so symmetric 2-opt and Or-opt
+    moves on the cycle keep pinned stops at the ends.
+    """
+
+    def __init__(self, plan, path, start=None, end=None):
+        self.plan = plan
+        self.start = start
+        self.end = end
+        n = plan.n
+        depot_edges = np.zeros(n)
+        if start is not None or end is not None:
+            depot_edges[:] = _DETACHED
+            for pinned in (start, end):
+                if pinned is not None:
+                    depot_edges[pinned] = 0.0
+        dist = np.zeros((n + 1, n + 1))
+        dist[:n, :n] = plan.dist
+        dist[n, :n] = depot_edges
+        dist[:n, n] = depot_edges
+        self.dist = dist
+        self.depot = n
+        self.cycle = np.array([n] + list(path))
+
+    def path(self):
+        """The cycle without the depot, oriented to respect the pins"""
+        path = [int(stop) for stop in self.cycle[1:]]
+        if self.start is not None:
+            reverse = path[0] != self.start
+        elif self.end is not None:
+            reverse = path[-1] != self.end
+        elif self.plan.has_windows:
+            reverse = self.plan.cost(path[::-1]) < self.plan.cost(path)
+        else:
+            reverse = False
+        return path[::-1] if reverse else path
+
+    def cost(self):
+        return self.plan.cost(self.path())
+
+    def _accept(self, candidates, deltas, build):
+        """Apply the best candidate move; with windows, the best that lowers the full cost"""
+        if not self.plan.has_windows:
+            best = int(np.argmin(deltas))
+            if deltas[best] < -_EPSILON:
+                self.cycle = build(candidates[best])
+                return True
+            return False
+
+        improving = np.flatnonzero(deltas < -_EPSILON)
+        if not len(improving):
+            return False
+        current = self.cost()
+        for index in improving[np.argsort(deltas[improving])][:WINDOW_CANDIDATES]:
+            previous, self.cycle = self.cycle, build(candidates[index])
+            if self.cost() < current - _EPSILON:
+                return True
+            self.cycle = previous
+        return False
+
+    def two_opt_pass(self):
+        """One sweep of 2-opt moves: reverse a stretch when that shortens the cycle"""
+        improved = False
+        dist = self.dist
+        size = len(self.cycle)
+        for i in range(size - 2):
+            cycle = self.cycle
+            a, b = cycle[i], cycle[i + 1]
+            js = np.arange(i + 2, size if i > 0 else size - 1)
+            if not len(js):
+                continue
+            c = cycle[js]
+            d = cycle[(js + 1) % size]
+            deltas = dist[a, c] + dist[b, d] - dist[a, b] - dist[c, d]
+
+            def build(j, i=i, cycle=cycle):
+                return np.concatenate([cycle[:i + 1], cycle[i + 1:j + 1][::-1], cycle[j + 1:]])
+
+            improved |= self._accept(js, deltas, build)
+        return improved
+
+    def or_opt_pass(self, max_segment=3):
+        """One sweep of Or-opt moves: relocate runs of 1-3 stops, possibly reversed"""
+        improved = False
+        dist = self.dist
+        size = len(self.cycle)
+        for length in range(1, max_segment + 1):
+            for i in range(1, size - length + 1):
+                cycle = self.cycle
+                segment = cycle[i:i + length]
+                previous, following = cycle[i - 1], cycle[(i + length) % size]
+                first, last = segment[0], segment[-1]
+                removal_gain = dist[previous, first] + dist[last, following] - dist[previous, following]
+
+                rest = np.concatenate([cycle[:i], cycle[i + length:]])
+                a, b = rest, np.roll(rest, -1)
+                forward = dist[a, first] + dist[last, b] - dist[a, b]
+                backward = dist[a, last] + dist[first, b] - dist[a, b]
+                deltas = np.minimum(forward, backward) - removal_gain
+                deltas[i - 1] = np.inf  # Putting the run back where it was
+
+                def build(k, rest=rest, segment=segment, forward=forward, backward=backward):
+                    run = segment if forward[k] <= backward[k] else segment[::-1]
+                    return np.concatenate([rest[:k + 1], run, rest[k + 1:]])
+
+                improved |= self._accept(np.arange(len(rest)), deltas, build)
+        return improved
+
+
+def relocate_windowed_stops(plan, path, start=None, end=None):
+    """
+    Move each stop with a time window to the position of lowest total cost.
+
+    Distance-driven moves rarely fix lateness on their own, since serving an
+    urgent stop early usually means a detour; this tries every position for
+    the (usually few) stops that have windows.
+    """
+    path = list(path)
+    windowed = [stop for stop in path if np.isfinite(plan.opens[stop]) or np.isfinite(plan.closes[stop])]
+    current = plan.cost(path)
+    for stop in windowed:
+        if stop in (start, end):
+            continue
+        rest = [other for other in path if other != stop]
+        first = 1 if start is not None else 0
+        last = len(rest) - 1 if end is not None else len(rest)
+        for position in range(first, last + 1):
+            candidate = rest[:position] + [stop] + rest[position:]
+            cost = plan.cost(candidate)
+            if cost < current - _EPSILON:
+                path, current = candidate, cost
+    return path
+
+
+def optimize_route(plan, start=None, end=None, time_budget=MAX_SEARCH_SECONDS):
+    """
+    Order the stops of ``plan`` into a short route.
+
+    Nearest-neighbour construction followed by alternating 2-opt and
+    Or-opt sweeps (plus relocation of time-windowed stops) until nothing
+    improves or the time budget runs out.
+    ``start``/``end`` pin stop indices to the ends of the route.
+    """
+    if plan.n <= 2:
+        path = list(range(plan.n))
+        if start is not None and path and path[0] != start:
+            path.reverse()
+        elif end is not None and path and path[-1] != end:
+            path.reverse()
+        return path
+
+    tour = _Tour(plan, nearest_neighbour(plan, start, end), start, end)
+    deadline = time.perf_counter() + time_budget
+    while time.perf_counter() < deadline:
+        improved = tour.two_opt_pass()
+        improved |= tour.or_opt_pass()
+        if plan.has_windows:
+            path = tour.path()
+            relocated = relocate_windowed_stops(plan, path, start, end)
+            if relocated != path:
+                tour.cycle = np.array([tour.depot] + relocated)
+                improved = True
+        if not improved:
+            break
+    return tour.path()
+
+
+def optimize_waypoints(waypoints, pin_start=True, pin_end=False, start_time=None,
+                       speed_kmh=AVERAGE_SPEED_KMH):
+    """
+    Reorder route waypoints and estimate the result.
+
+    Returns a dict with the reordered ``waypoints``, ``distance_km``,
+    ``duration_minutes`` (riding, service and waiting), ``late_minutes``
+    against the time windows and the ``original_distance_km``.
+    """
+    start_time = start_time or timezone.now()
+    lats, lngs, opens, closes, service = parse_waypoints(waypoints, start_time)
+    plan = RoutePlan(distance_matrix(lats, lngs), opens, closes, service, speed_kmh)
+
+    start = 0 if pin_start and plan.n else None
+    end = plan.n - 1 if pin_end and plan.n > 1 else None
+    order = optimize_route(plan, start, end)
+
+    original = list(range(plan.n))
+    if plan.has_windows and plan.cost(original) <= plan.cost(order):
+        order = original
+    elif not plan.has_windows and plan.length(original) <= plan.length(order):
+        order = original
+
+    duration, _, lateness = plan.schedule(order)
+    return {
+        'waypoints': [waypoints[index] for index in order],
+        'order': order,
+        'distance_km': plan.length(order),
+        'original_distance_km': plan.length(original),
+        'duration_minutes': int(math.ceil(duration)),
+        'late_minutes': round(lateness, 1),
+    }
@@ -1,8 +1,11 @@
 # admin_panel/serializers.py
+import json
+
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
-from .models import AdminUser, AdminRole, SystemSettings, AuditLog, DeliveryRoute, NotificationTemplate, SystemBackup
+from .models import AdminUser, AdminRole, SystemSettings, AuditLog, DeliveryRoute, ExportJob, NotificationTemplate, SystemBackup
+from .pricing import DEFAULT_RULES, PricingError, clean_rule
 from delivery.models import UserProfile
 from main.models import Role, UserRole
 
@@ -112,6 +115,26 @@ class SystemSettingsSerializer(serializers.ModelSerializer):
     def get_typed_value(self, obj):
         return obj.get_typed_value()
 
+    def validate(self, attrs):
+        key = attrs.get('key', getattr(self.instance, 'key', None))
+        if key in DEFAULT_RULES:
+            setting = SystemSettings(
+                key=key,
+                value=attrs.get('value', getattr(self.instance, 'value', '')),
+                setting_type=attrs.get('setting_type', getattr(self.instance, 'setting_type', 'string')),
+            )
+            if setting.setting_type == 'json':
+                # get_typed_value would quietly turn bad JSON into {}
+                try:
+                    json.loads(setting.value)
+                except json.JSONDecodeError:
+                    raise serializers.ValidationError({'value': f'{key} must be valid JSON'})
+            try:
+                clean_rule(key, setting.get_typed_value())
+            except PricingError as e:
+                raise serializers.ValidationError({'value': str(e)})
+        return attrs
+
 
 class AuditLogSerializer(serializers.ModelSerializer):
     """Audit log serializer"""
@@ -136,15 +159,36 @@ class DeliveryRouteSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'name', 'description', 'waypoints', 'estimated_distance',
             'estimated_duration', 'is_active', 'is_optimized', 'priority',
+            'vehicle_type', 'deliveries', 'rider', 'assigned_at',
             'created_by', 'created_by_details', 'created_at', 'updated_at',
             'waypoints_count'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at', 'waypoints_count']
+        read_only_fields = [
+            'id', 'deliveries', 'rider', 'assigned_at', 'created_at', 'updated_at', 'waypoints_count'
+        ]
     
     def get_waypoints_count(self, obj):
         return len(obj.waypoints) if obj.waypoints else 0
 
 
+class ExportJobSerializer(serializers.ModelSerializer):
+    """Background export job serializer"""
+    created_by_details = UserSerializer(source='created_by', read_only=True)
+
+    class Meta:
+        model = ExportJob
+        fields = [
+            'id', 'dataset', 'export_format', 'params', 'status', 'row_count', 'error',
+            'created_by_details', 'created_at', 'started_at', 'completed_at'
+        ]
+        read_only_fields = ['id', 'status', 'row_count', 'error', 'created_at', 'started_at', 'completed_at']
+
+    def validate_params(self, value):
+        if not isinstance(value, dict):
+            raise serializers.ValidationError('params must be an object of list filters')
+        return {key: str(item) for key, item in value.items()}
+
+
 class NotificationTemplateSerializer(serializers.ModelSerializer):
     """Notification template serializer"""
     class Meta:
@@ -233,8 +277,8 @@ class UserProfileSerializer(serializers.ModelSerializer):
             'license_number', 'license_expiry', 'vehicle_type', 'vehicle_type_display',
             'vehicle_plate', 'vehicle_model', 'vehicle_color', 'vehicle_year',
             'identity_type', 'identity_type_display', 'identity_number',
-            'is_available', 'current_location', 'last_location_update',
-            'rating', 'total_ratings', 'completed_deliveries',
+            'is_available', 'current_location', 'current_latitude', 'current_longitude',
+            'last_location_update', 'rating', 'total_ratings', 'completed_deliveries',
             'working_hours_start', 'working_hours_end',
             'created_at', 'updated_at'
         ]
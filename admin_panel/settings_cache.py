@@ -0,0 +1,86 @@
+# admin_panel/settings_cache.py
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+from core.cache_versions import get_version
+from .models import SystemSettings
+
+SETTINGS_NAMESPACE = 'system_settings'
+PUBLIC_CATEGORIES = ['public', 'frontend']
+LOCAL_CACHE_SIZE = 256
+
+_MISSING = object()
+_local_cache = OrderedDict()
+_local_lock = threading.Lock()
+
+
+def _local_get(cache_key):
+    with _local_lock:
+        value = _local_cache.get(cache_key, _MISSING)
+        if value is not _MISSING:
+            _local_cache.move_to_end(cache_key)
+        return value
+
+
+def _local_set(cache_key, value):
+    with _local_lock:
+        _local_cache[cache_key] = value
+        _local_cache.move_to_end(cache_key)
+        while len(_local_cache) > LOCAL_CACHE_SIZE:
+            _local_cache.popitem(last=False)
+
+
+def get_setting(key, default=None):
+    """
+    Typed value of a system setting, or ``default`` if it does not exist.
+
+    Lookups go through a process-local LRU, then the shared cache, then the
+    database. Entries are keyed by the settings version, which is bumped on
+    every SystemSettings write, so no stale value survives an update.
+    Returned JSON values are shared between callers and must not be mutated.
+    """
+    version = get_version(SETTINGS_NAMESPACE)
+    cache_key = f'{SETTINGS_NAMESPACE}:{version}:{key}'
+
+    value = _local_get(cache_key)
+    if value is _MISSING:
+        value = cache.get(cache_key, _MISSING)
+        if value is _MISSING:
+            setting = SystemSettings.objects.filter(key=key).first()
+            # None marks a known-missing key so it is not re-queried
+            value = setting.get_typed_value() if setting else None
+            cache.set(cache_key, value)
+        _local_set(cache_key, value)
+
+    return default if value is None else value
+
+
+def get_public_settings_payload():
+    """
+    Return ``(etag, payload)`` for the public settings endpoint.
+
+    The payload is built once per settings version and shared through the
+    cache, so revalidating clients are answered without touching the DB.
+    """
+    version = get_version(SETTINGS_NAMESPACE)
+    cache_key = f'{SETTINGS_NAMESPACE}:{version}:__public__'
+
+    cached = _local_get(cache_key)
+    if cached is _MISSING:
+        cached = cache.get(cache_key)
+        if cached is None:
+            settings = list(SystemSettings.objects.filter(
+                category__in=PUBLIC_CATEGORIES
+            ).order_by('category', 'key').values('key', 'value', 'setting_type'))
+            payload = {'settings': settings}
+            body = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+            etag = '"%s"' % hashlib.sha1(body.encode()).hexdigest()
+            cached = (etag, payload)
+            cache.set(cache_key, cached)
+        _local_set(cache_key, cached)
+
+    return cached
@@ -1,3 +1,970 @@
+import importlib
+import itertools
+import json
+import time
+from io import BytesIO, StringIO
+from tempfile import TemporaryDirectory
+from datetime import date, datetime, timedelta
+from unittest import mock
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from django.apps import apps as django_apps
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.utils import timezone
+from openpyxl import load_workbook
+from rest_framework.test import APIClient
+
+from api.tests import make_customer, make_order, make_rider
+from core.permissions import HasRolePermission, resolve_admin_permissions
+from delivery.models import Delivery, IdempotencyKey, UserProfile
+from delivery.rider_locations import LOCATION_MAX_AGE, update_rider_location
+from delivery.senders import clear_sender_cache
+from delivery.transitions import DeliveryTransitionError, assign_rider, change_status, claim_next_delivery
+from main.models import Role, UserRole
+from .batching import assign_route, claim_next_route, run_batching
+from .analytics import dashboard_stats, delivery_trends, driver_performance, rider_dashboard_stats
+from .exports import export_response
+from .dispatch import (
+    INFEASIBLE, dispatchable_riders, greedy_assignment, hungarian_assignment, pending_deliveries, run_dispatch,
+)
+from .pricing import DEFAULT_RULES, PricingEngine, PricingError, get_pricing_engine, quote_order, quote_orders
+from .models import AdminRole, AdminUser, AuditLog, DeliveryDailyRollup, DeliveryRoute, ExportJob, SystemSettings
+from .rollups import refresh_rollups
+from .routing import RoutePlan, distance_matrix, optimize_route, optimize_waypoints
+from .settings_cache import get_setting
+
+
+class DeliveryRollupTests(TestCase):
+    def setUp(self):
+        self.customer = make_customer('rollup_customer')
+        self.rider = make_rider('rollup_rider')
+
+    def test_full_then_incremental_refresh(self):
+        delivered = make_order(self.customer, status='delivered', paid=True, rider=self.rider)
+        now = timezone.now()
+        Delivery.objects.filter(pk=delivered.pk).update(
+            actual_pickup=now - timedelta(minutes=30), actual_delivery=now
+        )
+        delivered.payment.paid_at = now
+        delivered.payment.save()
+        make_order(self.customer, status='pending')
+
+        self.assertEqual(refresh_rollups(), 1)
+        stats = dashboard_stats()
+        self.assertEqual(stats['total_deliveries'], 2)
+        self.assertEqual(stats['pending_deliveries'], 1)
+        self.assertEqual(stats['completed_deliveries_today'], 1)
+        self.assertEqual(stats['total_revenue_today'], 20.0)
+        self.assertEqual(
+            DeliveryDailyRollup.objects.get(delivered_count=1).delivery_time_seconds, 30 * 60
+        )
+
+        # Nothing changed: an incremental run still revisits the overlap
+        # window but leaves the figures untouched
+        refresh_rollups()
+        self.assertEqual(dashboard_stats()['total_deliveries'], 2)
+
+        make_order(self.customer, status='assigned', rider=self.rider)
+        refresh_rollups()
+        stats = dashboard_stats()
+        self.assertEqual(stats['total_deliveries'], 3)
+        self.assertEqual(stats['pending_deliveries'], 2)
+
+        trends = delivery_trends(days=7)
+        self.assertEqual(len(trends), 7)
+        self.assertEqual(trends[0]['created'], 3)
+        self.assertEqual(trends[0]['completed'], 1)
+
+        performance = driver_performance()
+        self.assertEqual(performance[0]['id'], self.rider.id)
+        self.assertEqual(performance[0]['total_deliveries'], 2)
+        self.assertEqual(performance[0]['completed_deliveries'], 1)
+
+    def test_full_refresh_of_an_empty_table_clears_the_rollups(self):
+        make_order(self.customer)
+        refresh_rollups(full=True)
+        Delivery.objects.all().delete()
+        refresh_rollups(full=True)
+        self.assertFalse(DeliveryDailyRollup.objects.exists())
+        self.assertEqual(dashboard_stats()['total_deliveries'], 0)
+
+
+class RiderDashboardStatsTests(TestCase):
+    def test_job_counts_are_live(self):
+        customer = make_customer('live_customer')
+        rider = make_rider('live_rider')
+        make_order(customer, status='assigned', rider=rider)
+        delivered = make_order(customer, status='delivered', rider=rider)
+        Delivery.objects.filter(pk=delivered.pk).update(actual_delivery=timezone.now())
+        old = make_order(customer, status='delivered', rider=rider)
+        Delivery.objects.filter(pk=old.pk).update(actual_delivery=timezone.now() - timedelta(days=3))
+
+        # No rollup refresh in between
+        with self.assertNumQueries(1):
+            stats = rider_dashboard_stats(rider)
+        self.assertEqual(stats, {'assigned': 1, 'in_transit': 0, 'delivered_today': 1})
+        make_order(customer, status='in_transit', rider=rider)
+        self.assertEqual(rider_dashboard_stats(rider)['in_transit'], 1)
+
+
+@mock.patch('admin_panel.analytics.local_today', lambda tz=None: date(2026, 10, 14))
+class DeliveryTrendTests(TestCase):
+    def setUp(self):
+        customer = make_customer('trend_customer')
+        nairobi = ZoneInfo('Africa/Nairobi')
+        # 2026-10-14 is a Wednesday
+        for day in (date(2026, 9, 20), date(2026, 10, 2), date(2026, 10, 3), date(2026, 10, 13), date(2026, 10, 13)):
+            order = make_order(customer)
+            Delivery.objects.filter(pk=order.pk).update(created_at=datetime(day.year, day.month, day.day, 12, tzinfo=nairobi))
+        # Tuesday night in UTC, already Wednesday in Nairobi
+        late = make_order(customer)
+        Delivery.objects.filter(pk=late.pk).update(created_at=datetime(2026, 10, 13, 22, 30, tzinfo=ZoneInfo('UTC')))
+
+    def created(self, trends):
+        return [(row['date'], row['created']) for row in trends]
+
+    def test_weeks_start_on_monday_and_clip_the_first_bucket(self):
+        # 12 days back is Saturday 2026-10-03, so the first week only counts from then
+        expected = [('2026-10-12', 3), ('2026-10-05', 0), ('2026-09-28', 1)]
+        self.assertEqual(self.created(delivery_trends(days=12, granularity='week', tz=ZoneInfo('UTC'))), expected)
+        refresh_rollups(full=True)
+        self.assertEqual(self.created(delivery_trends(days=12, granularity='week')), expected)
+
+    def test_months_are_zero_filled(self):
+        trends = delivery_trends(days=60, granularity='month', tz=ZoneInfo('UTC'))
+        self.assertEqual(self.created(trends), [('2026-10-01', 5), ('2026-09-01', 1), ('2026-08-01', 0)])
+
+    def test_days_are_bucketed_in_the_requested_timezone(self):
+        in_utc = dict(self.created(delivery_trends(days=2, tz=ZoneInfo('UTC'))))
+        self.assertEqual(in_utc, {'2026-10-14': 0, '2026-10-13': 3})
+        # Nairobi is the analytics timezone, so this reads the rollups
+        refresh_rollups(full=True)
+        in_nairobi = dict(self.created(delivery_trends(days=2, tz=ZoneInfo('Africa/Nairobi'))))
+        self.assertEqual(in_nairobi, {'2026-10-14': 1, '2026-10-13': 2})
+
+    def test_endpoint_validates_granularity_and_timezone(self):
+        admin = User.objects.create_user(username='trend_admin', password='pass12345')
+        AdminUser.objects.create(user=admin, role='admin')
+        client = APIClient()
+        client.force_authenticate(admin)
+        url = '/admin-api/api/dashboard/delivery_trends/'
+
+        response = client.get(url, {'days': 12, 'granularity': 'week', 'tz': 'UTC'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['timezone'], len(response.data['trends'])), ('UTC', 3))
+        self.assertEqual(client.get(url, {'tz': 'Mars/Olympus_Mons'}).status_code, 400)
+        self.assertEqual(client.get(url, {'granularity': 'year'}).status_code, 400)
+
+
+class TripEstimateBackfillTests(TestCase):
+    def test_backfill_fills_missing_estimates_in_chunks(self):
+        customer = make_customer('backfill_customer')
+        orders = [make_order(customer) for _ in range(5)]
+        # Coordinates written without save(), as on rows from before estimates existed
+        Delivery.objects.filter(pk__in=[d.pk for d in orders[:4]]).update(
+            pickup_latitude=-1.2864, pickup_longitude=36.8172,
+            delivery_latitude=-1.3100, delivery_longitude=36.8350,
+        )
+        before = Delivery.objects.get(pk=orders[0].pk).updated_at
+
+        out = StringIO()
+        call_command('backfill_trip_estimates', chunk_size=3, limit=3, stdout=out)
+        self.assertEqual(Delivery.objects.filter(distance_km__isnull=False).count(), 3)
+        call_command('backfill_trip_estimates', chunk_size=3, stdout=out)
+        self.assertIn('last id', out.getvalue())
+
+        estimated = Delivery.objects.filter(distance_km__isnull=False)
+        self.assertEqual(estimated.count(), 4)
+        self.assertEqual(set(estimated.values_list('estimated_duration_minutes', flat=True)), {10})
+        self.assertEqual(Delivery.objects.get(pk=orders[0].pk).updated_at, before)
+
+        refresh_rollups(full=True)
+        stats = dashboard_stats()
+        distance = float(estimated.first().distance_km)
+        self.assertAlmostEqual(stats['distance_km_today'], distance * 4, places=2)
+        self.assertAlmostEqual(stats['average_distance_km_30_days'], distance, places=2)
+
+
+class SettingsCacheTests(TestCase):
+    def test_writes_by_other_workers_show_up_once_the_version_expires(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            SystemSettings.objects.create(key='max_weight', value='20', setting_type='integer')
+        self.assertEqual(get_setting('max_weight'), 20)
+
+        # Another process's write bumps only its own (local) cache
+        SystemSettings.objects.filter(key='max_weight').update(value='30')
+        self.assertEqual(get_setting('max_weight'), 20)
+        later = time.time() + 31
+        with mock.patch('time.time', return_value=later):
+            self.assertEqual(get_setting('max_weight'), 30)
+        cache.clear()
+
+    def test_get_setting_is_invalidated_on_write(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            setting = SystemSettings.objects.create(key='max_weight', value='20', setting_type='integer')
+        self.assertEqual(get_setting('max_weight'), 20)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_setting('max_weight'), 20)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            setting.value = '25'
+            setting.save()
+        self.assertEqual(get_setting('max_weight'), 25)
+        self.assertEqual(get_setting('missing_key', 'fallback'), 'fallback')
+
+    def test_public_settings_revalidation(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            SystemSettings.objects.create(key='support_phone', value='0700', category='public')
+        client = APIClient()
+        response = client.get('/admin-api/api/settings/public_settings/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['settings'][0]['key'], 'support_phone')
+
+        with self.assertNumQueries(0):
+            cached = client.get('/admin-api/api/settings/public_settings/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+
+class PricingTests(TestCase):
+    CBD = [-1.2950, 36.8100, -1.2750, 36.8300]
+    WESTLANDS = [-1.2750, 36.7900, -1.2550, 36.8150]
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        # Settings rows roll back without a version bump
+        cache.clear()
+
+    def setting(self, key, value, setting_type='float'):
+        with self.captureOnCommitCallbacks(execute=True):
+            SystemSettings.objects.update_or_create(
+                key=key, defaults={'value': value, 'setting_type': setting_type, 'category': 'pricing'}
+            )
+
+    def test_defaults_keep_the_flat_weight_rate(self):
+        self.assertEqual(quote_order({'weight': 2})['delivery_fee'], 20.0)
+
+    def test_rules_are_recompiled_when_settings_change(self):
+        engine = get_pricing_engine()
+        self.assertIs(get_pricing_engine(), engine)
+
+        self.setting('pricing_base_fare', '100')
+        self.setting('pricing_per_km', '30')
+        self.setting('pricing_volumetric_divisor', '5000')
+        self.setting('pricing_insurance_rate', '0.02')
+        self.setting('pricing_priority_surcharges', '{"4": 0.5}', 'json')
+        self.assertIsNot(get_pricing_engine(), engine)
+
+        quotes = quote_orders([
+            {'weight': 2, 'distance_km': 4},
+            # 40x50x25 cm is 10 kg by volume
+            {'weight': 2, 'distance_km': 4, 'length': 40, 'width': 50, 'height': 25},
+            {'weight': 2, 'distance_km': 4, 'priority': 4, 'declared_value': 1000, 'requires_insurance': True},
+        ])
+        self.assertEqual(quotes[0]['delivery_fee'], 100 + 120 + 20)
+        self.assertEqual(quotes[1]['chargeable_weight'], 10)
+        self.assertEqual(quotes[1]['delivery_fee'], 100 + 120 + 100)
+        self.assertEqual(quotes[2]['insurance'], 20)
+        self.assertEqual(quotes[2]['delivery_fee'], 240 * 1.5 + 20)
+
+    def test_zone_to_zone_overrides(self):
+        self.setting('pricing_zones', json.dumps({'cbd': self.CBD, 'westlands': self.WESTLANDS}), 'json')
+        self.setting('pricing_zone_fares', json.dumps([{'from': 'cbd', 'to': 'westlands', 'base_fare': 150}]), 'json')
+
+        trip = {'weight': 1, 'pickup_latitude': -1.2864, 'pickup_longitude': 36.8172}
+        inbound, elsewhere = quote_orders([
+            {**trip, 'delivery_latitude': -1.2650, 'delivery_longitude': 36.8030},
+            {**trip, 'delivery_latitude': -1.3100, 'delivery_longitude': 36.8350},
+        ])
+        self.assertEqual((inbound['pickup_zone'], inbound['dropoff_zone']), ('cbd', 'westlands'))
+        self.assertEqual(inbound['delivery_fee'], 160)
+        self.assertIsNone(elsewhere['dropoff_zone'])
+        self.assertEqual(elsewhere['delivery_fee'], 10)
+        self.assertGreater(elsewhere['distance_km'], 0)
+
+    def test_malformed_rules_fall_back_to_their_defaults(self):
+        with self.assertRaisesMessage(PricingError, 'pricing_zones[cbd]'):
+            PricingEngine({**DEFAULT_RULES, 'pricing_zones': {'cbd': [1, 2, 3]}})
+
+        self.setting('pricing_base_fare', '50')
+        self.setting('pricing_zones', json.dumps({'cbd': [-1.29, 36.81]}), 'json')
+        self.setting('pricing_priority_surcharges', '{"urgent": 0.5}', 'json')
+        self.setting('pricing_per_kg', 'ten', 'string')
+        quote = quote_order({'weight': 2, 'priority': 4})
+        self.assertEqual(quote['delivery_fee'], 50 + 20)
+        self.assertIsNone(quote['pickup_zone'])
+
+    def test_settings_endpoint_rejects_malformed_rules(self):
+        admin = User.objects.create_user(username='pricing_admin', password='pass12345')
+        AdminUser.objects.create(user=admin, role='admin')
+        client = APIClient()
+        client.force_authenticate(admin)
+        url = '/admin-api/api/settings/'
+
+        for value, setting_type in [
+            ('{"cbd": [1, 2, 3]}', 'json'),
+            ('{"cbd": ', 'json'),
+            ('["cbd"]', 'json'),
+        ]:
+            response = client.post(url, {
+                'key': 'pricing_zones', 'value': value, 'setting_type': setting_type, 'category': 'pricing'
+            }, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('pricing_zones', str(response.data['value']))
+
+        response = client.post(url, {
+            'key': 'pricing_per_km', 'value': '-3', 'setting_type': 'float', 'category': 'pricing'
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = client.post(url, {
+            'key': 'pricing_zones', 'value': json.dumps({'cbd': self.CBD}), 'setting_type': 'json',
+            'category': 'pricing',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        response = client.patch(f"{url}{response.data['id']}/", {'value': '{"cbd": "everywhere"}'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class IdempotencyKeyPurgeTests(TestCase):
+    def test_purges_only_expired_keys(self):
+        user = User.objects.create_user(username='purge_user', password='pass12345')
+        now = timezone.now()
+        IdempotencyKey.objects.create(user=user, scope='customer_portal', key='old', fingerprint='x', expires_at=now - timedelta(hours=1))
+        IdempotencyKey.objects.create(user=user, scope='customer_portal', key='new', fingerprint='x', expires_at=now + timedelta(hours=1))
+
+        out = StringIO()
+        call_command('purge_idempotency_keys', stdout=out)
+
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['new'])
+        self.assertIn('Deleted 1', out.getvalue())
+
+
+class AdminDeliveryCreateTests(TestCase):
+    def test_idempotent_create_with_rider(self):
+        admin = User.objects.create_user(username='create_admin', password='pass12345')
+        AdminUser.objects.create(user=admin, role='admin')
+        rider = make_rider('create_rider')
+        client = APIClient()
+        client.force_authenticate(admin)
+        now = timezone.now()
+        body = {
+            'sender_name': 'Jane Sender', 'sender_phone': '0733333333', 'sender_address': 'Upper Hill',
+            'recipient_name': 'Recipient', 'recipient_phone': '0711111111', 'recipient_address': 'Kilimani',
+            'package_description': 'Documents', 'package_weight': '1.00', 'package_type': 'document',
+            'pickup_address': 'A', 'delivery_address': 'B',
+            'estimated_pickup': now.isoformat(), 'estimated_delivery': (now + timedelta(hours=2)).isoformat(),
+            'priority': 2, 'delivery_fee': '150.00', 'payment_amount': '150.00', 'payment_method': 'cash',
+            'rider_id': rider.id,
+        }
+
+        for _ in range(2):
+            response = client.post('/admin-api/api/deliveries/', body, format='json', HTTP_IDEMPOTENCY_KEY='admin-1')
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+
+        delivery = Delivery.objects.get()
+        self.assertEqual((delivery.rider_id, delivery.status), (rider.id, 'assigned'))
+        self.assertEqual(delivery.payment.amount, 150)
+
+
+class SenderLookupTests(TestCase):
+    def setUp(self):
+        clear_sender_cache()
+        admin = User.objects.create_user(username='sender_admin', password='pass12345')
+        AdminUser.objects.create(user=admin, role='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+
+    def tearDown(self):
+        clear_sender_cache()
+
+    def create(self, sender_phone):
+        now = timezone.now()
+        return self.client.post('/admin-api/api/deliveries/', {
+            'sender_name': 'Jane Sender', 'sender_phone': sender_phone, 'sender_address': 'Upper Hill',
+            'recipient_name': 'Recipient', 'recipient_phone': '0711111111', 'recipient_address': 'Kilimani',
+            'package_description': 'Documents', 'package_weight': '1.00', 'package_type': 'document',
+            'pickup_address': 'A', 'delivery_address': 'B',
+            'estimated_pickup': now.isoformat(), 'estimated_delivery': (now + timedelta(hours=2)).isoformat(),
+            'priority': 1, 'delivery_fee': '150.00', 'payment_amount': '150.00', 'payment_method': 'cash',
+        }, format='json')
+
+    def test_repeat_senders_resolve_to_one_profile(self):
+        existing = make_customer('existing_sender')
+        for phone in ('0700 000 000', '+254700000000', '254700000000'):
+            self.assertEqual(self.create(phone).status_code, 201)
+        self.assertEqual(set(Delivery.objects.values_list('sender_id', flat=True)), {existing.id})
+
+        self.assertEqual(self.create('0733333333').status_code, 201)
+        sender = UserProfile.objects.get(phone_e164='+254733333333')
+        self.assertEqual((sender.user.username, sender.user.first_name), ('sender_+254733333333', 'Jane'))
+
+        self.assertEqual(self.create('call me').status_code, 400)
+
+    def test_cached_sender_is_rechecked(self):
+        sender = make_customer('moved_sender')
+        self.assertEqual(self.create('0700000000').status_code, 201)
+        sender.phone = '0755555555'
+        sender.save(update_fields=['phone'])
+
+        self.assertEqual(self.create('0700000000').status_code, 201)
+        new_sender = Delivery.objects.order_by('-id').first().sender
+        self.assertNotEqual(new_sender.id, sender.id)
+        self.assertEqual(new_sender.phone_e164, '+254700000000')
+
+    def test_backfill_normalizes_existing_profiles(self):
+        customer = make_customer('legacy_sender')
+        UserProfile.objects.filter(pk=customer.pk).update(phone='+254 700-000-000', phone_e164='')
+        out = StringIO()
+        call_command('backfill_phone_numbers', chunk_size=1, stdout=out)
+        self.assertIn('Normalized 1 phone numbers', out.getvalue())
+        self.assertEqual(UserProfile.objects.get(pk=customer.pk).phone_e164, '+254700000000')
+
+    def test_migration_normalizes_existing_profiles(self):
+        customer = make_customer('premigration_sender')
+        UserProfile.objects.filter(pk=customer.pk).update(phone='0700 000 000', phone_e164='')
+        migration = importlib.import_module('delivery.migrations.0013_backfill_phone_e164')
+        migration.fill_phone_e164(django_apps, type('SchemaEditor', (), {'connection': connection})())
+        self.assertEqual(UserProfile.objects.get(pk=customer.pk).phone_e164, '+254700000000')
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='export_admin', password='pass12345')
+        AdminUser.objects.create(user=self.admin, role='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        customer = make_customer('export_customer')
+        for _ in range(3):
+            make_order(customer, status='delivered', paid=True)
+        make_order(customer)
+
+    def test_streams_filtered_csv_and_jsonl(self):
+        response = self.client.get('/admin-api/api/deliveries/export/', {'status': 'delivered'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[0].startswith('id,tracking_number,status'))
+        self.assertIn(',delivered,', lines[1])
+
+        response = self.client.get('/admin-api/api/audit-logs/export/', {'type': 'jsonl', 'action': 'export'})
+        records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(records[0]['model_name'], 'deliveries')
+        self.assertEqual(records[0]['details'], {'format': 'csv', 'params': {'status': 'delivered'}})
+
+        self.assertEqual(self.client.get('/admin-api/api/deliveries/export/', {'type': 'pdf'}).status_code, 400)
+
+    async def test_asgi_export_is_sent_as_rows_are_read(self):
+        pulled = []
+
+        def rows():
+            for number in range(4):
+                pulled.append(number)
+                yield (number, 'update')
+
+        with mock.patch('admin_panel.exports.STREAM_BATCH_ROWS', 1), \
+                mock.patch('admin_panel.exports.export_rows', return_value=(['id', 'action'], rows())):
+            response = export_response('audit_logs', 'csv', {}, asynchronous=True)
+            self.assertTrue(response.is_async)
+            chunks = aiter(response)
+            self.assertEqual(await anext(chunks), b'id,action\r\n0,update\r\n')
+            self.assertEqual(pulled, [0])
+            rest = [chunk async for chunk in chunks]
+        self.assertEqual(pulled, [0, 1, 2, 3])
+        self.assertEqual(b''.join(rest).decode().splitlines(), ['1,update', '2,update', '3,update'])
+
+        await self.async_client.aforce_login(self.admin)
+        response = await self.async_client.get('/admin-api/api/deliveries/export/', {'status': 'delivered'})
+        self.assertTrue(response.is_async)
+        self.assertEqual(len(b''.join([chunk async for chunk in response]).decode().splitlines()), 4)
+
+    def test_xlsx_export(self):
+        response = self.client.get('/admin-api/api/exports/stream/', {'dataset': 'payments', 'type': 'xlsx'})
+        self.assertEqual(response.status_code, 200)
+        sheet = load_workbook(BytesIO(b''.join(response.streaming_content))).active
+        rows = list(sheet.iter_rows(values_only=True))
+        self.assertEqual(rows[0][:2], ('id', 'tracking_number'))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[1][3], 20)
+
+    def test_background_job(self):
+        with TemporaryDirectory() as media_root, self.settings(MEDIA_ROOT=media_root):
+            response = self.client.post('/admin-api/api/exports/', {
+                'dataset': 'payments', 'export_format': 'csv', 'params': {'status': 'paid'}
+            }, format='json')
+            self.assertEqual(response.status_code, 201)
+            job_id = response.data['id']
+            self.assertEqual(self.client.get(f'/admin-api/api/exports/{job_id}/download/').status_code, 409)
+
+            call_command('run_export_jobs', stdout=StringIO())
+
+            job = self.client.get(f'/admin-api/api/exports/{job_id}/').data
+            self.assertEqual((job['status'], job['row_count']), ('completed', 3))
+            download = self.client.get(f'/admin-api/api/exports/{job_id}/download/')
+            self.assertEqual(len(b''.join(download.streaming_content).decode().splitlines()), 4)
+
+    def test_requires_report_permission(self):
+        client = APIClient()
+        client.force_authenticate(make_customer('export_outsider').user)
+        self.assertEqual(client.get('/admin-api/api/deliveries/export/').status_code, 403)
+        self.assertEqual(client.get('/admin-api/api/exports/stream/', {'dataset': 'payments'}).status_code, 403)
+
+    def test_exports_need_the_dataset_permission(self):
+        viewer = User.objects.create_user(username='export_viewer', password='pass12345')
+        AdminUser.objects.create(user=viewer, role='viewer')
+        client = APIClient()
+        client.force_authenticate(viewer)
+
+        self.assertEqual(client.get('/admin-api/api/exports/stream/', {'dataset': 'payments'}).status_code, 403)
+        self.assertEqual(client.get('/admin-api/api/exports/stream/', {'dataset': 'deliveries'}).status_code, 403)
+        response = client.post('/admin-api/api/exports/', {'dataset': 'deliveries'}, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(ExportJob.objects.exists())
+        self.assertFalse(AuditLog.objects.filter(user=viewer).exists())
+
+        response = client.get('/admin-api/api/exports/stream/', {'dataset': 'audit_logs'})
+        self.assertEqual(response.status_code, 200)
+        b''.join(response.streaming_content)
+        response = client.post('/admin-api/api/exports/', {'dataset': 'audit_logs'}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+
+class DeliverySearchTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='search_admin', password='pass12345')
+        AdminUser.objects.create(user=self.admin, role='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.customer = make_customer('search_customer')
+        self.customer.user.first_name, self.customer.user.last_name = 'Wanjiku', 'Otieno'
+        self.customer.user.save()
+        self.order = make_order(self.customer)
+        self.other = make_order(make_customer('other_customer'))
+        self.other.recipient_name = 'Jane Muthoni'
+        self.other.recipient_phone = '+254 733 000 111'
+        self.other.save(update_fields=['recipient_name', 'recipient_phone'])
+
+    def search(self, term):
+        response = self.client.get('/admin-api/api/deliveries/', {'search': term})
+        self.assertEqual(response.status_code, 200)
+        return {row['tracking_number'] for row in response.data['results']}
+
+    def test_search_document_is_kept_on_write(self):
+        self.assertEqual(
+            Delivery.objects.get(pk=self.other.pk).search_document,
+            f'{self.other.tracking_number.lower()} other_customer jane muthoni 254733000111',
+        )
+
+    def test_search_matches_names_phone_and_tracking_number(self):
+        order, other = self.order.tracking_number, self.other.tracking_number
+        self.assertEqual(self.search('wanjiku'), {order})
+        self.assertEqual(self.search('OTIENO wanj'), {order})
+        self.assertEqual(self.search('muthoni'), {other})
+        self.assertEqual(self.search('0733 000111'), {other})
+        self.assertEqual(self.search(order.lower()), {order})
+        self.assertEqual(self.search(order[4:9]), {order})
+        self.assertEqual(self.search('nobody'), set())
+
+    def test_rebuild_command_fills_missing_documents(self):
+        Delivery.objects.update(search_document='')
+        out = StringIO()
+        call_command('rebuild_delivery_search', chunk_size=1, stdout=out)
+        self.assertIn('Built search documents for 2 deliveries', out.getvalue())
+        self.assertEqual(self.search('wanjiku'), {self.order.tracking_number})
+
+    def test_migration_fills_existing_deliveries(self):
+        Delivery.objects.update(search_document='')
+        migration = importlib.import_module('delivery.migrations.0012_populate_search_document')
+        migration.populate_search_documents(django_apps, type('SchemaEditor', (), {'connection': connection})())
+        self.assertEqual(self.search('wanjiku'), {self.order.tracking_number})
+        self.assertEqual(self.search('muthoni'), {self.other.tracking_number})
+
+    def test_renaming_a_sender_rebuilds_their_documents(self):
+        user = self.customer.user
+        user.first_name = 'Akinyi'
+        user.save()
+        self.assertEqual(self.search('akinyi'), {self.order.tracking_number})
+        self.assertEqual(self.search('wanjiku'), set())
+
+        # Saves that cannot touch the names skip the check entirely
+        with self.assertNumQueries(1):
+            user.save(update_fields=['last_login'])
+
+
+class PermissionResolverTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def fresh_request(self, user):
+        # a new User instance per request, as authentication would load it
+        return type('Request', (), {'user': User.objects.get(pk=user.pk)})()
+
+    def test_role_permissions_are_cached_and_invalidated(self):
+        customer = make_customer('perm_customer')
+        check = HasRolePermission(['create_orders'])
+        self.assertTrue(check.has_permission(self.fresh_request(customer.user), None))
+
+        request = self.fresh_request(customer.user)
+        with self.assertNumQueries(0):
+            self.assertTrue(check.has_permission(request, None))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            role = Role.objects.get(name='customer')
+            role.permissions = {'create_orders': False, 'view_own_orders': True}
+            role.save()
+        self.assertFalse(check.has_permission(self.fresh_request(customer.user), None))
+
+    def test_role_revoked_by_another_worker_expires_within_seconds(self):
+        customer = make_customer('perm_revoked')
+        check = HasRolePermission(['create_orders'])
+        self.assertTrue(check.has_permission(self.fresh_request(customer.user), None))
+
+        # Deleted in another process: this process's cache is never bumped
+        UserRole.objects.filter(user=customer.user).delete()
+        self.assertTrue(check.has_permission(self.fresh_request(customer.user), None))
+        with mock.patch('time.time', return_value=time.time() + 31):
+            self.assertFalse(check.has_permission(self.fresh_request(customer.user), None))
+        cache.clear()
+
+    def test_admin_permissions_combine_default_and_custom_role(self):
+        user = User.objects.create_user(username='perm_admin', password='pass12345')
+        custom_role = AdminRole.objects.create(name='Dispatch', permissions={'manage_drivers': True})
+        with self.captureOnCommitCallbacks(execute=True):
+            admin_user = AdminUser.objects.create(user=user, role='viewer')
+
+        resolved = resolve_admin_permissions(self.fresh_request(user).user)
+        self.assertTrue(resolved.allows('view_reports'))
+        self.assertFalse(resolved.allows('manage_drivers'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            admin_user.custom_role = custom_role
+            admin_user.save()
+        resolved = resolve_admin_permissions(self.fresh_request(user).user)
+        self.assertTrue(resolved.allows('manage_drivers'))
+        self.assertIsNone(resolve_admin_permissions(make_customer('perm_outsider').user))
+
+
+class AdminCursorPaginationTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='list_admin', password='pass12345')
+        AdminUser.objects.create(user=user, role='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        customer = make_customer('list_customer')
+        self.deliveries = [make_order(customer) for _ in range(5)]
+
+    def test_cursor_pages_without_count(self):
+        response = self.client.get('/admin-api/api/deliveries/', {'page_size': 2, 'ordering': 'bogus'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('count', response.data)
+        seen = [row['id'] for row in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            seen += [row['id'] for row in response.data['results']]
+        self.assertEqual(seen, [delivery.id for delivery in reversed(self.deliveries)])
+
+    def test_opt_in_count_and_legacy_pages(self):
+        response = self.client.get('/admin-api/api/deliveries/', {'count': 'approximate', 'ordering': 'created_at'})
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual(response.data['results'][0]['id'], self.deliveries[0].id)
+
+        legacy = self.client.get('/admin-api/api/customers/', {'page': 1})
+        self.assertEqual(legacy.data['count'], 1)
+
+
+class DispatchTests(TestCase):
+    def test_hungarian_matches_brute_force(self):
+        rng = np.random.default_rng(7)
+        for shape in [(4, 4), (3, 5), (5, 3)]:
+            cost = rng.uniform(0, 10, size=shape)
+            narrow = cost if shape[0] <= shape[1] else cost.T
+            best = min(
+                sum(narrow[row, col] for row, col in enumerate(cols))
+                for cols in itertools.permutations(range(narrow.shape[1]), narrow.shape[0])
+            )
+            pairs = hungarian_assignment(cost)
+            self.assertEqual(len(pairs), min(shape))
+            self.assertAlmostEqual(sum(cost[row, col] for row, col in pairs), best)
+
+    def test_greedy_skips_infeasible_pairs(self):
+        cost = np.array([[1.0, INFEASIBLE], [INFEASIBLE, INFEASIBLE]])
+        self.assertEqual(greedy_assignment(cost), [(0, 0)])
+
+    def test_run_dispatch_assigns_suitable_riders(self):
+        customer = make_customer('dispatch_customer')
+        light = make_order(customer)
+        heavy = make_order(customer, status='pending')
+        Delivery.objects.filter(pk__in=[light.pk, heavy.pk]).update(
+            pickup_latitude=-1.2864, pickup_longitude=36.8172
+        )
+        heavy.package.weight = 60
+        heavy.package.save()
+
+        bike = make_rider('dispatch_bike')
+        car = make_rider('dispatch_car')
+        UserProfile.objects.filter(pk=bike.pk).update(is_available=True)
+        UserProfile.objects.filter(pk=car.pk).update(is_available=True, vehicle_type='car')
+        update_rider_location(bike, -1.2870, 36.8170)
+        update_rider_location(car, -1.3000, 36.8300)
+
+        result = run_dispatch(user=customer.user)
+
+        self.assertEqual(result['solver'], 'hungarian')
+        assigned = {row['delivery_id']: row['rider_id'] for row in result['assignments']}
+        self.assertEqual(assigned, {light.pk: bike.pk, heavy.pk: car.pk})
+        self.assertEqual(Delivery.objects.get(pk=heavy.pk).status, 'assigned')
+        self.assertEqual(AuditLog.objects.filter(details__action='auto_dispatch').count(), 2)
+
+        # riders now hold a job each, so the next tick has nothing to do
+        self.assertEqual(run_dispatch()['assignments'], [])
+
+    def test_busy_or_stale_riders_are_not_dispatched(self):
+        customer = make_customer('busy_customer')
+        pending = make_order(customer)
+        Delivery.objects.filter(pk=pending.pk).update(pickup_latitude=-1.2864, pickup_longitude=36.8172)
+
+        accepted = make_rider('accepted_rider')
+        arrived = make_rider('arrived_rider')
+        stale = make_rider('stale_rider')
+        for rider in (accepted, arrived, stale):
+            UserProfile.objects.filter(pk=rider.pk).update(is_available=True)
+            update_rider_location(rider, -1.2870, 36.8170)
+        make_order(customer, status='accepted', rider=accepted)
+        make_order(customer, status='arrived', rider=arrived)
+        UserProfile.objects.filter(pk=stale.pk).update(
+            last_location_update=timezone.now() - LOCATION_MAX_AGE - timedelta(minutes=1)
+        )
+
+        self.assertEqual(dispatchable_riders(), [])
+        self.assertEqual(run_dispatch()['assignments'], [])
+        self.assertEqual(Delivery.objects.get(pk=pending.pk).status, 'pending')
+
+
+class RouteOptimizationTests(TestCase):
+    def circle(self, count):
+        angles = np.linspace(0, 2 * np.pi, count, endpoint=False)
+        return [
+            {'latitude': -1.29 + 0.02 * np.sin(angle), 'longitude': 36.82 + 0.02 * np.cos(angle), 'address': str(index)}
+            for index, angle in enumerate(angles)
+        ]
+
+    def test_untangles_shuffled_stops(self):
+        waypoints = self.circle(30)
+        shuffled = [waypoints[0]] + [waypoints[index] for index in np.random.default_rng(3).permutation(range(1, 30))]
+        result = optimize_waypoints(shuffled)
+
+        addresses = [int(waypoint['address']) for waypoint in result['waypoints']]
+        self.assertEqual(addresses[0], 0)
+        # The best open tour from stop 0 walks round the circle one way
+        self.assertIn(addresses, [list(range(30)), [0] + list(range(29, 0, -1))])
+        self.assertLess(result['distance_km'], result['original_distance_km'])
+
+    def test_pins_both_ends(self):
+        rng = np.random.default_rng(5)
+        lats, lngs = rng.uniform(-1.35, -1.2, 40), rng.uniform(36.7, 36.95, 40)
+        plan = RoutePlan(distance_matrix(lats, lngs))
+        path = optimize_route(plan, start=3, end=17)
+        self.assertEqual((path[0], path[-1]), (3, 17))
+        self.assertEqual(sorted(path), list(range(40)))
+
+    def test_respects_time_windows(self):
+        start = timezone.now()
+        waypoints = self.circle(8)
+        # The far side of the circle must be served first
+        waypoints[4]['window_end'] = (start + timedelta(minutes=20)).isoformat()
+        result = optimize_waypoints(waypoints, start_time=start)
+
+        addresses = [int(waypoint['address']) for waypoint in result['waypoints']]
+        self.assertEqual(addresses[0], 0)
+        self.assertLess(addresses.index(4), 3)
+        self.assertEqual(result['late_minutes'], 0)
+        # Without the window the same stop is reached far later
+        del waypoints[4]['window_end']
+        plain = [int(waypoint['address']) for waypoint in optimize_waypoints(waypoints)['waypoints']]
+        self.assertEqual(plain.index(4), 4)
+
+    def test_optimize_endpoint_writes_back_the_route(self):
+        user = User.objects.create_user(username='route_admin', password='pass12345')
+        AdminUser.objects.create(user=user, role='admin')
+        waypoints = self.circle(12)
+        route = DeliveryRoute.objects.create(
+            name='CBD loop', waypoints=waypoints[:1] + waypoints[1:][::2] + waypoints[1:][1::2], created_by=user
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+
+        response = client.post(f'/admin-api/api/routes/{route.pk}/optimize/', {'pin_end': False}, format='json')
+        self.assertEqual(response.status_code, 200)
+        route.refresh_from_db()
+        self.assertTrue(route.is_optimized)
+        self.assertLess(float(route.estimated_distance), response.data['original_distance_km'])
+        self.assertGreater(route.estimated_duration, 0)
+        self.assertEqual(len(route.waypoints), 12)
+
+        route.waypoints = [{'address': 'nowhere'}]
+        route.save()
+        response = client.post(f'/admin-api/api/routes/{route.pk}/optimize/')
+        self.assertEqual(response.status_code, 400)
+
+
+class BatchingTests(TestCase):
+    HUB = (-1.2864, 36.8172)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='batch_admin', password='pass12345')
+        self.customer = make_customer('batch_sender')
+
+    def order(self, dropoff, pickup=HUB, weight=2, minutes=0):
+        delivery = make_order(self.customer)
+        Delivery.objects.filter(pk=delivery.pk).update(
+            pickup_latitude=pickup[0], pickup_longitude=pickup[1],
+            delivery_latitude=dropoff[0], delivery_longitude=dropoff[1],
+            estimated_pickup=timezone.now() + timedelta(minutes=minutes),
+        )
+        delivery.package.weight = weight
+        delivery.package.save()
+        return delivery
+
+    def test_clusters_by_pickup_dropoff_and_time(self):
+        westlands = [self.order((-1.2650 + 0.002 * i, 36.8030)) for i in range(3)]
+        south_b = [self.order((-1.3100 - 0.002 * i, 36.8350)) for i in range(3)]
+        later = self.order((-1.2650, 36.8030), minutes=240)
+        elsewhere = self.order((-1.2650, 36.8030), pickup=(-1.2200, 36.9000))
+
+        result = run_batching(self.user, vehicle_type='motorcycle')
+
+        batches = sorted(sorted(route['deliveries']) for route in result['routes'])
+        self.assertEqual(batches, sorted([sorted(d.pk for d in westlands), sorted(d.pk for d in south_b)]))
+        self.assertEqual(result['batched'], 6)
+
+        route = DeliveryRoute.objects.get(pk=result['routes'][0]['id'])
+        kinds = [waypoint['kind'] for waypoint in route.waypoints]
+        self.assertEqual(kinds, ['pickup'] * 3 + ['dropoff'] * 3)
+        self.assertEqual(route.deliveries.count(), 3)
+        self.assertEqual(route.vehicle_type, 'motorcycle')
+        self.assertGreater(route.estimated_duration, 0)
+
+        # Deliveries already on an active run are not batched again
+        self.assertEqual(run_batching(self.user, vehicle_type='motorcycle')['routes'], [])
+        self.assertFalse(DeliveryRoute.objects.filter(deliveries__in=[later, elsewhere]).exists())
+
+    def test_runs_fit_the_vehicle(self):
+        orders = [self.order((-1.2650, 36.8030), weight=8) for _ in range(5)]
+        self.order((-1.2650, 36.8030), weight=60)
+
+        result = run_batching(self.user, vehicle_type='motorcycle', dry_run=True)
+
+        self.assertFalse(DeliveryRoute.objects.exists())
+        weights = {delivery.pk: 8 for delivery in orders}
+        for route in result['routes']:
+            self.assertLessEqual(sum(weights[pk] for pk in route['deliveries']), 20)
+        self.assertEqual(result['batched'], 4)
+
+    def test_batch_endpoint(self):
+        AdminUser.objects.create(user=self.user, role='admin')
+        for i in range(2):
+            self.order((-1.2650 + 0.001 * i, 36.8030))
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        response = client.post('/admin-api/api/routes/batch_pending/', {'vehicle_type': 'bicycle'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['routes']), 1)
+        listed = client.get('/admin-api/api/routes/')
+        self.assertEqual(len(listed.data['results'][0]['deliveries']), 2)
+
+        response = client.post('/admin-api/api/routes/batch_pending/', {'vehicle_type': 'rocket'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_batched_deliveries_are_dispatched_as_a_run(self):
+        batched = [self.order((-1.2650 + 0.002 * i, 36.8030)) for i in range(3)]
+        single = self.order((-1.3500, 36.9000), pickup=(-1.2200, 36.9000))
+        route = DeliveryRoute.objects.get(pk=run_batching(self.user, vehicle_type='motorcycle')['routes'][0]['id'])
+        rider = make_rider('run_rider')
+
+        # Neither the dispatcher nor a single claim splits the open run
+        self.assertEqual([delivery.pk for delivery in pending_deliveries()], [single.pk])
+        self.assertEqual(claim_next_delivery(rider, rider.user).pk, single.pk)
+        self.assertIsNone(claim_next_delivery(rider, rider.user))
+
+        assign_route(route.pk, rider, self.user)
+        route.refresh_from_db()
+        self.assertEqual(route.rider, rider)
+        self.assertEqual(
+            set(Delivery.objects.filter(pk__in=[d.pk for d in batched]).values_list('status', 'rider')),
+            {('assigned', rider.pk)},
+        )
+        with self.assertRaises(DeliveryTransitionError):
+            assign_route(route.pk, make_rider('late_rider'), self.user)
+
+        # A stop handed back to the queue is dispatchable on its own again
+        change_status(batched[0].pk, 'pending', self.user)
+        self.assertEqual([delivery.pk for delivery in pending_deliveries()], [batched[0].pk])
+
+    def test_route_assignment_is_all_or_nothing(self):
+        batched = [self.order((-1.2650 + 0.002 * i, 36.8030), weight=6) for i in range(3)]
+        route = DeliveryRoute.objects.get(pk=run_batching(self.user, vehicle_type='motorcycle')['routes'][0]['id'])
+        rider = make_rider('small_rider')
+
+        UserProfile.objects.filter(pk=rider.pk).update(vehicle_type='bicycle')
+        rider.refresh_from_db()
+        with self.assertRaises(DeliveryTransitionError):
+            assign_route(route.pk, rider, self.user)
+
+        assign_rider(batched[1].pk, make_rider('other_rider'), self.user)
+        UserProfile.objects.filter(pk=rider.pk).update(vehicle_type='car')
+        rider.refresh_from_db()
+        with self.assertRaises(DeliveryTransitionError):
+            assign_route(route.pk, rider, self.user)
+        self.assertFalse(Delivery.objects.filter(rider=rider).exists())
+        self.assertIsNone(DeliveryRoute.objects.get(pk=route.pk).rider)
+
+        # A claim closes the broken run and frees its other stops
+        self.assertIsNone(claim_next_route(rider, rider.user))
+        self.assertFalse(DeliveryRoute.objects.get(pk=route.pk).is_active)
+        self.assertEqual(
+            {delivery.pk for delivery in pending_deliveries()}, {batched[0].pk, batched[2].pk}
+        )
+
+    def test_route_endpoints(self):
+        AdminUser.objects.create(user=self.user, role='admin')
+        for i in range(2):
+            self.order((-1.2650 + 0.001 * i, 36.8030))
+            self.order((-1.3100 - 0.001 * i, 36.8350), pickup=(-1.2200, 36.9000))
+        routes = run_batching(self.user, vehicle_type='motorcycle')['routes']
+        self.assertEqual(len(routes), 2)
+        rider = make_rider('endpoint_run_rider')
+        UserProfile.objects.filter(pk=rider.pk).update(is_available=True)
+        admin_client = APIClient()
+        admin_client.force_authenticate(self.user)
+
+        response = admin_client.post(f"/admin-api/api/routes/{routes[0]['id']}/assign/", {}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = admin_client.post(
+            f"/admin-api/api/routes/{routes[0]['id']}/assign/", {'rider_id': rider.pk}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['rider'], rider.pk)
+        self.assertTrue(AuditLog.objects.filter(model_name='DeliveryRoute', details__action='assign_rider').exists())
+        response = admin_client.post(
+            f"/admin-api/api/routes/{routes[0]['id']}/assign/", {'rider_id': rider.pk}, format='json'
+        )
+        self.assertEqual(response.status_code, 409)
+
+        rider_client = APIClient()
+        rider_client.force_authenticate(rider.user)
+        response = rider_client.post('/api/rider/claim-route/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], routes[1]['id'])
+        self.assertEqual(sorted(d['id'] for d in response.data['deliveries']), sorted(routes[1]['deliveries']))
+        empty = rider_client.post('/api/rider/claim-route/')
+        self.assertEqual((empty.status_code, empty.content), (204, b''))
 
-# Create your tests here.
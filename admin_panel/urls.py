@@ -5,7 +5,7 @@ from .views import (
     AdminUserViewSet, AdminRoleViewSet, SystemSettingsViewSet, AuditLogViewSet,
     DeliveryRouteViewSet, NotificationTemplateViewSet, SystemBackupViewSet,
     AdminDashboardViewSet, RiderManagementViewSet, UserManagementViewSet,
-    DeliveryManagementViewSet, CustomerManagementViewSet,
+    DeliveryManagementViewSet, CustomerManagementViewSet, ExportJobViewSet,
     admin_login, admin_token_refresh, admin_change_password
 )
 
@@ -22,6 +22,7 @@ router.register(r'riders', RiderManagementViewSet, basename='admin-riders')
 router.register(r'customers', CustomerManagementViewSet, basename='admin-customers')
 router.register(r'user-management', UserManagementViewSet, basename='admin-user-management')
 router.register(r'deliveries', DeliveryManagementViewSet, basename='admin-deliveries')
+router.register(r'exports', ExportJobViewSet, basename='admin-exports')
 
 urlpatterns = [
     path('api/', include(router.urls)),
@@ -1,26 +1,47 @@
 # admin_panel/views.py
-from rest_framework import viewsets, status, permissions
+from rest_framework import mixins, viewsets, status, permissions
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
-from django.db.models import Count, Q, Sum
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Count, Prefetch, Q, Sum
 from django.utils import timezone
-from django.db import connection
+from django.utils.dateparse import parse_datetime
+from django.db import connection, transaction
+from django.http import FileResponse
 import json
 from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from rest_framework_simplejwt.tokens import RefreshToken
 from core.logging_utils import log_api_error, log_app_error, log_db_error
-
-from .models import AdminUser, AdminRole, SystemSettings, AuditLog, DeliveryRoute, NotificationTemplate, SystemBackup
+from core.pagination import AdminCursorPagination
+from core.permissions import resolve_admin_permissions
+
+from .batching import assign_route, run_batching
+from .dispatch import run_dispatch
+from .exports import DATASET_PERMISSIONS, ExportError, export_response, validate_export
+from .filters import filter_audit_logs, filter_deliveries
+from .routing import AVERAGE_SPEED_KMH, RouteError, optimize_waypoints
+from .analytics import (
+    MAX_TREND_DAYS, TREND_GRANULARITIES, analytics_timezone, dashboard_stats, delivery_trends,
+    driver_performance
+)
+from .rollups import rollup_freshness
+from .settings_cache import get_public_settings_payload
+from .models import AdminUser, AdminRole, SystemSettings, AuditLog, DeliveryRoute, ExportJob, NotificationTemplate, SystemBackup
 from .serializers import (
     AdminUserSerializer, AdminUserCreateSerializer, AdminRoleSerializer, SystemSettingsSerializer,
-    AuditLogSerializer, DeliveryRouteSerializer, NotificationTemplateSerializer,
+    AuditLogSerializer, DeliveryRouteSerializer, ExportJobSerializer, NotificationTemplateSerializer,
     SystemBackupSerializer, AdminDashboardStatsSerializer, AdminLoginSerializer,
     AdminProfileUpdateSerializer, UserSerializer, UserProfileSerializer
 )
+from delivery.idempotency import idempotent
 from delivery.models import UserProfile, Delivery, Package, Payment
+from delivery.transitions import DeliveryTransitionError, assign_rider, change_status
+from delivery.rider_locations import DEFAULT_RADIUS_KM, nearest_riders, parse_coordinates
 from delivery.serializers import DeliverySerializer, DeliveryCreateSerializer
 # Driver is not a separate model, it's part of UserProfile
 Driver = UserProfile
@@ -140,17 +161,52 @@ class AdminPermissionMixin:
     
     def check_permission(self, permission_key):
         """Check if current admin user has specific permission"""
-        if not hasattr(self.request.user, 'admin_profile'):
+        resolved = resolve_admin_permissions(self.request.user)
+        if resolved is None:
             log_api_error('User does not have an admin profile')
             return False
         
-        admin_user = self.request.user.admin_profile
-        return admin_user.has_permission(permission_key)
+        return resolved.allows(permission_key)
     
     def get_permission_required(self):
         """Get required permission for this view"""
         return getattr(self, 'permission_required', None)
     
+    def export(self, request, dataset):
+        """Stream ``dataset`` filtered by the request's query params, as ?type=csv|jsonl|xlsx"""
+        # Checked here too: viewsets listing this mixin after the DRF base
+        # class never reach its check_permissions override
+        permission_required = self.get_permission_required()
+        if not permission_required or not self.check_permission(permission_required):
+            self.permission_denied(request, message="You don't have permission to access this resource.")
+
+        export_format = request.query_params.get('type', 'csv')
+        try:
+            validate_export(dataset, export_format)
+        except ExportError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        self.check_export_permission(dataset)
+
+        params = {key: value for key, value in request.query_params.items() if key != 'type'}
+        AuditLog.objects.create(
+            user=request.user,
+            action='export',
+            model_name=dataset,
+            details={'format': export_format, 'params': params}
+        )
+        return export_response(
+            dataset, export_format, params, asynchronous=isinstance(request._request, ASGIRequest)
+        )
+
+    def check_export_permission(self, dataset):
+        """An export reveals a whole dataset, so it needs that dataset's own permission"""
+        if not self.check_permission(DATASET_PERMISSIONS[dataset]):
+            log_api_error(f'Permission denied for {dataset} export')
+            self.permission_denied(
+                self.request,
+                message="You don't have permission to export this data."
+            )
+
     def check_permissions(self, request):
         """Override to add admin permission check"""
         super().check_permissions(request)
@@ -318,6 +374,12 @@ class SystemSettingsViewSet(viewsets.ModelViewSet, AdminPermissionMixin):
     serializer_class = SystemSettingsSerializer
     queryset = SystemSettings.objects.all()
 
+    def get_permission_required(self):
+        # Public settings are served to unauthenticated clients
+        if self.action == 'public_settings':
+            return None
+        return super().get_permission_required()
+
     def get_queryset(self):
         queryset = super().get_queryset()
 
@@ -367,14 +429,16 @@ class SystemSettingsViewSet(viewsets.ModelViewSet, AdminPermissionMixin):
             log_api_error(f'Error fetching categories: {str(e)}')
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], permission_classes=[permissions.AllowAny], authentication_classes=[])
     def public_settings(self, request):
         """Get public settings that can be accessed by frontend"""
         try:
-            settings = SystemSettings.objects.filter(
-                category__in=['public', 'frontend']
-            ).values('key', 'value', 'setting_type')
-            return Response({'settings': list(settings)})
+            etag, payload = get_public_settings_payload()
+            if_none_match = request.headers.get('If-None-Match', '')
+            client_etags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+            if etag in client_etags or '*' in client_etags:
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+            return Response(payload, headers={'ETag': etag, 'Cache-Control': 'no-cache'})
         except Exception as e:
             log_api_error(f'Error fetching public settings: {str(e)}')
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -385,46 +449,68 @@ class AuditLogViewSet(viewsets.ReadOnlyModelViewSet, AdminPermissionMixin):
     permission_required = 'view_reports'
     serializer_class = AuditLogSerializer
     queryset = AuditLog.objects.select_related('user').all()
+    pagination_class = AdminCursorPagination
+    cursor_ordering = ('-timestamp', '-id')
     
     def get_queryset(self):
-        queryset = super().get_queryset()
-        
-        # Filter by user if specified
-        user_id = self.request.query_params.get('user_id', None)
-        if user_id:
-            queryset = queryset.filter(user_id=user_id)
-        
-        # Filter by action if specified
-        action = self.request.query_params.get('action', None)
-        if action:
-            queryset = queryset.filter(action=action)
-        
-        # Filter by date range
-        start_date = self.request.query_params.get('start_date', None)
-        end_date = self.request.query_params.get('end_date', None)
-        
-        if start_date:
-            try:
-                start_date = datetime.strptime(start_date, '%Y-%m-%d')
-                queryset = queryset.filter(timestamp__date__gte=start_date.date())
-            except ValueError:
-                pass
-        
-        if end_date:
-            try:
-                end_date = datetime.strptime(end_date, '%Y-%m-%d')
-                queryset = queryset.filter(timestamp__date__lte=end_date.date())
-            except ValueError:
-                pass
-        
-        return queryset
+        # user_id, action, start_date and end_date filters
+        return filter_audit_logs(super().get_queryset(), self.request.query_params)
+
+    @action(detail=False, methods=['get'], url_path='export')
+    def export_logs(self, request):
+        """Download the filtered audit log"""
+        return self.export(request, 'audit_logs')
+
+
+class ExportJobViewSet(AdminPermissionMixin, mixins.CreateModelMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Exports too large for one request, written to a file in the background
+    by ``run_export_jobs``. ``stream`` downloads any dataset directly.
+    """
+    permission_required = 'view_reports'
+    serializer_class = ExportJobSerializer
+    queryset = ExportJob.objects.select_related('created_by').all()
+
+    def get_queryset(self):
+        return super().get_queryset().filter(created_by=self.request.user)
+
+    def perform_create(self, serializer):
+        try:
+            validate_export(serializer.validated_data['dataset'], serializer.validated_data.get('export_format', 'csv'))
+        except ExportError as e:
+            raise ValidationError({'error': str(e)})
+        self.check_export_permission(serializer.validated_data['dataset'])
+        job = serializer.save(created_by=self.request.user)
+        AuditLog.objects.create(
+            user=self.request.user,
+            action='export',
+            model_name=job.dataset,
+            object_id=str(job.id),
+            details={'format': job.export_format, 'params': job.params}
+        )
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """Download a completed export's file"""
+        job = self.get_object()
+        self.check_export_permission(job.dataset)
+        if job.status != 'completed' or not job.file:
+            return Response({'error': f'Export is {job.status}'}, status=status.HTTP_409_CONFLICT)
+        return FileResponse(job.file.open('rb'), as_attachment=True, filename=job.file.name.rsplit('/', 1)[-1])
+
+    @action(detail=False, methods=['get'])
+    def stream(self, request):
+        """Download ?dataset= (deliveries, payments or audit_logs) with its list filters"""
+        return self.export(request, request.query_params.get('dataset'))
 
 
 class DeliveryRouteViewSet(viewsets.ModelViewSet, AdminPermissionMixin):
     """ViewSet for managing delivery routes"""
     permission_required = 'manage_deliveries'
     serializer_class = DeliveryRouteSerializer
-    queryset = DeliveryRoute.objects.select_related('created_by').all()
+    queryset = DeliveryRoute.objects.select_related('created_by').prefetch_related(
+        Prefetch('deliveries', queryset=Delivery.objects.only('id'))
+    ).all()
     
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -443,25 +529,123 @@ class DeliveryRouteViewSet(viewsets.ModelViewSet, AdminPermissionMixin):
             log_api_error(f'Error creating delivery route: {str(e)}')
             raise
     
+    @action(detail=False, methods=['post'])
+    def batch_pending(self, request):
+        """
+        Cluster pending deliveries into multi-stop runs, one route each.
+
+        Body (all optional): ``vehicle_type`` to size runs for (default: the
+        most common vehicle among available riders), ``limit``, ``dry_run``,
+        ``pickup_radius_km``, ``dropoff_radius_km`` and ``window_minutes``.
+        """
+        try:
+            radii = {
+                name: float(request.data[name])
+                for name in ('pickup_radius_km', 'dropoff_radius_km', 'window_minutes')
+                if request.data.get(name) not in (None, '')
+            }
+            if any(value <= 0 for value in radii.values()):
+                return Response({'error': 'Radii and window must be positive'}, status=status.HTTP_400_BAD_REQUEST)
+            result = run_batching(
+                request.user,
+                vehicle_type=request.data.get('vehicle_type') or None,
+                limit=min(int(request.data.get('limit', 500)), 2000),
+                dry_run=str(request.data.get('dry_run', False)).lower() == 'true',
+                **radii
+            )
+            return Response(result)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            log_api_error(f'Error batching deliveries: {str(e)}')
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=True, methods=['post'])
+    def assign(self, request, pk=None):
+        """Assign every delivery on an open run to one rider"""
+        route = self.get_object()
+        rider_id = request.data.get('rider_id')
+
+        if not rider_id:
+            return Response({'error': 'rider_id is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            rider = Driver.objects.get(id=rider_id, user_type__in=['rider', 'both'], status='active')
+        except Driver.DoesNotExist:
+            return Response({'error': 'Rider not found or not available'}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            route = assign_route(route.pk, rider, request.user)
+        except DeliveryTransitionError as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+
+        AuditLog.objects.create(
+            user=request.user,
+            action='update',
+            model_name='DeliveryRoute',
+            object_id=str(route.id),
+            details={'action': 'assign_rider', 'rider_id': rider.id}
+        )
+
+        return Response(self.get_serializer(route).data)
+
     @action(detail=True, methods=['post'])
     def optimize(self, request, pk=None):
-        """Mark route as optimized"""
+        """
+        Reorder the route's waypoints into a short tour and store the
+        resulting distance and duration.
+
+        Body (all optional): ``pin_start`` (default true) keeps the first
+        waypoint first, ``pin_end`` keeps the last one last, ``start_time``
+        anchors waypoint time windows and ``speed_kmh`` sets the riding speed.
+        """
         try:
             route = self.get_object()
+            start_time = None
+            if request.data.get('start_time'):
+                start_time = parse_datetime(str(request.data['start_time']))
+                if start_time is None:
+                    return Response({'error': 'Invalid start_time'}, status=status.HTTP_400_BAD_REQUEST)
+                if timezone.is_naive(start_time):
+                    start_time = timezone.make_aware(start_time)
+            speed_kmh = float(request.data.get('speed_kmh', AVERAGE_SPEED_KMH))
+            if speed_kmh <= 0:
+                return Response({'error': 'speed_kmh must be positive'}, status=status.HTTP_400_BAD_REQUEST)
+
+            result = optimize_waypoints(
+                route.waypoints or [],
+                pin_start=str(request.data.get('pin_start', True)).lower() == 'true',
+                pin_end=str(request.data.get('pin_end', False)).lower() == 'true',
+                start_time=start_time,
+                speed_kmh=speed_kmh,
+            )
+            route.waypoints = result['waypoints']
+            route.estimated_distance = round(result['distance_km'], 2)
+            route.estimated_duration = result['duration_minutes']
             route.is_optimized = True
             route.save()
-            
+
             # Log the action
             AuditLog.objects.create(
                 user=request.user,
                 action='update',
                 model_name='DeliveryRoute',
                 object_id=str(route.id),
-                details={'action': 'optimized'}
+                details={
+                    'action': 'optimized',
+                    'original_distance_km': round(result['original_distance_km'], 2),
+                    'distance_km': round(result['distance_km'], 2),
+                    'late_minutes': result['late_minutes'],
+                }
             )
-            
+
             serializer = self.get_serializer(route)
-            return Response(serializer.data)
+            data = serializer.data
+            data['original_distance_km'] = round(result['original_distance_km'], 2)
+            data['late_minutes'] = result['late_minutes']
+            return Response(data)
+        except (RouteError, ValueError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             log_api_error(f'Error optimizing route: {str(e)}')
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -560,59 +744,8 @@ class AdminDashboardViewSet(AdminPermissionMixin, viewsets.ViewSet):
     def stats(self, request):
         """Get dashboard statistics"""
         try:
-            # Get basic counts
-            total_customers = UserProfile.objects.filter(user_type__in=['customer', 'both']).count()
-            total_riders = UserProfile.objects.filter(user_type__in=['rider', 'both']).count()
-            pending_riders = UserProfile.objects.filter(user_type__in=['rider', 'both'], status='pending_approval').count()
-            total_deliveries = Delivery.objects.count()
-            
-            # Get pending deliveries
-            pending_deliveries = Delivery.objects.filter(
-                status__in=['pending', 'assigned', 'picked_up', 'in_transit']
-            ).count()
-            
-            # Get today's completed deliveries
-            today = timezone.now().date()
-            completed_deliveries_today = Delivery.objects.filter(
-                status='delivered',
-                actual_delivery__date=today
-            ).count()
-            
-            # Get today's revenue
-            total_revenue_today = Payment.objects.filter(
-                status='paid',
-                paid_at__date=today
-            ).aggregate(total=Sum('amount'))['total'] or 0
-            
-            # Get active riders
-            active_riders = Driver.objects.filter(status='active', is_available=True).count()
-            
-            # Calculate delivery success rate
-            total_deliveries_30_days = Delivery.objects.filter(
-                created_at__gte=timezone.now() - timedelta(days=30)
-            ).count()
-            
-            successful_deliveries_30_days = Delivery.objects.filter(
-                status='delivered',
-                created_at__gte=timezone.now() - timedelta(days=30)
-            ).count()
-            
-            delivery_success_rate = 0
-            if total_deliveries_30_days > 0:
-                delivery_success_rate = (successful_deliveries_30_days / total_deliveries_30_days) * 100
-            
-            stats = {
-                'total_customers': total_customers,
-                'total_drivers': total_riders,
-                'pending_riders': pending_riders,
-                'total_deliveries': total_deliveries,
-                'pending_deliveries': pending_deliveries,
-                'completed_deliveries_today': completed_deliveries_today,
-                'total_revenue_today': float(total_revenue_today),
-                'active_drivers': active_riders,
-                'delivery_success_rate': round(delivery_success_rate, 2)
-            }
-            
+            stats = dashboard_stats()
+
             serializer = AdminDashboardStatsSerializer(stats)
             return Response(serializer.data)
         except Exception as e:
@@ -633,31 +766,38 @@ class AdminDashboardViewSet(AdminPermissionMixin, viewsets.ViewSet):
     
     @action(detail=False, methods=['get'])
     def delivery_trends(self, request):
-        """Get delivery trends for the last 30 days"""
+        """Get delivery trends for the last N days (default 30)"""
         try:
             days = int(request.query_params.get('days', 30))
-            
-            # Get delivery counts for the last N days
-            trend_data = []
-            for i in range(days):
-                date = timezone.now().date() - timedelta(days=i)
-                
-                created_count = Delivery.objects.filter(
-                    created_at__date=date
-                ).count()
-                
-                completed_count = Delivery.objects.filter(
-                    status='delivered',
-                    actual_delivery__date=date
-                ).count()
-                
-                trend_data.append({
-                    'date': date.isoformat(),
-                    'created': created_count,
-                    'completed': completed_count
-                })
-            
-            return Response({'trends': trend_data})
+        except ValueError:
+            return Response({'error': 'days must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= days <= MAX_TREND_DAYS:
+            return Response(
+                {'error': f'days must be between 1 and {MAX_TREND_DAYS}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        granularity = request.query_params.get('granularity', 'day')
+        if granularity not in TREND_GRANULARITIES:
+            return Response(
+                {'error': f'granularity must be one of: {", ".join(TREND_GRANULARITIES)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        tz_name = request.query_params.get('tz')
+        try:
+            tz = ZoneInfo(tz_name) if tz_name else analytics_timezone()
+        except (ZoneInfoNotFoundError, ValueError):
+            return Response({'error': f'Unknown timezone: {tz_name}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            trend_data = delivery_trends(days=days, granularity=granularity, tz=tz)
+            return Response({
+                'trends': trend_data,
+                'granularity': granularity,
+                'timezone': str(tz),
+                'as_of': rollup_freshness(),
+            })
         except Exception as e:
             log_api_error(f'Error fetching delivery trends: {str(e)}')
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -666,29 +806,7 @@ class AdminDashboardViewSet(AdminPermissionMixin, viewsets.ViewSet):
     def driver_performance(self, request):
         """Get driver performance statistics"""
         try:
-            drivers = Driver.objects.select_related('user').annotate(
-                total_deliveries=Count('delivery'),
-                completed_deliveries=Count('delivery', filter=Q(delivery__status='delivered')),
-                pending_deliveries=Count('delivery', filter=Q(delivery__status__in=['pending', 'assigned', 'picked_up', 'in_transit']))
-            ).order_by('-completed_deliveries')[:10]
-            
-            driver_data = []
-            for driver in drivers:
-                total = driver.total_deliveries
-                completed = driver.completed_deliveries
-                success_rate = (completed / total * 100) if total > 0 else 0
-                
-                driver_data.append({
-                    'id': driver.id,
-                    'name': driver.user.get_full_name() or driver.user.username,
-                    'total_deliveries': total,
-                    'completed_deliveries': completed,
-                    'pending_deliveries': driver.pending_deliveries,
-                    'success_rate': round(success_rate, 2),
-                    'is_available': driver.is_available
-                })
-            
-            return Response({'drivers': driver_data})
+            return Response({'drivers': driver_performance()})
         except Exception as e:
             log_api_error(f'Error fetching driver performance: {str(e)}')
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -697,11 +815,36 @@ class RiderManagementViewSet(viewsets.ModelViewSet, AdminPermissionMixin):
     """ViewSet for managing riders specifically"""
     permission_required = 'manage_drivers'
     serializer_class = UserProfileSerializer
+    pagination_class = AdminCursorPagination
 
     def get_queryset(self):
         """Filter to only show riders"""
-        return Driver.objects.filter(user_type__in=['rider', 'both']).select_related('user').order_by('-created_at')
+        return Driver.objects.filter(user_type__in=['rider', 'both']).select_related('user').order_by('-created_at', '-id')
     
+    @action(detail=False, methods=['get'])
+    def nearby(self, request):
+        """Available riders closest to a point, e.g. a pickup location"""
+        try:
+            lat, lng = parse_coordinates(request.query_params.get('lat'), request.query_params.get('lng'))
+            radius = float(request.query_params.get('radius', DEFAULT_RADIUS_KM))
+            k = int(request.query_params.get('k', 10))
+        except (TypeError, ValueError):
+            return Response({'error': 'lat and lng are required; radius and k must be numbers'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not 0 < radius <= 100 or not 0 < k <= 100:
+            return Response({'error': 'radius must be in (0, 100] km and k in (0, 100]'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        vehicle_types = request.query_params.get('vehicle_types')
+        riders = nearest_riders(
+            lat, lng, radius=radius, k=k,
+            vehicle_types=vehicle_types.split(',') if vehicle_types else None,
+        )
+        data = self.get_serializer(riders, many=True).data
+        for row, rider in zip(data, riders):
+            row['distance_km'] = rider.distance_km
+        return Response({'riders': data})
+
     @action(detail=False, methods=['get'])
     def pending_approvals(self, request):
         """Get riders pending approval"""
@@ -774,10 +917,11 @@ class CustomerManagementViewSet(viewsets.ModelViewSet, AdminPermissionMixin):
     """ViewSet for managing customers from admin panel"""
     permission_required = 'manage_customers'
     serializer_class = UserProfileSerializer
+    pagination_class = AdminCursorPagination
 
     def get_queryset(self):
         """Filter to only show customers"""
-        return Driver.objects.filter(user_type__in=['customer', 'both']).select_related('user').order_by('-created_at')
+        return Driver.objects.filter(user_type__in=['customer', 'both']).select_related('user').order_by('-created_at', '-id')
 
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
@@ -840,28 +984,32 @@ class UserManagementViewSet(viewsets.ViewSet, AdminPermissionMixin):
     def users_summary(self, request):
         """Get summary of all users"""
         try:
-            # Get customers
-            customers = UserProfile.objects.filter(user_type__in=['customer', 'both'])
-            customer_summary = {
-                'total': customers.count(),
-                'active': customers.filter(status='active').count(),
-                'inactive': customers.filter(status='inactive').count(),
-                'suspended': customers.filter(status='suspended').count()
-            }
-            
-            # Get riders
-            riders = Driver.objects.all()
-            rider_summary = {
-                'total': riders.count(),
-                'active': riders.filter(status='active').count(),
-                'pending_approval': riders.filter(status='pending_approval').count(),
-                'suspended': riders.filter(status='suspended').count(),
-                'available': riders.filter(status='active', is_available=True).count()
-            }
-            
+            summary = UserProfile.objects.aggregate(
+                customers_total=Count('id', filter=Q(user_type__in=['customer', 'both'])),
+                customers_active=Count('id', filter=Q(user_type__in=['customer', 'both'], status='active')),
+                customers_inactive=Count('id', filter=Q(user_type__in=['customer', 'both'], status='inactive')),
+                customers_suspended=Count('id', filter=Q(user_type__in=['customer', 'both'], status='suspended')),
+                riders_total=Count('id'),
+                riders_active=Count('id', filter=Q(status='active')),
+                riders_pending_approval=Count('id', filter=Q(status='pending_approval')),
+                riders_suspended=Count('id', filter=Q(status='suspended')),
+                riders_available=Count('id', filter=Q(status='active', is_available=True)),
+            )
+
             return Response({
-                'customers': customer_summary,
-                'riders': rider_summary
+                'customers': {
+                    'total': summary['customers_total'],
+                    'active': summary['customers_active'],
+                    'inactive': summary['customers_inactive'],
+                    'suspended': summary['customers_suspended']
+                },
+                'riders': {
+                    'total': summary['riders_total'],
+                    'active': summary['riders_active'],
+                    'pending_approval': summary['riders_pending_approval'],
+                    'suspended': summary['riders_suspended'],
+                    'available': summary['riders_available']
+                }
             })
         except Exception as e:
             log_api_error(f'Error fetching users summary: {str(e)}')
@@ -922,6 +1070,15 @@ class DeliveryManagementViewSet(viewsets.ModelViewSet, AdminPermissionMixin):
     permission_required = 'manage_deliveries'
     queryset = Delivery.objects.select_related('sender__user', 'rider__user', 'package', 'payment').all()
     serializer_class = DeliverySerializer
+    pagination_class = AdminCursorPagination
+
+    # ?ordering= values mapped to sort keys backed by an index
+    CURSOR_ORDERINGS = {
+        'created_at': ('created_at', 'id'),
+        '-created_at': ('-created_at', '-id'),
+        'tracking_number': ('tracking_number',),
+        '-tracking_number': ('-tracking_number',),
+    }
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -929,39 +1086,58 @@ class DeliveryManagementViewSet(viewsets.ModelViewSet, AdminPermissionMixin):
         return DeliverySerializer
 
     def get_queryset(self):
-        queryset = super().get_queryset()
-
-        # Search functionality
-        search = self.request.query_params.get('search', None)
-        if search:
-            queryset = queryset.filter(
-                Q(tracking_number__icontains=search) |
-                Q(sender__user__first_name__icontains=search) |
-                Q(sender__user__last_name__icontains=search) |
-                Q(sender__user__username__icontains=search) |
-                Q(recipient_name__icontains=search) |
-                Q(recipient_phone__icontains=search)
-            )
-
-        # Status filter
-        status = self.request.query_params.get('status', None)
-        if status:
-            queryset = queryset.filter(status=status)
-
-        # Priority filter
-        priority = self.request.query_params.get('priority', None)
-        if priority:
-            queryset = queryset.filter(priority=priority)
+        # search, status and priority filters
+        queryset = filter_deliveries(super().get_queryset(), self.request.query_params)
 
         # Ordering
+        return queryset.order_by(*self.get_cursor_ordering())
+
+    def get_cursor_ordering(self):
+        """Requested ordering if it is an indexed sort key, else newest first"""
         ordering = self.request.query_params.get('ordering', '-created_at')
-        queryset = queryset.order_by(ordering)
+        return self.CURSOR_ORDERINGS.get(ordering, self.CURSOR_ORDERINGS['-created_at'])
 
-        return queryset
+    def create(self, request, *args, **kwargs):
+        return idempotent(
+            request, 'admin_delivery_create', request.user, request.data,
+            lambda: super(DeliveryManagementViewSet, self).create(request, *args, **kwargs),
+            lambda body, status: Response(body, status=status),
+        )
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
+    def perform_update(self, serializer):
+        # Status changes go through the state machine, not a plain field write
+        new_status = serializer.validated_data.pop('status', None)
+        with transaction.atomic():
+            delivery = serializer.save()
+            if new_status and new_status != delivery.status:
+                try:
+                    change_status(delivery.pk, new_status, self.request.user)
+                except DeliveryTransitionError as e:
+                    raise ValidationError({'status': str(e)})
+
+    @action(detail=False, methods=['get'], url_path='export')
+    def export_deliveries(self, request):
+        """Download the filtered delivery list"""
+        return self.export(request, 'deliveries')
+
+    @action(detail=False, methods=['post'])
+    def auto_dispatch(self, request):
+        """Match all pending deliveries to available riders in one batch"""
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('true', '1', 'yes')
+        solver = request.data.get('solver')
+        if solver not in (None, '', 'hungarian', 'greedy'):
+            return Response({'error': 'solver must be hungarian or greedy'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            result = run_dispatch(user=request.user, solver=solver or None, dry_run=dry_run)
+        except Exception as e:
+            log_api_error(f'Error running auto dispatch: {str(e)}')
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response(result)
+
     @action(detail=True, methods=['post'])
     def assign_rider(self, request, pk=None):
         """Assign a rider to a delivery"""
@@ -973,9 +1149,10 @@ class DeliveryManagementViewSet(viewsets.ModelViewSet, AdminPermissionMixin):
 
         try:
             rider = Driver.objects.get(id=rider_id, user_type__in=['rider', 'both'], status='active')
-            delivery.rider = rider
-            delivery.status = 'assigned'
-            delivery.save()
+            try:
+                delivery = assign_rider(delivery.pk, rider, request.user)
+            except DeliveryTransitionError as e:
+                return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
 
             # Log the assignment
             AuditLog.objects.create(
@@ -1005,10 +1182,13 @@ class DeliveryManagementViewSet(viewsets.ModelViewSet, AdminPermissionMixin):
             return Response({'error': 'Invalid status'}, status=status.HTTP_400_BAD_REQUEST)
 
         old_status = delivery.status
-        delivery.status = new_status
-        if notes:
-            delivery.notes = notes
-        delivery.save()
+        try:
+            delivery = change_status(
+                delivery.pk, new_status, request.user, notes=notes,
+                reason=request.data.get('cancellation_reason', '')
+            )
+        except DeliveryTransitionError as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
 
         # Log the status update
         AuditLog.objects.create(
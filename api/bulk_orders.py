@@ -0,0 +1,317 @@
+# api/bulk_orders.py
+"""
+Bulk order import for merchants.
+
+A manifest (JSON array, CSV or XLSX) is read row by row and handled in
+batches: each batch is validated, priced and trip-estimated with one
+vectorised call each, then written with three bulk inserts (packages,
+deliveries, payments). Rows that fail validation are reported back with
+their row number and do not stop the rest of the import.
+"""
+import codecs
+import csv
+import json
+import uuid
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from admin_panel.pricing import quote_orders
+from delivery.estimates import estimate_trips, parse_trip_coordinates
+from delivery.models import Delivery, Package, Payment
+from delivery.search import build_search_document
+
+BATCH_SIZE = 500
+MAX_IMPORT_ROWS = 20000
+
+# Required text columns; ``weight`` is required too. Optional columns:
+# reference, package_type, length, width, height (cm), declared_value,
+# requires_insurance, priority, estimated_pickup, estimated_delivery,
+# pickup/delivery latitude and longitude, payment_method, cod_amount and
+# special_instructions.
+TEXT_COLUMNS = ('recipient_name', 'recipient_phone', 'pickup_address', 'delivery_address', 'description')
+
+# Delivery window used when a row has no estimated_delivery, per the
+# upper bound of each Delivery.PRIORITY_CHOICES label
+PRIORITY_WINDOWS = {1: timedelta(hours=48), 2: timedelta(hours=24), 3: timedelta(hours=6), 4: timedelta(hours=2)}
+
+# Largest value of the 10 digit, 2 decimal money fields
+MAX_AMOUNT = Decimal('99999999.99')
+
+PACKAGE_TYPES = {value for value, _ in Package.PACKAGE_TYPES}
+PAYMENT_METHODS = {value for value, _ in Payment.PAYMENT_METHODS}
+MAX_LENGTHS = {
+    'recipient_name': Delivery._meta.get_field('recipient_name').max_length,
+    'recipient_phone': Delivery._meta.get_field('recipient_phone').max_length,
+    'description': Package._meta.get_field('description').max_length,
+}
+
+
+class ManifestError(ValueError):
+    pass
+
+
+def _csv_rows(file):
+    reader = csv.DictReader(codecs.iterdecode(file, 'utf-8-sig'))
+    try:
+        if not reader.fieldnames:
+            raise ManifestError('The CSV file has no header row')
+        yield from reader
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise ManifestError(f'The CSV file could not be read: {e}')
+
+
+def _xlsx_rows(file):
+    from openpyxl import load_workbook
+
+    try:
+        # read_only streams rows instead of loading the whole sheet
+        workbook = load_workbook(file, read_only=True, data_only=True)
+    except Exception:
+        raise ManifestError('The file is not a valid XLSX workbook')
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if not header:
+            raise ManifestError('The XLSX sheet has no header row')
+        header = [str(name).strip() if name is not None else '' for name in header]
+        for values in rows:
+            if any(value not in (None, '') for value in values):
+                yield dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def manifest_rows(data=None, file=None):
+    """Iterate over the rows of a JSON ``orders`` list or an uploaded CSV/XLSX/JSON file"""
+    if file is None:
+        if not isinstance(data, list):
+            raise ManifestError('orders must be a list')
+        return iter(data)
+
+    name = (file.name or '').lower()
+    if name.endswith('.csv') or file.content_type == 'text/csv':
+        return _csv_rows(file)
+    if name.endswith('.xlsx'):
+        return _xlsx_rows(file)
+    if name.endswith('.json') or file.content_type == 'application/json':
+        try:
+            data = json.load(file)
+        except ValueError:
+            raise ManifestError('The file is not valid JSON')
+        return manifest_rows(data.get('orders') if isinstance(data, dict) else data)
+    raise ManifestError('Upload a .csv, .xlsx or .json file')
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        # Spreadsheets turn phone numbers and references into floats
+        value = int(value)
+    return str(value).strip()
+
+
+def _decimal(row, field, errors, default=None, minimum=0, maximum=Decimal('9999.99')):
+    value = _text(row.get(field))
+    if not value:
+        return default
+    try:
+        value = Decimal(value)
+    except InvalidOperation:
+        errors[field] = 'Enter a number.'
+        return None
+    if not value.is_finite() or not minimum <= value <= maximum:
+        errors[field] = f'Must be between {minimum} and {maximum}.'
+        return None
+    return value
+
+
+def _datetime(row, field, errors):
+    value = row.get(field)
+    if value in (None, ''):
+        return None
+    if not hasattr(value, 'tzinfo'):
+        value = parse_datetime(_text(value))
+        if value is None:
+            errors[field] = 'Enter a valid date/time.'
+            return None
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def clean_row(row, now):
+    """Validated values of one manifest row and a dict of field errors"""
+    if not isinstance(row, dict):
+        return None, {'row': 'Each order must be an object.'}
+    errors = {}
+    values = {field: _text(row.get(field)) for field in TEXT_COLUMNS}
+    for field in TEXT_COLUMNS:
+        if not values[field]:
+            errors[field] = 'This field is required.'
+        elif field in MAX_LENGTHS and len(values[field]) > MAX_LENGTHS[field]:
+            errors[field] = f'Ensure this field has no more than {MAX_LENGTHS[field]} characters.'
+
+    values['weight'] = _decimal(row, 'weight', errors, minimum=Decimal('0.01'))
+    if values['weight'] is None and 'weight' not in errors:
+        errors['weight'] = 'This field is required.'
+    for field in ('length', 'width', 'height'):
+        values[field] = _decimal(row, field, errors)
+    values['declared_value'] = _decimal(row, 'declared_value', errors, default=Decimal('0'), maximum=MAX_AMOUNT)
+    values['cod_amount'] = _decimal(row, 'cod_amount', errors, default=Decimal('0'), maximum=MAX_AMOUNT)
+    values['requires_insurance'] = _text(row.get('requires_insurance')).lower() in ('true', '1', 'yes', 'on')
+
+    values['package_type'] = _text(row.get('package_type')) or 'parcel'
+    if values['package_type'] not in PACKAGE_TYPES:
+        errors['package_type'] = f'"{values["package_type"]}" is not a valid choice.'
+    values['payment_method'] = _text(row.get('payment_method')) or 'cash'
+    if values['payment_method'] not in PAYMENT_METHODS:
+        errors['payment_method'] = f'"{values["payment_method"]}" is not a valid choice.'
+    try:
+        values['priority'] = int(_text(row.get('priority')) or 1)
+        if values['priority'] not in PRIORITY_WINDOWS:
+            raise ValueError
+    except ValueError:
+        errors['priority'] = 'Must be 1, 2, 3 or 4.'
+
+    try:
+        values.update(parse_trip_coordinates(row))
+    except ValueError as e:
+        errors['coordinates'] = str(e)
+
+    pickup = _datetime(row, 'estimated_pickup', errors) or now
+    values['estimated_pickup'] = pickup
+    values['estimated_delivery'] = _datetime(row, 'estimated_delivery', errors)
+    if values['estimated_delivery'] is None and 'priority' not in errors:
+        values['estimated_delivery'] = pickup + PRIORITY_WINDOWS[values['priority']]
+
+    values['reference'] = _text(row.get('reference'))
+    values['special_instructions'] = _text(row.get('special_instructions'))
+    return values, errors
+
+
+def _create_batch(rows, sender, user):
+    """Price, estimate and insert a batch of cleaned rows; returns their tracking numbers and fees"""
+    coordinate_fields = ('pickup_latitude', 'pickup_longitude', 'delivery_latitude', 'delivery_longitude')
+    coordinates = np.array(
+        [[row.get(field, np.nan) for field in coordinate_fields] for row in rows], dtype=float
+    ).reshape(-1, 4)
+    distances = np.full(len(rows), np.nan)
+    minutes = np.zeros(len(rows), dtype=int)
+    known = ~np.isnan(coordinates).any(axis=1)
+    if known.any():
+        distances[known], minutes[known] = estimate_trips(*coordinates[known].T)
+
+    quotes = quote_orders([
+        {
+            'weight': row['weight'], 'length': row['length'], 'width': row['width'], 'height': row['height'],
+            'declared_value': row['declared_value'], 'requires_insurance': row['requires_insurance'],
+            'priority': row['priority'], 'distance_km': None if np.isnan(distance) else distance,
+            **{field: row[field] for field in coordinate_fields if field in row},
+        }
+        for row, distance in zip(rows, distances)
+    ])
+
+    packages = Package.objects.bulk_create([
+        Package(
+            description=row['description'],
+            weight=row['weight'],
+            length=row['length'],
+            width=row['width'],
+            height=row['height'],
+            package_type=row['package_type'],
+            declared_value=row['declared_value'],
+            requires_insurance=row['requires_insurance'],
+            insurance_amount=Decimal(str(quote['insurance'])),
+            special_instructions=row['special_instructions'],
+        )
+        for row, quote in zip(rows, quotes)
+    ])
+    # bulk_create skips Delivery.save, so the search document is built here
+    sender_names = (sender.user.first_name, sender.user.last_name, sender.user.username)
+    tracking_numbers = [f"PKG{uuid.uuid4().hex[:12].upper()}" for _ in rows]
+    deliveries = Delivery.objects.bulk_create([
+        Delivery(
+            tracking_number=tracking_number,
+            sender=sender,
+            recipient_name=row['recipient_name'],
+            recipient_phone=row['recipient_phone'],
+            package=package,
+            pickup_address=row['pickup_address'],
+            delivery_address=row['delivery_address'],
+            estimated_pickup=row['estimated_pickup'],
+            estimated_delivery=row['estimated_delivery'],
+            priority=row['priority'],
+            delivery_fee=Decimal(str(quote['delivery_fee'])),
+            distance_km=None if np.isnan(distance) else Decimal(f'{distance:.2f}'),
+            estimated_duration_minutes=int(duration) if known_trip else None,
+            created_by=user,
+            search_document=build_search_document(
+                tracking_number, *sender_names, row['recipient_name'], row['recipient_phone']
+            ),
+            **{field: row[field] for field in coordinate_fields if field in row},
+        )
+        for row, tracking_number, package, quote, distance, duration, known_trip in zip(
+            rows, tracking_numbers, packages, quotes, distances, minutes, known
+        )
+    ])
+    Payment.objects.bulk_create([
+        Payment(
+            delivery=delivery,
+            amount=delivery.delivery_fee,
+            payment_method=row['payment_method'],
+            cod_amount=row['cod_amount'],
+            status='pending',
+        )
+        for row, delivery in zip(rows, deliveries)
+    ])
+    return [(delivery.tracking_number, float(delivery.delivery_fee)) for delivery in deliveries]
+
+
+def import_orders(rows, sender, user, dry_run=False, batch_size=BATCH_SIZE):
+    """
+    Import manifest rows as orders from ``sender`` and return a report:
+    ``{'rows', 'created', 'failed', 'orders': [...], 'errors': [...]}``. Row numbers
+    start at 1 for the first data row. With ``dry_run`` rows are only
+    validated.
+    """
+    now = timezone.now()
+    report = {'rows': 0, 'created': 0, 'failed': 0, 'orders': [], 'errors': []}
+    rows = iter(rows)
+    row_number = 0
+    with transaction.atomic():
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            if row_number + len(batch) > MAX_IMPORT_ROWS:
+                raise ManifestError(f'A manifest may hold at most {MAX_IMPORT_ROWS} orders')
+
+            valid = []
+            for raw in batch:
+                row_number += 1
+                values, errors = clean_row(raw, now)
+                if errors:
+                    report['errors'].append({'row': row_number, 'errors': errors})
+                else:
+                    valid.append((row_number, values))
+            report['failed'] = len(report['errors'])
+            if not valid or dry_run:
+                continue
+
+            created = _create_batch([values for _, values in valid], sender, user)
+            for (number, values), (tracking_number, fee) in zip(valid, created):
+                order = {'row': number, 'tracking_number': tracking_number, 'delivery_fee': fee}
+                if values['reference']:
+                    order['reference'] = values['reference']
+                report['orders'].append(order)
+            report['created'] += len(created)
+
+    report['rows'] = row_number
+    return report
@@ -183,8 +183,8 @@ class DeliverySerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Delivery
-        fields = '__all__'
-        read_only_fields = ('created_at', 'updated_at', 'tracking_number')
+        exclude = ('search_document',)
+        read_only_fields = ('created_at', 'updated_at', 'tracking_number', 'cancelled_at')
 
 class DeliveryStatusUpdateSerializer(serializers.ModelSerializer):
     updated_by = UserSerializer(read_only=True)
@@ -0,0 +1,203 @@
+# api/streams.py
+"""
+Server-Sent Events streams for live delivery tracking.
+
+These are async views: under ASGI each open stream holds a coroutine
+rather than a worker thread, and events arrive through core.events instead
+of clients polling OrderTrackingView.
+
+Under WSGI, Django drains an async response completely before sending any
+of it. A long-lived stream would then reach the browser all at once when
+it ends. There each request sends the current state and closes instead,
+and EventSource reconnects after POLL_RECONNECT_MS, so the stream
+degrades to polling.
+"""
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from core.events import get_broker
+from delivery.events import delivery_channel, rider_channel
+from delivery.models import UserProfile
+from delivery.tracking_cache import TRACKING_NUMBER_PATTERN, get_tracking_snapshot
+from .views import build_tracking_payload
+
+# Comment lines keep proxies and browsers from timing out idle streams
+KEEPALIVE_SECONDS = 15
+# Streams are closed after this long; EventSource reconnects on its own,
+# which spreads long-lived clients across workers after a deploy
+STREAM_MAX_SECONDS = 15 * 60
+RECONNECT_MS = 3000
+# Reconnect interval when the server cannot stream (WSGI)
+POLL_RECONNECT_MS = 10000
+
+TERMINAL_STATUSES = ('delivered', 'failed', 'cancelled')
+# The rider's position is only shown to a tracking viewer once their parcel
+# is on board; before pickup the rider may still be serving other customers
+SHARED_POSITION_STATUSES = ('picked_up', 'in_transit')
+
+
+def sse_frame(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n'
+
+
+def can_stream(request):
+    """Whether events can be flushed as they happen (served through ASGI)"""
+    return isinstance(request, ASGIRequest)
+
+
+async def position_frame(rider_id):
+    """Frame with a rider's last stored position, or None if there is none"""
+    row = await UserProfile.objects.filter(
+        pk=rider_id, current_latitude__isnull=False, last_location_update__isnull=False
+    ).values('current_latitude', 'current_longitude', 'last_location_update').afirst()
+    if row is None:
+        return None
+    return sse_frame('position', {
+        'rider_id': rider_id,
+        'latitude': float(row['current_latitude']),
+        'longitude': float(row['current_longitude']),
+        'recorded_at': row['last_location_update'].isoformat(),
+    })
+
+
+def event_stream_response(events):
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def _pump(subscription, handle):
+    """
+    Yield SSE frames until an ``end`` event is sent or the maximum lifetime
+    passes. ``handle(message)`` returns the frames for one broker message.
+    """
+    deadline = time.monotonic() + STREAM_MAX_SECONDS
+    try:
+        while time.monotonic() < deadline:
+            message = await subscription.get(timeout=KEEPALIVE_SECONDS)
+            if message is None:
+                yield ': keepalive\n\n'
+                continue
+            for frame in await handle(message):
+                yield frame
+                if frame.startswith('event: end'):
+                    return
+    finally:
+        subscription.close()
+
+
+async def _authenticate(request):
+    """User from a JWT (header or ``?token=``, as EventSource cannot set headers) or the session"""
+    authenticator = JWTAuthentication()
+    header = authenticator.get_header(request)
+    raw_token = authenticator.get_raw_token(header) if header else request.GET.get('token')
+    if raw_token:
+        try:
+            token = authenticator.get_validated_token(raw_token)
+            return await sync_to_async(authenticator.get_user)(token)
+        except (InvalidToken, AuthenticationFailed):
+            return None
+    user = await request.auser()
+    return user if user.is_authenticated else None
+
+
+def _shared_rider(snapshot):
+    """Rider whose position a tracking viewer may follow, if any"""
+    rider = snapshot.get('rider')
+    if rider and snapshot.get('status') in SHARED_POSITION_STATUSES:
+        return rider['id']
+    return None
+
+
+async def delivery_stream(request, tracking_number):
+    """Public stream of one delivery's status changes and its rider's position"""
+    if not TRACKING_NUMBER_PATTERN.match(tracking_number):
+        return JsonResponse({'error': 'Delivery not found'}, status=404)
+    load = sync_to_async(get_tracking_snapshot)
+    snapshot = await load('api', tracking_number, build_tracking_payload)
+    if snapshot is None:
+        return JsonResponse({'error': 'Delivery not found'}, status=404)
+
+    # Subscription is created once the stream is consumed, in its own loop
+    state = {'subscription': None, 'rider': None}
+
+    async def handle(message):
+        channel, event, data = message
+        if event == 'position':
+            return [sse_frame('position', data)] if data['rider_id'] == state['rider'] else []
+        if event != 'status' or channel != delivery_channel(tracking_number):
+            return []
+
+        snapshot = await load('api', tracking_number, build_tracking_payload)
+        if snapshot is None:
+            return [sse_frame('end', {'status': None})]
+        follow_rider(_shared_rider(snapshot))
+        frames = [sse_frame('snapshot', snapshot)]
+        if snapshot['status'] in TERMINAL_STATUSES:
+            frames.append(sse_frame('end', {'status': snapshot['status']}))
+        return frames
+
+    def follow_rider(rider):
+        if rider != state['rider']:
+            if state['rider']:
+                state['subscription'].remove(rider_channel(state['rider']))
+            if rider:
+                state['subscription'].add(rider_channel(rider))
+            state['rider'] = rider
+
+    async def events():
+        yield f'retry: {RECONNECT_MS}\n\n'
+        yield sse_frame('snapshot', snapshot)
+        if snapshot['status'] in TERMINAL_STATUSES:
+            yield sse_frame('end', {'status': snapshot['status']})
+            return
+        if not can_stream(request):
+            yield f'retry: {POLL_RECONNECT_MS}\n\n'
+            rider = _shared_rider(snapshot)
+            frame = await position_frame(rider) if rider else None
+            if frame:
+                yield frame
+            return
+        state['subscription'] = get_broker().subscribe(delivery_channel(tracking_number))
+        follow_rider(_shared_rider(snapshot))
+        async for frame in _pump(state['subscription'], handle):
+            yield frame
+
+    return event_stream_response(events())
+
+
+async def rider_stream(request, rider_id):
+    """Job status changes and positions of one rider, for that rider or staff"""
+    user = await _authenticate(request)
+    if user is None:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    is_own_stream = await UserProfile.objects.filter(pk=rider_id, user=user).aexists()
+    if not (user.is_staff or is_own_stream):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+
+    async def handle(message):
+        channel, event, data = message
+        return [sse_frame(event, data)]
+
+    async def events():
+        if not can_stream(request):
+            yield f'retry: {POLL_RECONNECT_MS}\n\n'
+            frame = await position_frame(rider_id)
+            if frame:
+                yield frame
+            return
+        yield f'retry: {RECONNECT_MS}\n\n'
+        subscription = get_broker().subscribe(rider_channel(rider_id))
+        async for frame in _pump(subscription, handle):
+            yield frame
+
+    return event_stream_response(events())
@@ -1,3 +1,467 @@
-from django.test import TestCase
+import asyncio
+import json
+import threading
+from datetime import timedelta
+from io import BytesIO
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from openpyxl import Workbook
+from rest_framework.test import APIClient
+
+from core.events import Broker, LocalBackend, get_broker
+from delivery.events import delivery_channel, rider_channel
+from delivery.models import UserProfile, Package, Delivery, Payment
+from main.models import Role, UserRole
+
+
+def make_customer(username):
+    user = User.objects.create_user(username=username, email=f'{username}@example.com', password='pass12345')
+    profile = UserProfile.objects.create(user=user, user_type='customer', phone='0700000000', address='Nairobi')
+    role, _ = Role.objects.get_or_create(
+        name='customer',
+        defaults={'permissions': {'create_orders': True, 'view_own_orders': True}}
+    )
+    UserRole.objects.create(user=user, role=role)
+    return profile
+
+
+def make_rider(username):
+    user = User.objects.create_user(username=username, email=f'{username}@example.com', password='pass12345')
+    return UserProfile.objects.create(
+        user=user,
+        user_type='rider',
+        phone='0722222222',
+        address='Nairobi',
+        license_number='LIC-1',
+        vehicle_type='motorcycle',
+        vehicle_plate='KAA 001A',
+        identity_type='national_id',
+        identity_number='12345678',
+    )
+
+
+def make_order(sender, status='pending', paid=False, rider=None):
+    package = Package.objects.create(description='Box', weight=2, package_type='parcel')
+    now = timezone.now()
+    delivery = Delivery.objects.create(
+        sender=sender,
+        recipient_name='Recipient',
+        recipient_phone='0711111111',
+        package=package,
+        pickup_address='A',
+        delivery_address='B',
+        estimated_pickup=now,
+        estimated_delivery=now + timedelta(hours=4),
+        status=status,
+        rider=rider,
+        delivery_fee=20,
+        created_by=sender.user,
+    )
+    Payment.objects.create(
+        delivery=delivery,
+        amount=20,
+        payment_method='cash',
+        status='paid' if paid else 'pending',
+    )
+    return delivery
+
+
+class CustomerPortalViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = make_customer('portal_customer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer.user)
+
+    def get_portal(self, **params):
+        return self.client.get('/api/customer/portal/', params)
+
+    def test_query_count_is_independent_of_order_count(self):
+        make_order(self.customer)
+        self.get_portal()  # warms the permission cache
+        with self.assertNumQueries(4) as small:
+            self.get_portal()
+
+        for _ in range(15):
+            make_order(self.customer, status='delivered', paid=True)
+        with self.assertNumQueries(len(small.captured_queries)):
+            response = self.get_portal()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['orders']), 16)
+
+    def test_stats_and_pagination(self):
+        make_order(self.customer)
+        for _ in range(3):
+            make_order(self.customer, status='delivered', paid=True)
+
+        response = self.get_portal(page_size=2)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['stats']['total_orders'], 4)
+        self.assertEqual(response.data['stats']['pending_orders'], 1)
+        self.assertEqual(response.data['stats']['completed_orders'], 3)
+        self.assertEqual(response.data['stats']['total_spent'], 60)
+        self.assertEqual(response.data['count'], 4)
+        self.assertEqual(len(response.data['orders']), 2)
+        self.assertIsNotNone(response.data['next'])
+        self.assertEqual(response.data['orders'][0]['payment']['amount'], '20.00')
+
+
+class IdempotentOrderTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = make_customer('idempotent_customer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer.user)
+
+    def order(self, **delivery):
+        now = timezone.now()
+        return {
+            'package': {'description': 'Shoes', 'weight': 3, 'package_type': 'parcel', 'value': 50},
+            'delivery': {
+                'recipient_name': 'Recipient',
+                'recipient_phone': '0711111111',
+                'pickup_address': 'A',
+                'delivery_address': 'B',
+                'estimated_pickup': now.isoformat(),
+                'estimated_delivery': (now + timedelta(hours=4)).isoformat(),
+                **delivery,
+            },
+            'payment': {'payment_method': 'cash'},
+        }
+
+    def post(self, body, key=None):
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        return self.client.post('/api/customer/portal/', body, format='json', **headers)
+
+    def test_retries_replay_the_first_response(self):
+        body = self.order()
+        first = self.post(body, key='retry-1')
+        self.assertEqual(first.status_code, 201)
+
+        # Profile check and key lookup only: nothing is written again
+        with self.assertNumQueries(2):
+            retry = self.post(body, key='retry-1')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data['tracking_number'], first.data['tracking_number'])
+        self.assertEqual(Delivery.objects.count(), 1)
+        self.assertEqual(Payment.objects.count(), 1)
+
+        reused = self.post(self.order(recipient_name='Someone else'), key='retry-1')
+        self.assertEqual(reused.status_code, 422)
+        self.assertEqual(self.post(body, key='retry-2').status_code, 201)
+        self.assertEqual(Delivery.objects.count(), 2)
+
+    def test_failed_orders_leave_nothing_behind(self):
+        response = self.post(self.order(estimated_pickup='not a date'), key='broken')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Package.objects.exists())
+
+        # The key was not consumed, so the corrected request goes through
+        self.assertEqual(self.post(self.order(), key='broken').status_code, 201)
+
+
+class BulkOrderImportTests(TestCase):
+    HEADER = 'reference,recipient_name,recipient_phone,pickup_address,delivery_address,description,weight,priority\n'
+
+    def setUp(self):
+        cache.clear()
+        self.customer = make_customer('bulk_customer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer.user)
+
+    def upload(self, name, content, **data):
+        upload = SimpleUploadedFile(name, content)
+        return self.client.post('/api/orders/bulk/', {'file': upload, **data}, format='multipart')
+
+    def test_csv_manifest_reports_bad_rows(self):
+        rows = [f'R{i},Recipient {i},0711111111,A,B,Box,{i % 5 + 1},1\n' for i in range(1200)]
+        rows[10] = 'R10,Recipient,0711111111,A,B,Box,heavy,1\n'
+        rows[700] = 'R700,,0711111111,A,B,Box,2,9\n'
+        response = self.upload('manifest.csv', (self.HEADER + ''.join(rows)).encode())
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['rows'], response.data['created'], response.data['failed']), (1200, 1198, 2))
+        self.assertEqual(response.data['errors'][0], {'row': 11, 'errors': {'weight': 'Enter a number.'}})
+        self.assertEqual(set(response.data['errors'][1]['errors']), {'recipient_name', 'priority'})
+
+        self.assertEqual(Delivery.objects.filter(sender=self.customer).count(), 1198)
+        self.assertEqual(Payment.objects.count(), 1198)
+        first = response.data['orders'][0]
+        self.assertEqual((first['row'], first['reference'], first['delivery_fee']), (1, 'R0', 10.0))
+        delivery = Delivery.objects.select_related('package', 'payment').get(tracking_number=first['tracking_number'])
+        self.assertEqual(delivery.payment.amount, delivery.delivery_fee)
+        self.assertEqual(delivery.estimated_delivery - delivery.estimated_pickup, timedelta(hours=48))
+
+    def test_xlsx_manifest(self):
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(['recipient_name', 'recipient_phone', 'pickup_address', 'delivery_address', 'description',
+                      'weight', 'pickup_latitude', 'pickup_longitude', 'delivery_latitude', 'delivery_longitude'])
+        sheet.append(['Recipient', 711111111, 'A', 'B', 'Box', 2, -1.2864, 36.8172, -1.3100, 36.8350])
+        content = BytesIO()
+        workbook.save(content)
+
+        response = self.upload('manifest.xlsx', content.getvalue())
+
+        self.assertEqual(response.status_code, 201)
+        delivery = Delivery.objects.get()
+        self.assertEqual(delivery.recipient_phone, '711111111')
+        self.assertIsNotNone(delivery.distance_km)
+        self.assertGreater(delivery.estimated_duration_minutes, 0)
+
+    def test_json_orders_and_dry_run(self):
+        orders = [{'recipient_name': 'R', 'recipient_phone': '07', 'pickup_address': 'A',
+                   'delivery_address': 'B', 'description': 'Box', 'weight': 1}] * 3
+        response = self.client.post('/api/orders/bulk/', {'orders': orders, 'dry_run': True}, format='json')
+        self.assertEqual((response.status_code, response.data['created']), (200, 0))
+        self.assertFalse(Delivery.objects.exists())
+
+        response = self.client.post('/api/orders/bulk/', {'orders': orders}, format='json')
+        self.assertEqual((response.status_code, response.data['created']), (201, 3))
+        self.assertEqual(self.upload('manifest.txt', b'x').status_code, 400)
+
+
+class QuoteViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(make_customer('quote_customer').user)
+
+    def test_prices_a_batch_of_orders(self):
+        orders = [{'reference': f'cart-{i}', 'weight': i + 1} for i in range(300)]
+        response = self.client.post('/api/quotes/', {'orders': orders}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['quotes']), 300)
+        self.assertEqual(response.data['quotes'][4]['reference'], 'cart-4')
+        self.assertEqual(response.data['quotes'][4]['delivery_fee'], 50.0)
+
+    def test_rejects_invalid_orders(self):
+        response = self.client.post('/api/quotes/', {'orders': [{'weight': 1}, {'weight': -1}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Order 1', response.data['error'])
+        self.assertEqual(self.client.post('/api/quotes/', {'orders': []}, format='json').status_code, 400)
+
+
+class RiderPortalViewTests(TestCase):
+    def setUp(self):
+        self.customer = make_customer('rider_portal_customer')
+        self.rider = make_rider('portal_rider')
+        self.client = APIClient()
+        self.client.force_authenticate(self.rider.user)
+
+    def get_portal(self, **params):
+        return self.client.get('/api/rider/portal/', params)
+
+    def test_query_count_is_independent_of_delivery_count(self):
+        make_order(self.customer, status='assigned', rider=self.rider)
+        with self.assertNumQueries(3) as small:
+            self.get_portal()
+
+        for _ in range(10):
+            make_order(self.customer, status='delivered', paid=True, rider=self.rider)
+        with self.assertNumQueries(len(small.captured_queries)):
+            response = self.get_portal()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['deliveries']), 11)
+
+    def test_stats_status_filter_and_cursor(self):
+        make_order(self.customer, status='assigned', rider=self.rider)
+        make_order(self.customer, status='in_transit', rider=self.rider)
+        for _ in range(3):
+            make_order(self.customer, status='delivered', paid=True, rider=self.rider)
+
+        response = self.get_portal(status='assigned,in_transit', page_size=1)
+
+        self.assertEqual(response.status_code, 200)
+        stats = response.data['stats']
+        self.assertEqual(stats['total_deliveries'], 5)
+        self.assertEqual(stats['pending_deliveries'], 1)
+        self.assertEqual(stats['in_transit'], 1)
+        self.assertEqual(stats['completed_deliveries'], 3)
+        self.assertEqual(stats['total_earnings'], 60)
+        self.assertEqual(len(response.data['deliveries']), 1)
+        self.assertIn(response.data['deliveries'][0]['status'], ['assigned', 'in_transit'])
+        self.assertIsNotNone(response.data['next'])
+
+        next_page = self.client.get(response.data['next'])
+        self.assertEqual(len(next_page.data['deliveries']), 1)
+        self.assertIsNone(next_page.data['next'])
+
+    def test_invalid_status_filter(self):
+        response = self.get_portal(status='bogus')
+        self.assertEqual(response.status_code, 400)
+
+
+class OrderTrackingCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = make_customer('tracking_customer')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.delivery = make_order(self.customer)
+        self.client = APIClient()
+
+    def track(self, tracking_number):
+        return self.client.get('/api/customer/track/', {'tracking_number': tracking_number})
+
+    def test_snapshot_is_cached_until_status_changes(self):
+        self.assertEqual(self.track(self.delivery.tracking_number).data['status'], 'pending')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.track(self.delivery.tracking_number).status_code, 200)
+
+        owner = APIClient()
+        owner.force_authenticate(self.customer.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            owner.post(f'/api/deliveries/{self.delivery.pk}/update_status/', {'status': 'cancelled'})
+
+        response = self.track(self.delivery.tracking_number)
+        self.assertEqual(response.data['status'], 'cancelled')
+        self.assertEqual(response.data['status_updates'][0]['status'], 'cancelled')
+
+    def test_unknown_numbers_are_negatively_cached(self):
+        self.assertEqual(self.track('DLV-UNKNOWN').status_code, 404)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.track('DLV-UNKNOWN').status_code, 404)
+            self.assertEqual(self.track('not a tracking number').status_code, 404)
+
+
+class BrokerTests(SimpleTestCase):
+    async def test_fans_out_events_published_from_other_threads(self):
+        broker = Broker(LocalBackend())
+        first = broker.subscribe('delivery:A')
+        second = broker.subscribe('delivery:A', 'rider:1')
+        other = broker.subscribe('delivery:B')
+
+        publisher = threading.Thread(target=broker.publish, args=('delivery:A', 'status', {'status': 'assigned'}))
+        publisher.start()
+        publisher.join()
+
+        self.assertEqual(await first.get(1), ('delivery:A', 'status', {'status': 'assigned'}))
+        self.assertEqual(await second.get(1), ('delivery:A', 'status', {'status': 'assigned'}))
+        self.assertIsNone(await other.get(0.05))
+
+        for subscription in (first, second, other):
+            subscription.close()
+        self.assertEqual(broker.subscriber_count(), 0)
+
+    async def test_slow_subscribers_lose_oldest_events(self):
+        broker = Broker(LocalBackend())
+        subscription = broker.subscribe('rider:1')
+        subscription.queue = asyncio.Queue(2)
+        for index in range(3):
+            broker.publish('rider:1', 'position', {'index': index})
+        await asyncio.sleep(0)
+
+        self.assertEqual(subscription.dropped, 1)
+        self.assertEqual((await subscription.get(1))[2], {'index': 1})
+        subscription.close()
+
+
+class DeliveryStreamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.rider = make_rider('stream_rider')
+        self.delivery = make_order(make_customer('stream_customer'), status='picked_up', rider=self.rider)
+
+    async def next_event(self, frames):
+        """Next non-comment frame as (event, data)"""
+        while True:
+            frame = (await asyncio.wait_for(anext(frames), 2)).decode()
+            if frame.startswith('event: '):
+                event, data = frame.strip().split('\n')
+                return event[len('event: '):], json.loads(data[len('data: '):])
+
+    async def wait_for_subscriber(self, channel):
+        for _ in range(100):
+            if get_broker().subscriber_count(channel):
+                return
+            await asyncio.sleep(0.01)
+        self.fail(f'No subscriber on {channel}')
+
+    async def test_streams_positions_and_status_changes(self):
+        response = await self.async_client.get(f'/api/stream/track/{self.delivery.tracking_number}/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        frames = aiter(response.streaming_content)
+
+        event, data = await self.next_event(frames)
+        self.assertEqual((event, data['status']), ('snapshot', 'picked_up'))
+
+        pending = asyncio.ensure_future(self.next_event(frames))
+        await self.wait_for_subscriber(rider_channel(self.rider.pk))
+        get_broker().publish(rider_channel(self.rider.pk), 'position', {
+            'rider_id': self.rider.pk, 'latitude': -1.28, 'longitude': 36.81, 'recorded_at': None,
+        })
+        event, data = await pending
+        self.assertEqual((event, data['latitude']), ('position', -1.28))
+
+        await Delivery.objects.filter(pk=self.delivery.pk).aupdate(status='delivered')
+        await sync_to_async(cache.clear)()
+        get_broker().publish(delivery_channel(self.delivery.tracking_number), 'status', {'status': 'delivered'})
+        event, data = await self.next_event(frames)
+        self.assertEqual((event, data['status']), ('snapshot', 'delivered'))
+        event, data = await self.next_event(frames)
+        self.assertEqual((event, data), ('end', {'status': 'delivered'}))
+        with self.assertRaises(StopAsyncIteration):
+            await anext(frames)
+        self.assertEqual(get_broker().subscriber_count(), 0)
+
+    async def test_position_is_not_shared_before_pickup(self):
+        await Delivery.objects.filter(pk=self.delivery.pk).aupdate(status='assigned')
+        response = await self.async_client.get(f'/api/stream/track/{self.delivery.tracking_number}/')
+        frames = aiter(response.streaming_content)
+        event, data = await self.next_event(frames)
+        self.assertEqual((event, data['status']), ('snapshot', 'assigned'))
+
+        pending = asyncio.ensure_future(self.next_event(frames))
+        await self.wait_for_subscriber(delivery_channel(self.delivery.tracking_number))
+        self.assertEqual(get_broker().subscriber_count(rider_channel(self.rider.pk)), 0)
+        get_broker().publish(rider_channel(self.rider.pk), 'position', {
+            'rider_id': self.rider.pk, 'latitude': -1.28, 'longitude': 36.81, 'recorded_at': None,
+        })
+        await Delivery.objects.filter(pk=self.delivery.pk).aupdate(status='cancelled')
+        await sync_to_async(cache.clear)()
+        get_broker().publish(delivery_channel(self.delivery.tracking_number), 'status', {'status': 'cancelled'})
+        event, data = await pending
+        self.assertEqual((event, data['status']), ('snapshot', 'cancelled'))
+        self.assertEqual(await self.next_event(frames), ('end', {'status': 'cancelled'}))
+        with self.assertRaises(StopAsyncIteration):
+            await anext(frames)
+        self.assertEqual(get_broker().subscriber_count(), 0)
+
+    def test_wsgi_requests_get_the_current_state_and_close(self):
+        now = timezone.now()
+        UserProfile.objects.filter(pk=self.rider.pk).update(
+            current_latitude=-1.28, current_longitude=36.81, last_location_update=now
+        )
+        # The test client is served through the WSGI handler
+        response = self.client.get(f'/api/stream/track/{self.delivery.tracking_number}/')
+        # WSGIHandler drains async content this way before sending it
+        with self.assertWarnsMessage(Warning, 'must consume asynchronous iterators'):
+            body = b''.join(response).decode()
+        self.assertIn('retry: 10000', body)
+        self.assertIn('event: snapshot', body)
+        self.assertIn('event: position\ndata: {"rider_id": %d, "latitude": -1.28' % self.rider.pk, body)
+        self.assertEqual(get_broker().subscriber_count(), 0)
+
+    async def test_unknown_tracking_number_is_not_streamed(self):
+        response = await self.async_client.get('/api/stream/track/DLV-UNKNOWN/')
+        self.assertEqual(response.status_code, 404)
+
+    async def test_rider_stream_requires_the_rider_or_staff(self):
+        response = await self.async_client.get(f'/api/stream/riders/{self.rider.pk}/')
+        self.assertEqual(response.status_code, 401)
+
+        other = await sync_to_async(make_rider)('stream_other')
+        await self.async_client.aforce_login(other.user)
+        response = await self.async_client.get(f'/api/stream/riders/{self.rider.pk}/')
+        self.assertEqual(response.status_code, 403)
 
-# Create your tests here.
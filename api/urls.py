@@ -2,7 +2,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from . import views
+from . import streams, views
 
 router = DefaultRouter()
 router.register(r'user-profiles', views.UserProfileViewSet)
@@ -29,11 +29,18 @@ urlpatterns = [
     # Customer endpoints
     path('customer/portal/', views.CustomerPortalView.as_view(), name='customer_portal'),
     path('rider/portal/', views.RiderPortalView.as_view(), name='rider_portal'),
+    path('rider/claim/', views.RiderClaimDeliveryView.as_view(), name='rider_claim_delivery'),
+    path('rider/claim-route/', views.RiderClaimRouteView.as_view(), name='rider_claim_route'),
     path('customer/track/', views.OrderTrackingView.as_view(), name='order_tracking'),
+    path('quotes/', views.QuoteView.as_view(), name='quotes'),
+    path('orders/bulk/', views.BulkOrderImportView.as_view(), name='bulk_order_import'),
+    path('stream/track/<str:tracking_number>/', streams.delivery_stream, name='delivery_stream'),
+    path('stream/riders/<int:rider_id>/', streams.rider_stream, name='rider_stream'),
 
     # Mobile app endpoints
     path('mobile/version/', views.MobileAPIVersionView.as_view(), name='mobile_api_version'),
     path('mobile/profile/', views.MobileUserProfileView.as_view(), name='mobile_profile'),
     path('mobile/device-token/', views.MobileDeviceTokenView.as_view(), name='mobile_device_token'),
     path('mobile/rider/availability/', views.RiderAvailabilityView.as_view(), name='rider_availability'),
+    path('mobile/rider/locations/', views.RiderLocationBatchView.as_view(), name='rider_location_batch'),
 ]
\ No newline at end of file
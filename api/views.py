@@ -1,19 +1,50 @@
 # api/views.py - Simplified version
+import hashlib
+import logging
 import uuid
 import requests
 from rest_framework import viewsets, permissions, status, filters
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.models import User
-from django.db.models import Q, Sum
+from django.db import transaction
+from django.db.models import Count, Q, Sum
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime
 from delivery.models import UserProfile, Package, Delivery, DeliveryStatusUpdate, Payment
+from .bulk_orders import ManifestError, import_orders, manifest_rows
 from .serializers import *
+from admin_panel.analytics import operations_dashboard_stats, rider_dashboard_stats
+from admin_panel.batching import claim_next_route
+from admin_panel.pricing import MAX_QUOTES, PricingError, quote_order, quote_orders
 from core.logging_utils import log_api_error, log_app_error, log_db_error
+from core.pagination import PortalCursorPagination, PortalPagination
 from core.permissions import HasRolePermission, has_permission
+from delivery.estimates import parse_trip_coordinates
+from delivery.idempotency import idempotent
+from delivery.rider_locations import parse_coordinates, update_rider_location
+from delivery.tracking_cache import get_tracking_snapshot
+from delivery.tracks import MAX_FIXES_PER_BATCH, ingest_fixes, parse_fixes
+from delivery.transitions import DeliveryTransitionError, change_status, claim_next_delivery
+
+
+def serialize_deliveries_with_payment(deliveries):
+    """
+    Serialize deliveries with their payment attached. Expects the queryset to
+    select_related('payment') so no per-row payment lookup is issued.
+    """
+    deliveries_data = []
+    for delivery in deliveries:
+        delivery_data = DeliverySerializer(delivery).data
+        try:
+            delivery_data['payment'] = PaymentSerializer(delivery.payment).data
+        except Payment.DoesNotExist:
+            delivery_data['payment'] = None
+        deliveries_data.append(delivery_data)
+    return deliveries_data
 
 class UserProfileViewSet(viewsets.ModelViewSet):
     """ViewSet for managing user profiles with filtering"""
@@ -65,6 +96,17 @@ class DeliveryViewSet(viewsets.ModelViewSet):
 
         return super().create(request, *args, **kwargs)
 
+    def perform_update(self, serializer):
+        # Status changes go through the state machine, not a plain field write
+        new_status = serializer.validated_data.pop('status', None)
+        with transaction.atomic():
+            delivery = serializer.save()
+            if new_status and new_status != delivery.status:
+                try:
+                    change_status(delivery.pk, new_status, self.request.user)
+                except DeliveryTransitionError as e:
+                    raise ValidationError({'status': str(e)})
+
     @action(detail=True, methods=['post'])
     def update_status(self, request, pk=None):
         delivery = self.get_object()
@@ -73,15 +115,15 @@ class DeliveryViewSet(viewsets.ModelViewSet):
         notes = request.data.get('notes', '')
         
         if status_value:
-            DeliveryStatusUpdate.objects.create(
-                delivery=delivery,
-                status=status_value,
-                location=location,
-                notes=notes,
-                updated_by=request.user
-            )
-            delivery.status = status_value
-            delivery.save()
+            if status_value not in dict(Delivery.STATUS_CHOICES):
+                return Response({'error': 'Invalid status'}, status=400)
+            try:
+                change_status(
+                    delivery.pk, status_value, request.user, location=location, notes=notes,
+                    reason=request.data.get('cancellation_reason', '')
+                )
+            except DeliveryTransitionError as e:
+                return Response({'error': str(e)}, status=409)
             return Response({'message': 'Status updated successfully'})
         
         return Response({'error': 'Status is required'}, status=400)
@@ -105,7 +147,7 @@ class CustomerRegistrationView(APIView):
             serializer = CustomerRegistrationSerializer(data=request.data)
             if serializer.is_valid():
                 customer = serializer.save()
-                log_api_error(f'Customer registration successful for {customer.user.email}')
+                log_api_error(f'Customer registration successful for {customer.user.email}', level=logging.INFO)
                 return Response({
                     'message': 'Customer registered successfully',
                     'customer': CustomerSerializer(customer).data
@@ -126,10 +168,10 @@ class RiderRegistrationView(APIView):
             data = request.data.copy()
 
             # Debug: Log what we're receiving
-            log_app_error(f'Rider registration request data: {dict(data)}')
-            log_app_error(f'Request content type: {request.content_type}')
-            log_app_error(f'Request POST: {dict(request.POST) if hasattr(request, "POST") else "No POST"}')
-            log_app_error(f'Request FILES: {dict(request.FILES) if hasattr(request, "FILES") else "No FILES"}')
+            log_app_error(f'Rider registration request data: {dict(data)}', level=logging.DEBUG)
+            log_app_error(f'Request content type: {request.content_type}', level=logging.DEBUG)
+            log_app_error(f'Request POST: {dict(request.POST) if hasattr(request, "POST") else "No POST"}', level=logging.DEBUG)
+            log_app_error(f'Request FILES: {dict(request.FILES) if hasattr(request, "FILES") else "No FILES"}', level=logging.DEBUG)
 
             # Handle different field structures:
             # - JSON API calls might send 'name' instead of 'first_name' and 'last_name'
@@ -174,12 +216,12 @@ class RiderRegistrationView(APIView):
                         flattened_data[field] = post_value[0] if isinstance(post_value, list) and len(post_value) == 1 else post_value
 
             # Debug: Log the final data being sent to serializer
-            log_app_error(f'Final data for serializer: {flattened_data}')
+            log_app_error(f'Final data for serializer: {flattened_data}', level=logging.DEBUG)
 
             serializer = RiderRegistrationSerializer(data=flattened_data)
             if serializer.is_valid():
                 rider = serializer.save()
-                log_api_error(f'Rider registration successful for {rider.user.email}')
+                log_api_error(f'Rider registration successful for {rider.user.email}', level=logging.INFO)
                 return Response({
                     'message': 'Rider registered successfully',
                     'rider': RiderSerializer(rider).data
@@ -253,44 +295,41 @@ class CustomerPortalView(APIView):
 
     def get(self, request):
         try:
-            user_profile = UserProfile.objects.get(user=request.user)
+            user_profile = UserProfile.objects.select_related('user').get(user=request.user)
             if user_profile.user_type not in ['customer', 'both']:
                 return Response({'error': 'User is not a customer'}, status=403)
         except UserProfile.DoesNotExist:
             return Response({'error': 'User profile not found'}, status=404)
 
-        # Get customer orders
+        # Get customer orders; related rows are joined so serializing a page
+        # costs one query no matter how many orders it holds
         orders = Delivery.objects.filter(
             sender=user_profile
-        ).order_by('-created_at')
+        ).select_related(
+            'sender__user', 'rider__user', 'package', 'payment'
+        ).order_by('-created_at', '-id')
 
-        orders_data = []
-        for order in orders:
-            order_data = DeliverySerializer(order).data
-            try:
-                payment = Payment.objects.get(delivery=order)
-                order_data['payment'] = PaymentSerializer(payment).data
-            except Payment.DoesNotExist:
-                order_data['payment'] = None
-            orders_data.append(order_data)
+        stats = orders.aggregate(
+            total_orders=Count('id'),
+            pending_orders=Count('id', filter=Q(status='pending')),
+            completed_orders=Count('id', filter=Q(status='delivered')),
+            total_spent=Sum('payment__amount', filter=Q(payment__status='paid')),
+        )
+        stats['total_spent'] = stats['total_spent'] or 0
+
+        paginator = PortalPagination()
+        page = paginator.paginate_queryset(orders, request, view=self)
 
         return Response({
             'customer': CustomerSerializer(user_profile).data,
-            'orders': orders_data,
-            'stats': {
-                'total_orders': orders.count(),
-                'pending_orders': orders.filter(status='pending').count(),
-                'completed_orders': orders.filter(status='delivered').count(),
-                'total_spent': Payment.objects.filter(
-                    delivery__in=orders,
-                    status='paid'
-                ).aggregate(Sum('amount'))['amount__sum'] or 0
-            }
+            'orders': serialize_deliveries_with_payment(page),
+            'stats': stats,
+            **paginator.get_page_metadata(),
         })
 
     def post(self, request):
         """Create new delivery order"""
-        log_app_error(f'POST request data: {dict(request.data)}')
+        log_app_error(f'POST request data: {dict(request.data)}', level=logging.DEBUG)
         try:
             user_profile = UserProfile.objects.get(user=request.user)
             if user_profile.user_type not in ['customer', 'both']:
@@ -303,13 +342,26 @@ class CustomerPortalView(APIView):
         delivery_data = request.data.get('delivery', {})
         payment_data = request.data.get('payment', {})
 
-        log_app_error(f'Package data: {package_data}')
-        log_app_error(f'Delivery data: {delivery_data}')
-        log_app_error(f'Payment data: {payment_data}')
+        log_app_error(f'Package data: {package_data}', level=logging.DEBUG)
+        log_app_error(f'Delivery data: {delivery_data}', level=logging.DEBUG)
+        log_app_error(f'Payment data: {payment_data}', level=logging.DEBUG)
 
         if not all([package_data, delivery_data, payment_data]):
             return Response({'error': 'Package, delivery, and payment data are required'}, status=400)
 
+        try:
+            coordinates = parse_trip_coordinates(delivery_data)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+
+        # Package, delivery and payment are created in one transaction, once per Idempotency-Key
+        return idempotent(
+            request, 'customer_portal', request.user, request.data,
+            lambda: self.create_order(request, user_profile, package_data, delivery_data, payment_data, coordinates),
+            lambda body, status: Response(body, status=status),
+        )
+
+    def create_order(self, request, user_profile, package_data, delivery_data, payment_data, coordinates):
         try:
             # Parse dimensions if provided
             dimensions = package_data.get('dimensions', '')
@@ -324,7 +376,7 @@ class CustomerPortalView(APIView):
                 except ValueError:
                     pass  # Ignore parsing errors
 
-            log_app_error(f'Creating package with data: {package_data}')
+            log_app_error(f'Creating package with data: {package_data}', level=logging.DEBUG)
             # Create package
             package = Package.objects.create(
                 description=package_data.get('description'),
@@ -340,10 +392,18 @@ class CustomerPortalView(APIView):
             # Generate tracking number
             tracking_number = f"PKG{uuid.uuid4().hex[:12].upper()}"
 
-            # Calculate delivery fee (basic calculation)
-            delivery_fee = float(package_data.get('weight', 1)) * 10  # 10 currency units per kg
-
-            log_app_error(f'Creating delivery with data: {delivery_data}')
+            delivery_fee = quote_order({
+                'weight': package.weight,
+                'length': length,
+                'width': width,
+                'height': height,
+                'declared_value': package.declared_value,
+                'requires_insurance': package.requires_insurance,
+                'priority': delivery_data.get('priority', 1),
+                **coordinates,
+            })['delivery_fee']
+
+            log_app_error(f'Creating delivery with data: {delivery_data}', level=logging.DEBUG)
             # Parse datetimes
             estimated_pickup = parse_datetime(delivery_data.get('estimated_pickup'))
             estimated_delivery = parse_datetime(delivery_data.get('estimated_delivery'))
@@ -364,10 +424,11 @@ class CustomerPortalView(APIView):
                 estimated_delivery=estimated_delivery,
                 priority=delivery_data.get('priority', 1),
                 delivery_fee=delivery_fee,
-                created_by=request.user
+                created_by=request.user,
+                **coordinates
             )
 
-            log_app_error(f'Creating payment with data: {payment_data}')
+            log_app_error(f'Creating payment with data: {payment_data}', level=logging.DEBUG)
             # Create payment record
             payment = Payment.objects.create(
                 delivery=delivery,
@@ -394,46 +455,55 @@ class RiderPortalView(APIView):
 
     def get(self, request):
         try:
-            user_profile = UserProfile.objects.get(user=request.user)
+            user_profile = UserProfile.objects.select_related('user').get(user=request.user)
             if user_profile.user_type not in ['rider', 'both']:
                 return Response({'error': 'User is not a rider'}, status=403)
         except UserProfile.DoesNotExist:
             return Response({'error': 'User profile not found'}, status=404)
 
-        # Get rider deliveries
-        deliveries = Delivery.objects.filter(
-            rider=user_profile
-        ).order_by('-created_at')
-
-        deliveries_data = []
-        for delivery in deliveries:
-            delivery_data = DeliverySerializer(delivery).data
-            try:
-                payment = Payment.objects.get(delivery=delivery)
-                delivery_data['payment'] = PaymentSerializer(payment).data
-            except Payment.DoesNotExist:
-                delivery_data['payment'] = None
-            deliveries_data.append(delivery_data)
-
-        # Calculate earnings
-        completed_deliveries = deliveries.filter(status='delivered')
-        total_earnings = Payment.objects.filter(
-            delivery__in=completed_deliveries,
-            status='paid'
-        ).aggregate(Sum('amount'))['amount__sum'] or 0
+        deliveries = Delivery.objects.filter(rider=user_profile)
+
+        # Optional status filter so the app can pull only its active jobs,
+        # e.g. ?status=assigned,accepted,picked_up,in_transit
+        status_filter = request.query_params.get('status')
+        statuses = [s for s in status_filter.split(',') if s] if status_filter else []
+        invalid = set(statuses) - set(dict(Delivery.STATUS_CHOICES))
+        if invalid:
+            return Response({'error': f'Invalid status: {", ".join(sorted(invalid))}'}, status=400)
+
+        # Per-status counts and earnings in a single grouped aggregate; the
+        # default model ordering is cleared so it does not leak into GROUP BY
+        status_counts = {}
+        total_earnings = 0
+        for row in deliveries.order_by().values('status').annotate(
+            count=Count('id'),
+            earnings=Sum('payment__amount', filter=Q(payment__status='paid')),
+        ):
+            status_counts[row['status']] = row['count']
+            if row['status'] == 'delivered':
+                total_earnings = row['earnings'] or 0
+
+        page_queryset = deliveries.select_related('sender__user', 'rider__user', 'package', 'payment')
+        if statuses:
+            page_queryset = page_queryset.filter(status__in=statuses)
+
+        paginator = PortalCursorPagination()
+        page = paginator.paginate_queryset(page_queryset, request, view=self)
 
         return Response({
             'rider': RiderSerializer(user_profile).data,
-            'deliveries': deliveries_data,
+            'deliveries': serialize_deliveries_with_payment(page),
             'stats': {
-                'total_deliveries': deliveries.count(),
-                'pending_deliveries': deliveries.filter(status='assigned').count(),
-                'in_transit': deliveries.filter(status='in_transit').count(),
-                'completed_deliveries': completed_deliveries.count(),
+                'total_deliveries': sum(status_counts.values()),
+                'pending_deliveries': status_counts.get('assigned', 0),
+                'in_transit': status_counts.get('in_transit', 0),
+                'completed_deliveries': status_counts.get('delivered', 0),
+                'status_counts': status_counts,
                 'total_earnings': total_earnings,
                 'rating': float(user_profile.rating),
                 'is_available': user_profile.is_available,
-            }
+            },
+            **paginator.get_page_metadata(),
         })
 
 
@@ -448,6 +518,29 @@ class CurrentUserView(APIView):
         except UserProfile.DoesNotExist:
             return Response({'error': 'User profile not found'}, status=404)
 
+def build_tracking_payload(tracking_number):
+    """Render the public tracking payload, or None for an unknown number"""
+    delivery = Delivery.objects.select_related(
+        'sender__user', 'rider__user', 'package', 'payment'
+    ).filter(tracking_number=tracking_number).first()
+    if delivery is None:
+        return None
+
+    delivery_data = DeliverySerializer(delivery).data
+
+    # Add status updates
+    status_updates = DeliveryStatusUpdate.objects.filter(delivery=delivery).select_related('updated_by')
+    delivery_data['status_updates'] = DeliveryStatusUpdateSerializer(status_updates, many=True).data
+
+    # Add payment info
+    try:
+        delivery_data['payment'] = PaymentSerializer(delivery.payment).data
+    except Payment.DoesNotExist:
+        delivery_data['payment'] = None
+
+    return delivery_data
+
+
 class OrderTrackingView(APIView):
     """Track order by tracking number"""
     permission_classes = [permissions.AllowAny]
@@ -458,27 +551,12 @@ class OrderTrackingView(APIView):
         if not tracking_number:
             return Response({'error': 'Tracking number is required'}, status=400)
         
-        try:
-            delivery = Delivery.objects.get(tracking_number=tracking_number)
-            
-            delivery_data = DeliverySerializer(delivery).data
-            
-            # Add status updates
-            status_updates = DeliveryStatusUpdate.objects.filter(delivery=delivery)
-            delivery_data['status_updates'] = DeliveryStatusUpdateSerializer(status_updates, many=True).data
-            
-            # Add payment info
-            try:
-                payment = Payment.objects.get(delivery=delivery)
-                delivery_data['payment'] = PaymentSerializer(payment).data
-            except Payment.DoesNotExist:
-                delivery_data['payment'] = None
-            
-            return Response(delivery_data)
-            
-        except Delivery.DoesNotExist:
+        delivery_data = get_tracking_snapshot('api', tracking_number, build_tracking_payload)
+        if delivery_data is None:
             return Response({'error': 'Delivery not found'}, status=404)
 
+        return Response(delivery_data)
+
 class DashboardView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
@@ -489,32 +567,18 @@ class DashboardView(APIView):
             user_profile = UserProfile.objects.get(user=user)
             if user_profile.user_type in ['rider', 'both']:
                 # Rider dashboard
-                deliveries = Delivery.objects.filter(rider=user_profile)
-                
+                rider_stats = rider_dashboard_stats(user_profile)
                 stats = {
-                    'assigned': deliveries.filter(status='assigned').count(),
-                    'in_transit': deliveries.filter(status='in_transit').count(),
-                    'delivered_today': deliveries.filter(
-                        status='delivered',
-                        actual_delivery__date=timezone.now().date()
-                    ).count(),
+                    'assigned': rider_stats['assigned'],
+                    'in_transit': rider_stats['in_transit'],
+                    'delivered_today': rider_stats['delivered_today'],
                     'total_completed': user_profile.completed_deliveries,
                     'rating': float(user_profile.rating),
                     'is_available': user_profile.is_available,
                 }
             else:
                 # Admin/customer dashboard
-                stats = {
-                    'total_customers': UserProfile.objects.filter(user_type='customer').count(),
-                    'total_riders': UserProfile.objects.filter(user_type__in=['rider', 'both']).count(),
-                    'active_deliveries': Delivery.objects.exclude(
-                        status__in=['delivered', 'cancelled']
-                    ).count(),
-                    'revenue_today': Payment.objects.filter(
-                        status='paid',
-                        paid_at__date=timezone.now().date()
-                    ).aggregate(Sum('amount'))['amount__sum'] or 0,
-                }
+                stats = operations_dashboard_stats()
             return Response(stats)
         except UserProfile.DoesNotExist:
             return Response({'error': 'User profile not found'}, status=404)
@@ -584,6 +648,55 @@ class MobileDeviceTokenView(APIView):
         except UserProfile.DoesNotExist:
             return Response({'error': 'User profile not found'}, status=404)
 
+class RiderClaimDeliveryView(APIView):
+    """Let an available rider take the next job from the pending queue"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        try:
+            rider = UserProfile.objects.get(user=request.user)
+        except UserProfile.DoesNotExist:
+            return Response({'error': 'User profile not found'}, status=404)
+
+        if not rider.can_make_deliveries:
+            return Response({'error': 'Rider is not approved or not available'}, status=403)
+
+        delivery = claim_next_delivery(rider, request.user)
+        if delivery is None:
+            # Nothing to claim; a 204 carries no body
+            return Response(status=204)
+
+        return Response(DeliverySerializer(delivery).data)
+
+
+class RiderClaimRouteView(APIView):
+    """Let an available rider take a whole batched run, stops in riding order"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        try:
+            rider = UserProfile.objects.get(user=request.user)
+        except UserProfile.DoesNotExist:
+            return Response({'error': 'User profile not found'}, status=404)
+
+        if not rider.can_make_deliveries:
+            return Response({'error': 'Rider is not approved or not available'}, status=403)
+
+        route = claim_next_route(rider, request.user)
+        if route is None:
+            return Response(status=204)
+
+        deliveries = route.deliveries.select_related('package', 'sender__user', 'rider__user').order_by('id')
+        return Response({
+            'id': route.id,
+            'name': route.name,
+            'waypoints': route.waypoints,
+            'estimated_distance': route.estimated_distance,
+            'estimated_duration': route.estimated_duration,
+            'deliveries': DeliverySerializer(deliveries, many=True).data,
+        })
+
+
 class RiderAvailabilityView(APIView):
     """Manage rider availability"""
     permission_classes = [permissions.IsAuthenticated]
@@ -597,25 +710,131 @@ class RiderAvailabilityView(APIView):
             
             is_available = request.data.get('is_available')
             current_location = request.data.get('current_location')
+            latitude = request.data.get('latitude')
+            longitude = request.data.get('longitude')
+
+            coordinates = None
+            if latitude is not None or longitude is not None:
+                try:
+                    coordinates = parse_coordinates(latitude, longitude)
+                except (TypeError, ValueError):
+                    return Response({'error': 'Valid latitude and longitude are required'}, status=400)
             
-            if is_available is not None:
-                user_profile.is_available = is_available
-            
-            if current_location:
-                user_profile.current_location = current_location
-                user_profile.last_location_update = timezone.now()
-            
-            user_profile.save()
+            if is_available is not None or current_location:
+                if is_available is not None:
+                    user_profile.is_available = is_available
+
+                if current_location:
+                    user_profile.current_location = current_location
+                    user_profile.last_location_update = timezone.now()
+
+                user_profile.save()
+
+            if coordinates:
+                update_rider_location(user_profile, *coordinates)
             
             return Response({
                 'message': 'Availability updated successfully',
                 'is_available': user_profile.is_available,
-                'current_location': user_profile.current_location
+                'current_location': user_profile.current_location,
+                'latitude': user_profile.current_latitude,
+                'longitude': user_profile.current_longitude,
             })
         except UserProfile.DoesNotExist:
             return Response({'error': 'User profile not found'}, status=404)
 
 
+class RiderLocationBatchView(APIView):
+    """Ingest a batch of timestamped GPS fixes from a rider's device"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        try:
+            rider = UserProfile.objects.get(user=request.user)
+        except UserProfile.DoesNotExist:
+            return Response({'error': 'User profile not found'}, status=404)
+        if rider.user_type not in ['rider', 'both']:
+            return Response({'error': 'User is not a rider'}, status=403)
+
+        raw_fixes = request.data.get('fixes')
+        if not isinstance(raw_fixes, list) or not raw_fixes:
+            return Response({'error': 'fixes must be a non-empty list'}, status=400)
+        if len(raw_fixes) > MAX_FIXES_PER_BATCH:
+            return Response({'error': f'At most {MAX_FIXES_PER_BATCH} fixes per request'}, status=400)
+
+        fixes, rejected = parse_fixes(raw_fixes)
+        result = ingest_fixes(rider, fixes)
+        result['rejected'] = rejected
+        return Response(result)
+
+
+class BulkOrderImportView(APIView):
+    """
+    Create many orders from one manifest: a JSON ``orders`` list, or a CSV,
+    XLSX or JSON file uploaded as ``file``. Returns a per-row report; pass
+    ``dry_run`` to only validate.
+    """
+    permission_classes = [permissions.IsAuthenticated, HasRolePermission(['create_orders'])]
+
+    def post(self, request):
+        try:
+            sender = UserProfile.objects.get(user=request.user)
+        except UserProfile.DoesNotExist:
+            return Response({'error': 'User profile not found'}, status=404)
+        if sender.user_type not in ['customer', 'both']:
+            return Response({'error': 'User is not a customer'}, status=403)
+
+        upload = request.FILES.get('file')
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('true', '1', 'yes')
+        if upload is None:
+            fingerprint = request.data
+        else:
+            digest = hashlib.sha256()
+            for chunk in upload.chunks():
+                digest.update(chunk)
+            upload.seek(0)
+            fingerprint = {'file': digest.hexdigest(), 'dry_run': dry_run}
+
+        return idempotent(
+            request, 'bulk_orders', request.user, fingerprint,
+            lambda: self.import_manifest(request, sender, upload, dry_run),
+            lambda body, status: Response(body, status=status),
+        )
+
+    def import_manifest(self, request, sender, upload, dry_run):
+        try:
+            rows = manifest_rows(request.data.get('orders'), upload)
+            report = import_orders(rows, sender, request.user, dry_run=dry_run)
+        except ManifestError as e:
+            return Response({'error': str(e)}, status=400)
+
+        if report['created'] or (dry_run and report['rows']):
+            return Response(report, status=201 if report['created'] else 200)
+        return Response(report, status=400)
+
+
+class QuoteView(APIView):
+    """Price up to MAX_QUOTES candidate orders in one call, e.g. every cart on a checkout page"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        orders = request.data.get('orders')
+        if not isinstance(orders, list) or not orders:
+            return Response({'error': 'orders must be a non-empty list'}, status=400)
+        if len(orders) > MAX_QUOTES:
+            return Response({'error': f'At most {MAX_QUOTES} orders per request'}, status=400)
+
+        try:
+            quotes = quote_orders(orders)
+        except PricingError as e:
+            return Response({'error': str(e)}, status=400)
+        # Echo the caller's own reference so quotes can be matched to carts
+        for order, quote in zip(orders, quotes):
+            if order.get('reference') is not None:
+                quote['reference'] = order['reference']
+        return Response({'quotes': quotes})
+
+
 class GoogleLoginView(APIView):
     """Google Sign-In authentication"""
     permission_classes = [permissions.AllowAny]
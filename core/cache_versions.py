@@ -0,0 +1,51 @@
+# core/cache_versions.py
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+
+def _version_key(namespace):
+    return f'cache_version:{namespace}'
+
+
+def cache_is_shared():
+    """Whether the default cache is seen by every worker process"""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def _version_timeout():
+    # A per-process cache never sees other workers' bumps, so versions
+    # expire instead and a write elsewhere is picked up within this many seconds
+    return None if cache_is_shared() else getattr(settings, 'LOCAL_CACHE_VERSION_TTL', 30)
+
+
+def get_version(namespace):
+    """
+    Current version number for a cached namespace.
+
+    Cached entries embed this number in their keys, so bumping it
+    invalidates every entry of the namespace at once. Versions start from a
+    timestamp so a cache flush never makes old keys valid again.
+    """
+    key = _version_key(namespace)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), _version_timeout())
+        version = cache.get(key)
+    return version
+
+
+def bump_version(namespace):
+    """Invalidate a namespace once the current transaction commits"""
+    def bump():
+        key = _version_key(namespace)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, int(time.time() * 1000), _version_timeout())
+
+    transaction.on_commit(bump)
@@ -0,0 +1,215 @@
+# core/events.py
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+# Events queued for one slow subscriber beyond this are dropped, oldest first
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# Postgres NOTIFY channel shared by every process
+PG_CHANNEL = 'pindrop_events'
+# NOTIFY payloads are limited to 8000 bytes
+PG_MAX_PAYLOAD = 7900
+PG_RECONNECT_DELAY = 5
+
+
+class Subscription:
+    """
+    One consumer's view of the broker: an asyncio queue fed from any thread.
+
+    Create it inside the event loop that will read it, and close it when
+    the consumer goes away.
+    """
+
+    def __init__(self, broker, channels):
+        self.broker = broker
+        self.channels = set()
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self.dropped = 0
+        self.add(*channels)
+
+    def add(self, *channels):
+        self.broker._attach(self, channels)
+
+    def remove(self, *channels):
+        self.broker._detach(self, channels)
+
+    def close(self):
+        self.remove(*self.channels)
+
+    def _put(self, message):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout=None):
+        """Next (channel, event, data) message, or None on timeout"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class Broker:
+    """
+    In-process fan-out of events to subscriptions, keyed by channel name.
+
+    Events reach the broker through a backend: the local backend delivers
+    them directly (single process only), the Postgres backend round-trips
+    them through LISTEN/NOTIFY so every process sees every event.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, *channels):
+        self.backend.start(self)
+        return Subscription(self, channels)
+
+    def _attach(self, subscription, channels):
+        with self._lock:
+            for channel in channels:
+                self._channels.setdefault(channel, set()).add(subscription)
+                subscription.channels.add(channel)
+
+    def _detach(self, subscription, channels):
+        with self._lock:
+            for channel in list(channels):
+                subscribers = self._channels.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._channels[channel]
+                subscription.channels.discard(channel)
+
+    def subscriber_count(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                return len(self._channels.get(channel, ()))
+            return sum(len(subscribers) for subscribers in self._channels.values())
+
+    def deliver(self, channel, event, data):
+        """Hand an event to this process's subscribers of ``channel``"""
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        message = (channel, event, data)
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._put, message)
+            except RuntimeError:
+                # The subscriber's loop has shut down
+                self._detach(subscription, [channel])
+
+    def publish(self, channel, event, data):
+        self.backend.publish(self, channel, event, data)
+
+
+class LocalBackend:
+    """Delivers events within the publishing process; a stand-in for development"""
+
+    def start(self, broker):
+        pass
+
+    def publish(self, broker, channel, event, data):
+        broker.deliver(channel, event, data)
+
+
+class PostgresBackend:
+    """
+    Fans events out across processes with Postgres LISTEN/NOTIFY.
+
+    Publishing runs ``pg_notify`` on the request's own connection; each
+    process that has subscribers keeps one extra connection LISTENing on a
+    daemon thread and passes notifications to its broker.
+    """
+
+    def __init__(self):
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def publish(self, broker, channel, event, data):
+        payload = json.dumps({'channel': channel, 'event': event, 'data': data}, cls=DjangoJSONEncoder)
+        if len(payload.encode()) > PG_MAX_PAYLOAD:
+            logger.warning('Event %s on %s is too large for NOTIFY; dropped', event, channel)
+            return
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [PG_CHANNEL, payload])
+
+    def start(self, broker):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._listen, args=(broker,), name='event-listener', daemon=True
+                )
+                self._thread.start()
+
+    def _connect(self):
+        import psycopg2
+
+        db = settings.DATABASES['default']
+        conn = psycopg2.connect(
+            dbname=db['NAME'], user=db.get('USER') or None, password=db.get('PASSWORD') or None,
+            host=db.get('HOST') or None, port=db.get('PORT') or None,
+        )
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(f'LISTEN {PG_CHANNEL}')
+        return conn
+
+    def _listen(self, broker):
+        while True:
+            conn = None
+            try:
+                conn = self._connect()
+                while True:
+                    if select.select([conn], [], [], 30) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        message = json.loads(notify.payload)
+                        broker.deliver(message['channel'], message['event'], message['data'])
+            except Exception:
+                logger.exception('Event listener connection lost; reconnecting')
+                time.sleep(PG_RECONNECT_DELAY)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+
+BACKENDS = {
+    'local': LocalBackend,
+    'postgres': PostgresBackend,
+}
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """The process-wide broker, using the EVENT_BACKEND setting"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                backend = BACKENDS[getattr(settings, 'EVENT_BACKEND', 'local')]()
+                _broker = Broker(backend)
+    return _broker
+
+
+def publish(channel, event, data):
+    """Publish an event to ``channel`` once the current transaction commits"""
+    transaction.on_commit(lambda: get_broker().publish(channel, event, data))
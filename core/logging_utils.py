@@ -1,43 +1,255 @@
 # core/logging_utils.py
+import atexit
+import json
 import logging
 import os
-from datetime import datetime
+import queue
+import sys
+import threading
+import time
+from datetime import date, datetime
 
 # Define log file paths
-LOG_DIR = 'logs'
+LOG_DIR = os.getenv('LOG_DIR', 'logs')
 API_ERROR_LOG = os.path.join(LOG_DIR, 'api_errors.log')
 APP_ERROR_LOG = os.path.join(LOG_DIR, 'app_errors.log')
 DB_ERROR_LOG = os.path.join(LOG_DIR, 'db_errors.log')
 
+CHANNEL_FILES = {
+    'api': API_ERROR_LOG,
+    'app': APP_ERROR_LOG,
+    'db': DB_ERROR_LOG,
+}
+
+# Records below this level are discarded on the calling thread. Set
+# LOG_LEVEL=WARNING to silence the informational success-path messages.
+LOG_LEVEL = logging.getLevelName(os.getenv('LOG_LEVEL', 'INFO').upper())
+if not isinstance(LOG_LEVEL, int):
+    LOG_LEVEL = logging.INFO
+
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+LOG_BATCH_SIZE = int(os.getenv('LOG_BATCH_SIZE', 500))
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 5))
+LOG_ROTATE_DAILY = os.getenv('LOG_ROTATE_DAILY', 'True').lower() == 'true'
+LOG_ECHO = os.getenv('LOG_ECHO', 'False').lower() == 'true'
+
 # Create logs directory if it doesn't exist
 os.makedirs(LOG_DIR, exist_ok=True)
 
-def log_api_error(error_details):
+
+class RotatingLogFile:
+    """Append-only log file kept open between writes, rotated by size and day"""
+
+    def __init__(self, path, max_bytes=0, backup_count=0, rotate_daily=False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.rotate_daily = rotate_daily
+        self.stream = None
+        self.size = 0
+        self.opened_on = None
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self.stream = open(self.path, 'ab')
+        self.size = self.stream.tell()
+        # An existing file keeps the day it was last written on
+        if self.size:
+            self.opened_on = date.fromtimestamp(os.path.getmtime(self.path))
+        else:
+            self.opened_on = date.today()
+
+    def _should_rotate(self, incoming):
+        if not self.size:
+            return False
+        if self.max_bytes and self.size + incoming > self.max_bytes:
+            return True
+        return self.rotate_daily and self.opened_on != date.today()
+
+    def _rotate(self):
+        self.stream.close()
+        os.replace(self.path, f"{self.path}.{datetime.now().strftime('%Y%m%d%H%M%S%f')}")
+        if self.backup_count:
+            directory = os.path.dirname(self.path) or '.'
+            prefix = os.path.basename(self.path) + '.'
+            backups = sorted(name for name in os.listdir(directory) if name.startswith(prefix))
+            for name in backups[:-self.backup_count]:
+                os.remove(os.path.join(directory, name))
+        self._open()
+
+    def write(self, data):
+        if self.stream is None:
+            self._open()
+        elif self._should_rotate(len(data)):
+            self._rotate()
+        self.stream.write(data)
+        self.stream.flush()
+        self.size += len(data)
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+
+class BufferedLogWriter:
+    """
+    Queue-backed writer for the JSON-lines log files.
+
+    Callers only format a tuple and ``put_nowait`` it, so logging never
+    blocks a request: when the bounded queue is full the record is dropped
+    and counted. A background thread drains the queue in batches and writes
+    each batch with one write per file.
+    """
+
+    def __init__(self, channel_files, level=logging.INFO, queue_size=10000, batch_size=500,
+                 max_bytes=0, backup_count=0, rotate_daily=False, echo=False):
+        self.channel_files = channel_files
+        self.level = level
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.rotate_daily = rotate_daily
+        self.echo = echo
+        self.dropped = 0
+        self.written = 0
+        self._reported_dropped = 0
+        self._lock = threading.Lock()
+        self._queue = None
+        self._files = {}
+        self._pid = None
+
+    def _ensure_started(self):
+        # A forked worker inherits neither the thread nor a usable queue
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.queue_size)
+            self._files = {}
+            thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+            thread.start()
+            self._pid = os.getpid()
+
+    def submit(self, channel, level, message):
+        """Queue a record, returning False if it was filtered out or dropped"""
+        if level < self.level:
+            return False
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((time.time(), level, channel, message))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        return True
+
+    def flush(self, timeout=None):
+        """Wait until everything queued so far has been written"""
+        if self._pid != os.getpid():
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize() if self._queue else 0,
+            'written': self.written,
+            'dropped': self.dropped,
+        }
+
+    def _run(self):
+        log_queue = self._queue
+        while True:
+            batch = [log_queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(log_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            records = [item for item in batch if isinstance(item, tuple)]
+            try:
+                self._write(records)
+            except Exception as exc:  # never let the writer thread die
+                print(f'Log writer failed: {exc}', file=sys.stderr)
+
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+
+    def _write(self, records):
+        dropped = self.dropped
+        if dropped > self._reported_dropped:
+            records.append((
+                time.time(), logging.WARNING, 'app',
+                f'Log queue full, dropped {dropped - self._reported_dropped} records',
+            ))
+            self._reported_dropped = dropped
+
+        lines = {}
+        for timestamp, level, channel, message in records:
+            line = json.dumps({
+                'timestamp': datetime.fromtimestamp(timestamp).isoformat(timespec='milliseconds'),
+                'level': logging.getLevelName(level),
+                'channel': channel,
+                'message': message,
+            }, default=str)
+            lines.setdefault(channel, []).append(line)
+
+        for channel, channel_lines in lines.items():
+            data = ('\n'.join(channel_lines) + '\n').encode('utf-8')
+            log_file = self._files.get(channel)
+            if log_file is None:
+                log_file = self._files[channel] = RotatingLogFile(
+                    self.channel_files[channel], self.max_bytes, self.backup_count, self.rotate_daily
+                )
+            log_file.write(data)
+            if self.echo:
+                sys.stdout.write(data.decode('utf-8'))
+            self.written += len(channel_lines)
+
+
+_writer = BufferedLogWriter(
+    CHANNEL_FILES,
+    level=LOG_LEVEL,
+    queue_size=LOG_QUEUE_SIZE,
+    batch_size=LOG_BATCH_SIZE,
+    max_bytes=LOG_MAX_BYTES,
+    backup_count=LOG_BACKUP_COUNT,
+    rotate_daily=LOG_ROTATE_DAILY,
+    echo=LOG_ECHO,
+)
+atexit.register(_writer.flush, 2)
+
+
+def get_log_stats():
+    """Queue depth and written/dropped counters of the log writer"""
+    return _writer.stats()
+
+
+def flush_logs(timeout=None):
+    """Block until queued log records are on disk"""
+    return _writer.flush(timeout)
+
+
+def log_api_error(error_details, level=logging.ERROR):
     """Log API-related errors"""
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    log_message = f"API_ERROR : {error_details}\n"
-    
-    with open(API_ERROR_LOG, 'a') as f:
-        f.write(f"[{timestamp}] {log_message}")
-    
-    print(f"API Error logged: {error_details}")
-
-def log_app_error(error_details):
+    _writer.submit('api', level, error_details)
+
+
+def log_app_error(error_details, level=logging.ERROR):
     """Log application-related errors"""
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    log_message = f"APP_ERROR: {error_details}\n"
-    
-    with open(APP_ERROR_LOG, 'a') as f:
-        f.write(f"[{timestamp}] {log_message}")
-    
-    print(f"App Error logged: {error_details}")
-
-def log_db_error(error_details):
+    _writer.submit('app', level, error_details)
+
+
+def log_db_error(error_details, level=logging.ERROR):
     """Log database-related errors"""
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    log_message = f"DB_ERROR: {error_details}\n"
-    
-    with open(DB_ERROR_LOG, 'a') as f:
-        f.write(f"[{timestamp}] {log_message}")
-    
-    print(f"DB Error logged: {error_details}")
\ No newline at end of file
+    _writer.submit('db', level, error_details)
@@ -0,0 +1,110 @@
+# core/pagination.py
+import json
+
+from django.db import connections
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+
+
+class PortalPagination(PageNumberPagination):
+    """
+    Bounded page size for the customer portal order list
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_page_metadata(self):
+        """Pagination fields merged into a portal response next to its own keys"""
+        return {
+            'count': self.page.paginator.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+        }
+
+
+class PortalCursorPagination(CursorPagination):
+    """
+    Cursor pagination for portal lists that clients poll; the cursor keeps
+    pages stable while new rows arrive and avoids OFFSET scans
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+    def get_page_metadata(self):
+        """Pagination fields merged into a portal response next to its own keys"""
+        return {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+        }
+
+
+def estimate_count(queryset):
+    """
+    Row count of ``queryset`` from planner statistics on PostgreSQL.
+
+    Returns ``(count, estimated)``; other backends fall back to an exact
+    COUNT(*) since they have no cheap estimate.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count(), False
+
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows']), True
+
+
+class AdminCursorPagination(CursorPagination):
+    """
+    Opaque-cursor pagination for large admin lists.
+
+    Pages are fetched by seeking past the last row's sort key instead of
+    an OFFSET, and no COUNT(*) runs unless the client asks for
+    ``?count=approximate``. Views choose their sort keys with
+    ``cursor_ordering`` or ``get_cursor_ordering()``. Requests that still
+    send ``?page=`` get the previous page-number responses, so existing
+    clients keep working while they move to cursors.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+    count_query_param = 'count'
+    legacy_page_query_param = 'page'
+
+    def get_ordering(self, request, queryset, view):
+        if hasattr(view, 'get_cursor_ordering'):
+            return view.get_cursor_ordering()
+        return getattr(view, 'cursor_ordering', self.ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.legacy = None
+        if self.legacy_page_query_param in request.query_params:
+            self.legacy = PageNumberPagination()
+            return self.legacy.paginate_queryset(queryset, request, view)
+
+        self.count = None
+        if request.query_params.get(self.count_query_param) == 'approximate':
+            self.count, self.count_estimated = estimate_count(queryset)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.legacy is not None:
+            return self.legacy.get_paginated_response(data)
+
+        payload = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.count is not None:
+            payload['count'] = self.count
+            payload['count_estimated'] = self.count_estimated
+        return Response(payload)
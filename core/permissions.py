@@ -1,7 +1,108 @@
 # core/permissions.py
+from django.core.cache import cache
 from rest_framework.permissions import BasePermission
+
+from core.cache_versions import cache_is_shared, get_version
 from main.models import UserRole
 
+PERMISSIONS_NAMESPACE = 'permissions'
+PERMISSIONS_CACHE_TIMEOUT = 60 * 60
+# Used while the cache is per-process and other workers' role changes are not seen
+PERMISSIONS_LOCAL_CACHE_TIMEOUT = 30
+
+
+def compile_permissions(permissions):
+    """Compile a role's JSON permissions blob into a frozenset of granted keys"""
+    if isinstance(permissions, dict):
+        return frozenset(key for key, granted in permissions.items() if granted)
+    if isinstance(permissions, (list, tuple, set)):
+        return frozenset(permissions)
+    return frozenset()
+
+
+class ResolvedPermissions:
+    """A user's role name and compiled permission set"""
+    __slots__ = ('role', 'permissions', 'grants_all')
+
+    def __init__(self, role=None, permissions=frozenset(), grants_all=False):
+        self.role = role
+        self.permissions = permissions
+        self.grants_all = grants_all
+
+    def __getstate__(self):
+        return (self.role, self.permissions, self.grants_all)
+
+    def __setstate__(self, state):
+        self.role, self.permissions, self.grants_all = state
+
+    def allows(self, permission_key):
+        return self.grants_all or permission_key in self.permissions
+
+
+# Cached in place of None so users without a role are not re-queried
+NO_ROLE = ResolvedPermissions()
+
+
+def _load_user_role(user):
+    user_role = UserRole.objects.select_related('role').filter(user=user).first()
+    if user_role is None:
+        return NO_ROLE
+    role = user_role.role
+    return ResolvedPermissions(
+        role.name, compile_permissions(role.permissions), grants_all=role.name == 'SuperAdmin'
+    )
+
+
+def _load_admin_role(user):
+    from admin_panel.models import AdminUser, DEFAULT_ROLE_PERMISSIONS
+
+    admin_user = AdminUser.objects.select_related('custom_role').filter(user=user).first()
+    if admin_user is None:
+        return NO_ROLE
+    permissions = DEFAULT_ROLE_PERMISSIONS.get(admin_user.role, frozenset())
+    if admin_user.custom_role:
+        permissions = permissions | compile_permissions(admin_user.custom_role.permissions)
+    return ResolvedPermissions(
+        admin_user.role, permissions, grants_all=admin_user.role == 'super_admin'
+    )
+
+
+def _resolve(user, kind, loader):
+    """
+    Resolve permissions through a per-request memo on the user instance,
+    then the shared cache, then the database.
+
+    Cache keys embed the permissions version, which is bumped whenever a
+    role or role assignment is saved or deleted. A per-process cache only
+    sees its own bumps, so entries are then kept for seconds, not an hour.
+    """
+    if not user.is_authenticated:
+        return None
+
+    memo = user.__dict__.setdefault('_resolved_permissions', {})
+    resolved = memo.get(kind)
+    if resolved is None:
+        version = get_version(PERMISSIONS_NAMESPACE)
+        cache_key = f'{PERMISSIONS_NAMESPACE}:{version}:{kind}:{user.pk}'
+        resolved = cache.get(cache_key)
+        if resolved is None:
+            resolved = loader(user)
+            timeout = PERMISSIONS_CACHE_TIMEOUT if cache_is_shared() else PERMISSIONS_LOCAL_CACHE_TIMEOUT
+            cache.set(cache_key, resolved, timeout)
+        memo[kind] = resolved
+
+    return None if resolved.role is None else resolved
+
+
+def resolve_user_role(user):
+    """Resolved ``UserRole`` permissions for a user, or None if unassigned"""
+    return _resolve(user, 'role', _load_user_role)
+
+
+def resolve_admin_permissions(user):
+    """Resolved ``AdminUser`` permissions for a user, or None if not an admin"""
+    return _resolve(user, 'admin', _load_admin_role)
+
 
 class HasRolePermission(BasePermission):
     """
@@ -18,48 +119,27 @@ class HasRolePermission(BasePermission):
         if not request.user.is_authenticated:
             return False
 
-        try:
-            user_role = UserRole.objects.get(user=request.user)
-            role = user_role.role
-
-            # SuperAdmin has all permissions
-            if role.name == 'SuperAdmin':
-                return True
-
-            # Check if role has required permissions
-            for permission in self.required_permissions:
-                if not role.has_permission(permission):
-                    return False
-
-            return True
-
-        except UserRole.DoesNotExist:
+        resolved = resolve_user_role(request.user)
+        if resolved is None:
             return False
 
+        # SuperAdmin has all permissions
+        return all(resolved.allows(permission) for permission in self.required_permissions)
+
 
 def has_permission(user, permission_key):
     """
     Utility function to check if user has a specific permission
     """
-    if not user.is_authenticated:
-        return False
-
-    try:
-        user_role = UserRole.objects.get(user=user)
-        return user_role.role.has_permission(permission_key)
-    except UserRole.DoesNotExist:
+    resolved = resolve_user_role(user)
+    if resolved is None:
         return False
+    return permission_key in resolved.permissions
 
 
 def get_user_role(user):
     """
     Get user's role name
     """
-    if not user.is_authenticated:
-        return None
-
-    try:
-        user_role = UserRole.objects.get(user=user)
-        return user_role.role.name
-    except UserRole.DoesNotExist:
-        return None
\ No newline at end of file
+    resolved = resolve_user_role(user)
+    return resolved.role if resolved else None
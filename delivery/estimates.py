@@ -0,0 +1,86 @@
+# delivery/estimates.py
+import math
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+
+from .geo import haversine_km
+
+# Average door-to-door speeds in town, including stops and traffic
+VEHICLE_SPEEDS_KMH = {
+    'bicycle': 12,
+    'motorcycle': 28,
+    'car': 22,
+    'van': 20,
+    'truck': 16,
+}
+# Used until a rider (and so a vehicle) is known
+DEFAULT_VEHICLE_TYPE = 'motorcycle'
+
+# Largest value Delivery.distance_km (6 digits, 2 decimals) can hold
+MAX_DISTANCE_KM = 9999.99
+
+
+def detour_factor():
+    """Ratio of road distance to straight-line distance (DELIVERY_DETOUR_FACTOR)"""
+    return float(getattr(settings, 'DELIVERY_DETOUR_FACTOR', 1.3))
+
+
+def vehicle_speed(vehicle_type):
+    speeds = getattr(settings, 'DELIVERY_VEHICLE_SPEEDS_KMH', None) or VEHICLE_SPEEDS_KMH
+    return speeds.get(vehicle_type) or speeds.get(DEFAULT_VEHICLE_TYPE) or VEHICLE_SPEEDS_KMH[DEFAULT_VEHICLE_TYPE]
+
+
+def estimate_trips(pickup_lats, pickup_lngs, dropoff_lats, dropoff_lngs, vehicle_types=None):
+    """
+    Road distance (km, 2 dp) and riding time (whole minutes) for arrays of trips.
+
+    Straight-line distance times the detour factor, at the speed of each
+    trip's vehicle type (or the default vehicle).
+    """
+    distances = haversine_km(
+        np.asarray(pickup_lats, dtype=float), np.asarray(pickup_lngs, dtype=float),
+        np.asarray(dropoff_lats, dtype=float), np.asarray(dropoff_lngs, dtype=float),
+    ) * detour_factor()
+    distances = np.minimum(np.round(distances, 2), MAX_DISTANCE_KM)
+
+    if vehicle_types is None:
+        speeds = np.full(len(distances), float(vehicle_speed(DEFAULT_VEHICLE_TYPE)))
+    else:
+        types, inverse = np.unique(np.asarray(vehicle_types, dtype=object).astype(str), return_inverse=True)
+        speeds = np.array([float(vehicle_speed(vehicle_type)) for vehicle_type in types])[inverse]
+    minutes = np.ceil(distances / speeds * 60).astype(int)
+    return distances, minutes
+
+
+def estimate_trip(pickup_lat, pickup_lng, dropoff_lat, dropoff_lng, vehicle_type=None):
+    """(distance_km as Decimal, duration minutes) for one trip, or (None, None) without coordinates"""
+    if None in (pickup_lat, pickup_lng, dropoff_lat, dropoff_lng):
+        return None, None
+    distance = haversine_km(float(pickup_lat), float(pickup_lng), [float(dropoff_lat)], [float(dropoff_lng)])[0]
+    distance = min(round(float(distance) * detour_factor(), 2), MAX_DISTANCE_KM)
+    minutes = int(math.ceil(distance / vehicle_speed(vehicle_type or DEFAULT_VEHICLE_TYPE) * 60))
+    return Decimal(str(distance)), minutes
+
+
+def parse_trip_coordinates(data):
+    """
+    Validated ``pickup_*``/``delivery_*`` latitude and longitude fields
+    present in request data; raises ValueError for a bad pair.
+    """
+    fields = {}
+    for prefix in ('pickup', 'delivery'):
+        lat, lng = data.get(f'{prefix}_latitude'), data.get(f'{prefix}_longitude')
+        if lat in (None, '') and lng in (None, ''):
+            continue
+        try:
+            lat, lng = float(lat), float(lng)
+        except (TypeError, ValueError):
+            raise ValueError(f'Invalid {prefix} coordinates')
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise ValueError(f'Invalid {prefix} coordinates')
+        fields[f'{prefix}_latitude'] = round(lat, 6)
+        fields[f'{prefix}_longitude'] = round(lng, 6)
+    return fields
+
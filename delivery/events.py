@@ -0,0 +1,33 @@
+# delivery/events.py
+from core.events import publish
+
+
+def delivery_channel(tracking_number):
+    return f'delivery:{tracking_number}'
+
+
+def rider_channel(rider_id):
+    return f'rider:{rider_id}'
+
+
+def publish_delivery_status(delivery):
+    """Announce a delivery's new status to its trackers and its rider"""
+    data = {
+        'tracking_number': delivery.tracking_number,
+        'status': delivery.status,
+        'rider_id': delivery.rider_id,
+        'updated_at': delivery.updated_at.isoformat() if delivery.updated_at else None,
+    }
+    publish(delivery_channel(delivery.tracking_number), 'status', data)
+    if delivery.rider_id:
+        publish(rider_channel(delivery.rider_id), 'status', data)
+
+
+def publish_rider_position(rider_id, lat, lng, recorded_at):
+    """Announce a rider's latest position"""
+    publish(rider_channel(rider_id), 'position', {
+        'rider_id': rider_id,
+        'latitude': round(lat, 6),
+        'longitude': round(lng, 6),
+        'recorded_at': recorded_at.isoformat(),
+    })
@@ -0,0 +1,89 @@
+# delivery/geo.py
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Precision 6 geohash cells are about 1.2 km x 0.6 km
+LOCATION_CELL_PRECISION = 6
+
+# Beyond this many cells an IN (...) list stops paying off; callers fall
+# back to a latitude/longitude bounding box
+MAX_COVERING_CELLS = 400
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def geohash_encode(lat, lng, precision=LOCATION_CELL_PRECISION):
+    """Geohash of a point; nearby points share cells and prefixes"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        value, value_range = (lng, lng_range) if even else (lat, lat_range)
+        mid = (value_range[0] + value_range[1]) / 2
+        if value >= mid:
+            bits = bits * 2 + 1
+            value_range[0] = mid
+        else:
+            bits = bits * 2
+            value_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+
+def cell_size(precision=LOCATION_CELL_PRECISION):
+    """(height, width) in degrees of a geohash cell"""
+    total_bits = 5 * precision
+    lat_bits = total_bits // 2
+    lng_bits = total_bits - lat_bits
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def bounding_box(lat, lng, radius_km):
+    """(lat_min, lat_max, lng_min, lng_max) enclosing a circle"""
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    dlng = min(180.0, dlat / max(math.cos(math.radians(lat)), 1e-6))
+    return (
+        max(-90.0, lat - dlat), min(90.0, lat + dlat),
+        max(-180.0, lng - dlng), min(180.0, lng + dlng),
+    )
+
+
+def covering_cells(lat, lng, radius_km, precision=LOCATION_CELL_PRECISION):
+    """
+    Geohash cells intersecting the circle's bounding box, or None when more
+    than MAX_COVERING_CELLS would be needed.
+
+    Samples are spaced one cell apart from the box edge, so every cell
+    that overlaps the box contains at least one of them.
+    """
+    lat_min, lat_max, lng_min, lng_max = bounding_box(lat, lng, radius_km)
+    height, width = cell_size(precision)
+    rows = math.ceil((lat_max - lat_min) / height) + 1
+    cols = math.ceil((lng_max - lng_min) / width) + 1
+    if rows * cols > MAX_COVERING_CELLS:
+        return None
+
+    lats = np.minimum(lat_min + np.arange(rows) * height, lat_max)
+    lngs = np.minimum(lng_min + np.arange(cols) * width, lng_max)
+    return {geohash_encode(cell_lat, cell_lng, precision) for cell_lat in lats for cell_lng in lngs}
+
+
+def haversine_km(lat, lng, lats, lngs):
+    """Great-circle distances in km from one point to arrays of points"""
+    lat1 = np.radians(lat)
+    lat2 = np.radians(np.asarray(lats, dtype=float))
+    dlat = lat2 - lat1
+    dlng = np.radians(np.asarray(lngs, dtype=float) - lng)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
@@ -0,0 +1,115 @@
+# delivery/idempotency.py
+"""
+Idempotency-Key support for order creation.
+
+Clients send the same ``Idempotency-Key`` header on every retry of one
+logical request. The first request inserts its IdempotencyKey row and runs
+the write path in the same transaction, then stores the response on the
+row. Retries find the row and get that response back without the write
+path running again. A concurrent duplicate blocks on the key's unique
+constraint until the first request commits, then replays its response.
+
+Only successful responses are stored: anything else rolls the whole
+transaction back, so a failed attempt leaves neither orders nor a key
+behind and may be retried with the same key.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+
+class _Rollback(Exception):
+    """Carries an unsuccessful response out of the atomic block"""
+
+    def __init__(self, response):
+        self.response = response
+
+
+def key_ttl():
+    return timedelta(hours=getattr(settings, 'IDEMPOTENCY_KEY_TTL_HOURS', 24))
+
+
+def request_fingerprint(method, path, data):
+    body = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(f'{method} {path}\n{body}'.encode()).hexdigest()
+
+
+def _response_body(response):
+    data = getattr(response, 'data', None)
+    if data is None:
+        return json.loads(response.content or b'null')
+    # Round-trip so Decimals, dates and serializer dicts store as plain JSON
+    return json.loads(json.dumps(data, cls=DjangoJSONEncoder))
+
+
+def _run_atomic(handler):
+    try:
+        with transaction.atomic():
+            response = handler()
+            if not 200 <= response.status_code < 300:
+                raise _Rollback(response)
+    except _Rollback as rollback:
+        return rollback.response
+    return response
+
+
+def _replay(record, fingerprint, render):
+    if record.fingerprint != fingerprint:
+        return render({'error': f'{HEADER} was already used for a different request'}, 422)
+    response = render(record.response_body, record.status_code)
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def idempotent(request, scope, user, data, handler, render):
+    """
+    Run ``handler()`` at most once per Idempotency-Key and return its response.
+
+    ``scope`` names the endpoint, ``data`` is the parsed request body (used
+    to detect a key reused for a different request) and ``render(body,
+    status)`` builds a response of the endpoint's type. Without the header
+    the handler still runs in a single transaction.
+    """
+    key = request.headers.get(HEADER)
+    if key is None:
+        return _run_atomic(handler)
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return render({'error': f'{HEADER} must be 1 to {MAX_KEY_LENGTH} characters'}, 400)
+
+    fingerprint = request_fingerprint(request.method, request.path, data)
+    lookup = {'user': user, 'scope': scope, 'key': key}
+    record = IdempotencyKey.objects.filter(**lookup, expires_at__gt=timezone.now()).first()
+    if record is not None:
+        return _replay(record, fingerprint, render)
+
+    def handle():
+        now = timezone.now()
+        # An expired key may be reused
+        IdempotencyKey.objects.filter(**lookup, expires_at__lte=now).delete()
+        record = IdempotencyKey.objects.create(**lookup, fingerprint=fingerprint, expires_at=now + key_ttl())
+        response = handler()
+        if 200 <= response.status_code < 300:
+            record.status_code = response.status_code
+            record.response_body = _response_body(response)
+            record.save(update_fields=['status_code', 'response_body'])
+        return response
+
+    try:
+        return _run_atomic(handle)
+    except IntegrityError:
+        # A concurrent request with this key committed first
+        record = IdempotencyKey.objects.filter(**lookup).first()
+        if record is None:
+            raise
+        return _replay(record, fingerprint, render)
@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-18 15:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0002_dashboard_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['user_type', '-created_at'], name='delivery_us_user_ty_26a502_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-18 15:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0003_admin_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='current_latitude',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='current_longitude',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='location_cell',
+            field=models.CharField(blank=True, default='', help_text='Geohash of the current position', max_length=12),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['location_cell', 'is_available'], name='delivery_us_locatio_782296_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-18 15:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0004_rider_location_cells'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='delivery',
+            index=models.Index(fields=['status', '-priority', 'estimated_pickup'], name='delivery_de_status_a43bf7_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-18 15:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0006_delivery_cancelled_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryTrack',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField()),
+                ('last_recorded_at', models.DateTimeField()),
+                ('point_count', models.PositiveIntegerField(default=0)),
+                ('data', models.BinaryField(default=bytes)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('delivery', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='track', to='delivery.delivery')),
+                ('rider', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='delivery_tracks', to='delivery.userprofile')),
+            ],
+            options={
+                'verbose_name': 'Delivery Track',
+                'verbose_name_plural': 'Delivery Tracks',
+            },
+        ),
+    ]
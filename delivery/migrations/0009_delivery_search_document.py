@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 16:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0008_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='delivery',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+    ]
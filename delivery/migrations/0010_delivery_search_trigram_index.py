@@ -0,0 +1,37 @@
+# Trigram index for admin search (see delivery/search.py). PostgreSQL only;
+# other databases fall back to scanning search_document. Built CONCURRENTLY so
+# writes to deliveries are not blocked while it is created, which is why the
+# migration is not atomic. Migration 0012 fills the column.
+
+from django.db import migrations
+
+INDEX_NAME = 'delivery_search_document_trgm'
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAME} '
+        'ON delivery_delivery USING gin (search_document gin_trgm_ops)'
+    )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('delivery', '0009_delivery_search_document'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 16:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0010_delivery_search_trigram_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='phone_e164',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, help_text="phone in E.164 form, '' if it is not a valid number", max_length=16),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Fill search_document for deliveries created before it existed, so admin
+# search finds them straight after deploy. Each chunk commits on its own,
+# which is why the migration is not atomic; an interrupted run picks up the
+# rows still left empty. The document format is copied from delivery/search.py
+# as it stood when this migration was written, so later changes there do not
+# alter it; rebuild_delivery_search --all applies a newer format.
+
+import re
+
+from django.db import migrations, transaction
+
+CHUNK_SIZE = 5000
+COLUMNS = (
+    'id', 'tracking_number', 'sender__user__first_name', 'sender__user__last_name', 'sender__user__username',
+    'recipient_name', 'recipient_phone',
+)
+
+
+def build_search_document(tracking_number, first_name, last_name, username, recipient_name, recipient_phone):
+    parts = (tracking_number, first_name, last_name, username, recipient_name, re.sub(r'\D', '', recipient_phone or ''))
+    return ' '.join(' '.join(part.split()) for part in parts if part).lower()
+
+
+def populate_search_documents(apps, schema_editor):
+    Delivery = apps.get_model('delivery', 'Delivery')
+    db = schema_editor.connection.alias
+    deliveries = Delivery.objects.using(db).filter(search_document='')
+    last_id = 0
+    while True:
+        rows = list(deliveries.filter(pk__gt=last_id).order_by('pk').values_list(*COLUMNS)[:CHUNK_SIZE])
+        if not rows:
+            break
+        with transaction.atomic(using=db):
+            Delivery.objects.using(db).bulk_update(
+                [Delivery(pk=row[0], search_document=build_search_document(*row[1:])) for row in rows],
+                ['search_document'],
+            )
+        last_id = rows[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('delivery', '0011_userprofile_phone_e164'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_search_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,76 @@
+# Fill phone_e164 for profiles saved before it existed, so senders entered
+# by phone match their existing profile straight after deploy. Each chunk
+# commits on its own, which is why the migration is not atomic.
+#
+# The normalization below is copied from delivery/phones.py as it stood
+# when this migration was written, with the country code fixed at its
+# default of 254, so later changes there do not alter this migration.
+# Deployments in another country should rerun backfill_phone_numbers
+# (with --country-code if needed) after migrating.
+
+import re
+
+from django.db import migrations, transaction
+
+CHUNK_SIZE = 5000
+COUNTRY_CODE = '254'
+MAX_DIGITS = 15
+MIN_DIGITS = 8
+MIN_NATIONAL_DIGITS = 7
+
+
+def normalize_phone(phone):
+    value = (phone or '').strip()
+    digits = re.sub(r'\D', '', value)
+    if not digits:
+        return ''
+
+    if value.startswith('+'):
+        pass
+    elif digits.startswith('00'):
+        digits = digits[2:]
+    elif digits.startswith(COUNTRY_CODE) and len(digits) >= len(COUNTRY_CODE) + MIN_NATIONAL_DIGITS:
+        pass
+    else:
+        national = digits[1:] if digits.startswith('0') else digits
+        if len(national) < MIN_NATIONAL_DIGITS:
+            return ''
+        digits = COUNTRY_CODE + national
+
+    if digits.startswith('0') or not MIN_DIGITS <= len(digits) <= MAX_DIGITS:
+        return ''
+    return f'+{digits}'
+
+
+def fill_phone_e164(apps, schema_editor):
+    UserProfile = apps.get_model('delivery', 'UserProfile')
+    db = schema_editor.connection.alias
+    last_id = 0
+    while True:
+        rows = list(
+            UserProfile.objects.using(db).filter(pk__gt=last_id).order_by('pk')
+            .values_list('id', 'phone', 'phone_e164')[:CHUNK_SIZE]
+        )
+        if not rows:
+            break
+        profiles = []
+        for pk, phone, current in rows:
+            phone_e164 = normalize_phone(phone)
+            if phone_e164 != current:
+                profiles.append(UserProfile(pk=pk, phone_e164=phone_e164))
+        with transaction.atomic(using=db):
+            UserProfile.objects.using(db).bulk_update(profiles, ['phone_e164'])
+        last_id = rows[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('delivery', '0012_populate_search_document'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_phone_e164, migrations.RunPython.noop),
+    ]
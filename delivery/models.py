@@ -2,10 +2,17 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
 import uuid
 import os
 
+from .estimates import estimate_trip
+from .geo import geohash_encode
+from .phones import normalize_phone
+from .search import build_search_document
+from .tracking_cache import invalidate_tracking
+
 class UserProfile(models.Model):
     """Unified user profile that can be both customer and rider"""
     USER_TYPES = [
@@ -44,6 +51,8 @@ class UserProfile(models.Model):
     
     # Contact info
     phone = models.CharField(max_length=20)
+    phone_e164 = models.CharField(max_length=16, blank=True, default='', db_index=True, editable=False,
+                                  help_text="phone in E.164 form, '' if it is not a valid number")
     address = models.TextField()
     profile_image = models.ImageField(upload_to='profiles/', blank=True, null=True)
     
@@ -65,6 +74,9 @@ class UserProfile(models.Model):
     # Rider status and availability
     is_available = models.BooleanField(default=False)
     current_location = models.CharField(max_length=200, blank=True, null=True)
+    current_latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    current_longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    location_cell = models.CharField(max_length=12, blank=True, default='', help_text="Geohash of the current position")
     last_location_update = models.DateTimeField(null=True, blank=True)
     
     # Rating and performance
@@ -91,6 +103,8 @@ class UserProfile(models.Model):
         indexes = [
             models.Index(fields=['user_type', 'status']),
             models.Index(fields=['is_available', 'user_type']),
+            models.Index(fields=['user_type', '-created_at']),
+            models.Index(fields=['location_cell', 'is_available']),
         ]
     
     def __str__(self):
@@ -132,6 +146,14 @@ class UserProfile(models.Model):
     def save(self, *args, **kwargs):
         """Override save to run full_clean"""
         self.full_clean()
+        if self.current_latitude is not None and self.current_longitude is not None:
+            self.location_cell = geohash_encode(float(self.current_latitude), float(self.current_longitude))
+        else:
+            self.location_cell = ''
+        self.phone_e164 = normalize_phone(self.phone)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'phone' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'phone_e164'}
         super().save(*args, **kwargs)
     
     @property
@@ -295,7 +317,11 @@ class Delivery(models.Model):
     # Metadata
     notes = models.TextField(blank=True)
     cancellation_reason = models.TextField(blank=True)
+    cancelled_at = models.DateTimeField(null=True, blank=True)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
+
+    # Lowercased text matched by admin search (see delivery/search.py)
+    search_document = models.TextField(blank=True, default='', editable=False)
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -310,15 +336,51 @@ class Delivery(models.Model):
             models.Index(fields=['tracking_number']),
             models.Index(fields=['sender', 'status']),
             models.Index(fields=['rider', 'status']),
+            models.Index(fields=['created_at']),
+            models.Index(fields=['actual_delivery']),
+            models.Index(fields=['status', '-priority', 'estimated_pickup']),
         ]
     
+    # Fields that go into search_document
+    SEARCH_FIELDS = frozenset({'tracking_number', 'sender', 'sender_id', 'recipient_name', 'recipient_phone'})
+
     def __str__(self):
         return f"Delivery #{self.tracking_number} - {self.get_status_display()}"
 
     def save(self, *args, **kwargs):
         if not self.tracking_number:
             self.tracking_number = f"DLV-{uuid.uuid4().hex[:10].upper()}"
+        if self.distance_km is None:
+            self.estimate_trip()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or self.SEARCH_FIELDS.intersection(update_fields):
+            self.search_document = self.build_search_document()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'search_document'}
         super().save(*args, **kwargs)
+        invalidate_tracking(self.tracking_number)
+
+    def build_search_document(self):
+        if Delivery.sender.is_cached(self):
+            user = self.sender.user
+            names = (user.first_name, user.last_name, user.username)
+        else:
+            names = User.objects.filter(profile__id=self.sender_id).values_list(
+                'first_name', 'last_name', 'username'
+            ).first() or ('', '', '')
+        return build_search_document(self.tracking_number, *names, self.recipient_name, self.recipient_phone)
+
+    def estimate_trip(self):
+        """Fill distance_km and estimated_duration_minutes from the coordinates, if known"""
+        vehicle_type = self.rider.vehicle_type if self.rider_id else None
+        distance, minutes = estimate_trip(
+            self.pickup_latitude, self.pickup_longitude,
+            self.delivery_latitude, self.delivery_longitude,
+            vehicle_type,
+        )
+        if distance is not None:
+            self.distance_km = distance
+            self.estimated_duration_minutes = minutes
     
     @property
     def is_active(self):
@@ -353,6 +415,35 @@ class DeliveryStatusUpdate(models.Model):
     def __str__(self):
         return f"{self.delivery.tracking_number} - {self.get_status_display()} at {self.created_at.strftime('%Y-%m-%d %H:%M')}"
 
+    def save(self, *args, **kwargs):
+        """Override save to refresh the delivery's cached tracking page"""
+        super().save(*args, **kwargs)
+        invalidate_tracking(self.delivery.tracking_number)
+
+class DeliveryTrack(models.Model):
+    """
+    GPS trail of a delivery, stored as one packed array instead of a row per fix.
+
+    ``data`` holds little-endian int32 (seconds, latitude, longitude) triples,
+    each the difference from the previous fix; coordinates are in 1e-5
+    degrees and the first fix is relative to (started_at, 0, 0). See
+    delivery/tracks.py for the codec.
+    """
+    delivery = models.OneToOneField(Delivery, on_delete=models.CASCADE, related_name='track')
+    rider = models.ForeignKey(UserProfile, on_delete=models.SET_NULL, null=True, blank=True, related_name='delivery_tracks')
+    started_at = models.DateTimeField()
+    last_recorded_at = models.DateTimeField()
+    point_count = models.PositiveIntegerField(default=0)
+    data = models.BinaryField(default=bytes)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Delivery Track'
+        verbose_name_plural = 'Delivery Tracks'
+
+    def __str__(self):
+        return f"Track for {self.delivery.tracking_number} ({self.point_count} points)"
+
 class Payment(models.Model):
     """Payment information"""
     PAYMENT_METHODS = [
@@ -412,10 +503,16 @@ class Payment(models.Model):
         indexes = [
             models.Index(fields=['status', 'payment_method']),
             models.Index(fields=['transaction_id']),
+            models.Index(fields=['paid_at']),
         ]
     
     def __str__(self):
         return f"Payment for {self.delivery.tracking_number} - {self.get_status_display()}"
+
+    def save(self, *args, **kwargs):
+        """Override save to refresh the delivery's cached tracking page"""
+        super().save(*args, **kwargs)
+        invalidate_tracking(self.delivery.tracking_number)
     
     @property
     def total_amount(self):
@@ -486,4 +583,31 @@ class DeliveryProof(models.Model):
         verbose_name_plural = 'Delivery Proofs'
     
     def __str__(self):
-        return f"Proof for {self.delivery.tracking_number}"
\ No newline at end of file
+        return f"Proof for {self.delivery.tracking_number}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Outcome of a request sent with an ``Idempotency-Key`` header.
+
+    Retries with the same key get the stored response instead of creating
+    the order again. See delivery/idempotency.py.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    scope = models.CharField(max_length=50, help_text="Endpoint the key was sent to")
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64, help_text="SHA-256 of the method, path and body")
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = 'Idempotency Key'
+        verbose_name_plural = 'Idempotency Keys'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'scope', 'key'], name='unique_idempotency_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.key} for {self.user}"
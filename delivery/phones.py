@@ -0,0 +1,83 @@
+# delivery/phones.py
+"""
+Phone numbers in E.164 form (``+254712345678``).
+
+Numbers are entered as ``0712 345 678``, ``712345678``, ``254712345678``,
+``00254...`` or ``+254 712 345 678``. All of these normalize to the same
+string, which is what UserProfile.phone_e164 stores and senders are looked
+up by. Numbers without an international prefix are taken to be in
+PHONE_DEFAULT_COUNTRY_CODE.
+"""
+import re
+
+from django.conf import settings
+from django.db import transaction
+
+# E.164 allows at most 15 digits including the country code
+MAX_DIGITS = 15
+MIN_DIGITS = 8
+# Shortest national number (without trunk prefix or country code)
+MIN_NATIONAL_DIGITS = 7
+
+
+def default_country_code():
+    return str(getattr(settings, 'PHONE_DEFAULT_COUNTRY_CODE', '254'))
+
+
+def normalize_phone(phone, country_code=None):
+    """E.164 form of ``phone``, or '' if it cannot be one"""
+    value = (phone or '').strip()
+    digits = re.sub(r'\D', '', value)
+    if not digits:
+        return ''
+    country_code = country_code or default_country_code()
+
+    if value.startswith('+'):
+        pass
+    elif digits.startswith('00'):
+        digits = digits[2:]
+    elif digits.startswith(country_code) and len(digits) >= len(country_code) + MIN_NATIONAL_DIGITS:
+        # International number typed without the "+"
+        pass
+    else:
+        # National number, possibly with a trunk prefix
+        national = digits[1:] if digits.startswith('0') else digits
+        if len(national) < MIN_NATIONAL_DIGITS:
+            return ''
+        digits = country_code + national
+
+    if digits.startswith('0') or not MIN_DIGITS <= len(digits) <= MAX_DIGITS:
+        return ''
+    return f'+{digits}'
+
+
+def backfill_phone_e164(queryset, chunk_size=5000, start_after=0, country_code=None):
+    """
+    Store the normalized phone of each profile in ``queryset``, in pk
+    order with one transaction per chunk, yielding (profiles updated,
+    profiles without a valid number, last id) after each.
+    """
+    model = queryset.model
+    done = invalid = 0
+    last_id = start_after
+    while True:
+        rows = list(
+            queryset.filter(pk__gt=last_id).order_by('pk')
+            .values_list('id', 'phone', 'phone_e164')[:chunk_size]
+        )
+        if not rows:
+            return
+
+        profiles = []
+        for pk, phone, current in rows:
+            phone_e164 = normalize_phone(phone, country_code)
+            invalid += not phone_e164
+            if phone_e164 != current:
+                profiles.append(model(pk=pk, phone_e164=phone_e164))
+        # bulk_update skips UserProfile.save (and its full_clean) and leaves updated_at alone
+        with transaction.atomic(using=queryset.db):
+            model._default_manager.using(queryset.db).bulk_update(profiles, ['phone_e164'])
+
+        done += len(profiles)
+        last_id = rows[-1][0]
+        yield done, invalid, last_id
@@ -0,0 +1,96 @@
+# delivery/rider_locations.py
+from datetime import timedelta
+
+import numpy as np
+from django.utils import timezone
+
+from .events import publish_rider_position
+from .geo import bounding_box, covering_cells, geohash_encode, haversine_km
+from .models import UserProfile
+
+RIDER_TYPES = ['rider', 'both']
+DEFAULT_RADIUS_KM = 3
+# Riders that have not reported a position for this long are not offered
+LOCATION_MAX_AGE = timedelta(minutes=15)
+
+
+def parse_coordinates(lat, lng):
+    """Validated (lat, lng) floats, or raise ValueError"""
+    lat = float(lat)
+    lng = float(lng)
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError('Coordinates out of range')
+    return lat, lng
+
+
+def update_rider_location(rider, lat, lng):
+    """
+    Store a rider's position with a single UPDATE.
+
+    Location pings are frequent, so this skips UserProfile.save() and its
+    full_clean(); the in-memory instance is updated to match.
+    """
+    now = timezone.now()
+    fields = {
+        'current_latitude': round(lat, 6),
+        'current_longitude': round(lng, 6),
+        'location_cell': geohash_encode(lat, lng),
+        'last_location_update': now,
+        'updated_at': now,
+    }
+    UserProfile.objects.filter(pk=rider.pk).update(**fields)
+    for field, value in fields.items():
+        setattr(rider, field, value)
+    publish_rider_position(rider.pk, lat, lng, now)
+
+
+def nearest_riders(lat, lng, radius=DEFAULT_RADIUS_KM, vehicle_types=None, k=10, max_age=LOCATION_MAX_AGE):
+    """
+    Up to ``k`` active, available riders within ``radius`` km of a point,
+    nearest first, each with a ``distance_km`` attribute.
+
+    Candidates are pruned in the database by geohash cell (or a bounding
+    box for very large radii) and then ranked with a vectorised haversine.
+    """
+    queryset = UserProfile.objects.filter(
+        user_type__in=RIDER_TYPES,
+        status='active',
+        is_available=True,
+        current_latitude__isnull=False,
+        current_longitude__isnull=False,
+    )
+    cells = covering_cells(lat, lng, radius)
+    if cells is None:
+        lat_min, lat_max, lng_min, lng_max = bounding_box(lat, lng, radius)
+        queryset = queryset.filter(
+            current_latitude__range=(lat_min, lat_max),
+            current_longitude__range=(lng_min, lng_max),
+        )
+    else:
+        queryset = queryset.filter(location_cell__in=cells)
+    if vehicle_types:
+        queryset = queryset.filter(vehicle_type__in=vehicle_types)
+    if max_age:
+        queryset = queryset.filter(last_location_update__gte=timezone.now() - max_age)
+
+    rows = list(queryset.values_list('id', 'current_latitude', 'current_longitude'))
+    if not rows:
+        return []
+
+    ids = np.array([row[0] for row in rows])
+    coords = np.array([(float(row[1]), float(row[2])) for row in rows])
+    distances = haversine_km(lat, lng, coords[:, 0], coords[:, 1])
+
+    nearest = np.flatnonzero(distances <= radius)
+    if k and len(nearest) > k:
+        nearest = nearest[np.argpartition(distances[nearest], k - 1)[:k]]
+    nearest = nearest[np.argsort(distances[nearest], kind='stable')]
+
+    riders = UserProfile.objects.select_related('user').in_bulk(ids[nearest].tolist())
+    result = []
+    for index in nearest:
+        rider = riders.get(int(ids[index]))
+        if rider is not None:
+            rider.distance_km = round(float(distances[index]), 3)
+            result.append(rider)
+    return result
@@ -0,0 +1,81 @@
+# delivery/senders.py
+"""
+Sender profiles for orders entered by admins on a customer's behalf.
+
+Senders are identified by their phone number in E.164 form, so one
+customer keeps one profile however the number is typed. A process-local
+LRU maps recently seen numbers to profile ids. A repeat sender then costs a
+single primary-key lookup, and that lookup also checks the stored number,
+so an entry left stale by a phone change or a deleted profile just falls
+through to the phone_e164 index.
+"""
+import threading
+from collections import OrderedDict
+
+from django.contrib.auth.models import User
+
+from .models import UserProfile
+
+SENDER_CACHE_SIZE = 512
+SENDER_TYPES = ('customer', 'both')
+
+_senders = OrderedDict()
+_senders_lock = threading.Lock()
+
+
+def _cached_sender_id(phone_e164):
+    with _senders_lock:
+        profile_id = _senders.get(phone_e164)
+        if profile_id is not None:
+            _senders.move_to_end(phone_e164)
+        return profile_id
+
+
+def _remember_sender(phone_e164, profile_id):
+    with _senders_lock:
+        _senders[phone_e164] = profile_id
+        _senders.move_to_end(phone_e164)
+        while len(_senders) > SENDER_CACHE_SIZE:
+            _senders.popitem(last=False)
+
+
+def _forget_sender(phone_e164):
+    with _senders_lock:
+        _senders.pop(phone_e164, None)
+
+
+def clear_sender_cache():
+    with _senders_lock:
+        _senders.clear()
+
+
+def get_or_create_sender(phone_e164, name, email='', address=''):
+    """Customer profile for an E.164 phone number, created if there is none yet"""
+    senders = UserProfile.objects.select_related('user').filter(
+        phone_e164=phone_e164, user_type__in=SENDER_TYPES
+    )
+    profile_id = _cached_sender_id(phone_e164)
+    if profile_id is not None:
+        profile = senders.filter(pk=profile_id).first()
+        if profile is not None:
+            return profile
+        _forget_sender(phone_e164)
+
+    # Oldest first, in case earlier raw-phone lookups left duplicates
+    profile = senders.order_by('pk').first()
+    if profile is None:
+        names = name.split()
+        user, _ = User.objects.get_or_create(
+            username=f'sender_{phone_e164}',
+            defaults={
+                'email': email,
+                'first_name': names[0] if names else '',
+                'last_name': ' '.join(names[1:]),
+            }
+        )
+        profile, _ = UserProfile.objects.get_or_create(
+            user=user,
+            defaults={'user_type': 'customer', 'phone': phone_e164, 'address': address}
+        )
+    _remember_sender(phone_e164, profile.pk)
+    return profile
@@ -1,6 +1,8 @@
 # delivery/serializers.py
 from rest_framework import serializers
 from .models import Package, Delivery, Payment, UserProfile
+from .phones import normalize_phone
+from .senders import get_or_create_sender
 
 
 class PackageSerializer(serializers.ModelSerializer):
@@ -52,10 +54,10 @@ class DeliverySerializer(serializers.ModelSerializer):
             'estimated_pickup', 'estimated_delivery', 'actual_pickup', 'actual_delivery',
             'status', 'status_display', 'priority', 'priority_display',
             'delivery_fee', 'distance_km', 'estimated_duration_minutes',
-            'notes', 'cancellation_reason', 'created_by', 'created_at', 'updated_at'
+            'notes', 'cancellation_reason', 'cancelled_at', 'created_by', 'created_at', 'updated_at'
         ]
         read_only_fields = [
-            'id', 'tracking_number', 'actual_pickup', 'actual_delivery',
+            'id', 'tracking_number', 'actual_pickup', 'actual_delivery', 'cancelled_at',
             'distance_km', 'estimated_duration_minutes', 'created_at', 'updated_at'
         ]
 
@@ -109,6 +111,10 @@ class DeliveryCreateSerializer(serializers.ModelSerializer):
     # Delivery details
     pickup_address = serializers.CharField(write_only=True)
     delivery_address = serializers.CharField(write_only=True)
+    pickup_latitude = serializers.DecimalField(max_digits=9, decimal_places=6, min_value=-90, max_value=90, required=False, allow_null=True, write_only=True)
+    pickup_longitude = serializers.DecimalField(max_digits=9, decimal_places=6, min_value=-180, max_value=180, required=False, allow_null=True, write_only=True)
+    delivery_latitude = serializers.DecimalField(max_digits=9, decimal_places=6, min_value=-90, max_value=90, required=False, allow_null=True, write_only=True)
+    delivery_longitude = serializers.DecimalField(max_digits=9, decimal_places=6, min_value=-180, max_value=180, required=False, allow_null=True, write_only=True)
     estimated_pickup = serializers.DateTimeField(write_only=True)
     estimated_delivery = serializers.DateTimeField(write_only=True)
     priority = serializers.ChoiceField(choices=[(1, 'Normal'), (2, 'Express'), (3, 'Urgent'), (4, 'Same Day')], write_only=True)
@@ -129,10 +135,18 @@ class DeliveryCreateSerializer(serializers.ModelSerializer):
             'recipient_name', 'recipient_phone', 'recipient_address',
             'package_description', 'package_weight', 'package_length', 'package_width', 'package_height',
             'package_type', 'declared_value', 'special_instructions', 'is_fragile', 'is_perishable', 'requires_signature',
-            'pickup_address', 'delivery_address', 'estimated_pickup', 'estimated_delivery', 'priority', 'delivery_fee',
+            'pickup_address', 'delivery_address', 'pickup_latitude', 'pickup_longitude',
+            'delivery_latitude', 'delivery_longitude',
+            'estimated_pickup', 'estimated_delivery', 'priority', 'delivery_fee',
             'payment_amount', 'payment_method', 'cod_amount', 'rider_id'
         ]
 
+    def validate_sender_phone(self, value):
+        phone = normalize_phone(value)
+        if not phone:
+            raise serializers.ValidationError('Enter a valid phone number.')
+        return phone
+
     def create(self, validated_data):
         # Extract data
         sender_data = {
@@ -165,6 +179,10 @@ class DeliveryCreateSerializer(serializers.ModelSerializer):
         delivery_data = {
             'pickup_address': validated_data['pickup_address'],
             'delivery_address': validated_data['delivery_address'],
+            'pickup_latitude': validated_data.get('pickup_latitude'),
+            'pickup_longitude': validated_data.get('pickup_longitude'),
+            'delivery_latitude': validated_data.get('delivery_latitude'),
+            'delivery_longitude': validated_data.get('delivery_longitude'),
             'estimated_pickup': validated_data['estimated_pickup'],
             'estimated_delivery': validated_data['estimated_delivery'],
             'priority': validated_data['priority'],
@@ -179,32 +197,21 @@ class DeliveryCreateSerializer(serializers.ModelSerializer):
 
         rider_id = validated_data.get('rider_id')
 
-        # Get or create sender UserProfile
-        # For simplicity, we'll create a dummy user if sender doesn't exist
-        # In production, you'd want to search existing users or create properly
-        from django.contrib.auth.models import User
         from django.db import transaction
 
         with transaction.atomic():
-            # Create or get sender user
-            sender_username = f"sender_{sender_data['phone']}"
-            sender_user, created = User.objects.get_or_create(
-                username=sender_username,
-                defaults={
-                    'email': sender_data.get('email', ''),
-                    'first_name': sender_data['name'].split()[0] if sender_data['name'] else '',
-                    'last_name': ' '.join(sender_data['name'].split()[1:]) if len(sender_data['name'].split()) > 1 else ''
-                }
+            sender_profile = get_or_create_sender(
+                sender_data['phone'], sender_data['name'],
+                email=sender_data['email'], address=sender_data['address'],
             )
 
-            sender_profile, created = UserProfile.objects.get_or_create(
-                user=sender_user,
-                defaults={
-                    'user_type': 'customer',
-                    'phone': sender_data['phone'],
-                    'address': sender_data['address']
-                }
-            )
+            # Resolve the rider first so the delivery is inserted already assigned
+            rider = None
+            if rider_id:
+                rider = UserProfile.objects.filter(id=rider_id, user_type__in=['rider', 'both']).first()
+            if rider is not None:
+                delivery_data['rider'] = rider
+                delivery_data['status'] = 'assigned'
 
             # Create package
             package = Package.objects.create(**package_data)
@@ -219,15 +226,6 @@ class DeliveryCreateSerializer(serializers.ModelSerializer):
                 created_by=self.context['request'].user
             )
 
-            if rider_id:
-                try:
-                    rider = UserProfile.objects.get(id=rider_id, user_type__in=['rider', 'both'])
-                    delivery.rider = rider
-                    delivery.status = 'assigned'
-                    delivery.save()
-                except UserProfile.DoesNotExist:
-                    pass  # Ignore invalid rider
-
             # Create payment
             Payment.objects.create(
                 delivery=delivery,
@@ -0,0 +1,32 @@
+# delivery/signals.py
+"""
+Keeps deliveries' admin search documents in step with their sender's
+User row, whose names are copied into every document (see search.py).
+"""
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Delivery
+from .search import rebuild_search_documents
+
+# User columns that appear in a search document
+SEARCH_USER_FIELDS = frozenset({'first_name', 'last_name', 'username'})
+
+
+@receiver(post_save, sender=User, dispatch_uid='delivery_sender_search_documents')
+def rebuild_sender_search_documents(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Rebuild a sender's search documents after they are renamed"""
+    if created or raw:
+        return
+    if update_fields is not None and not SEARCH_USER_FIELDS.intersection(update_fields):
+        return
+
+    deliveries = Delivery.objects.filter(sender__user=instance)
+    # Most saves (logins, profile edits) leave the names alone; every
+    # document carries the same names, so one delivery shows whether they changed
+    latest = deliveries.order_by('-pk').first()
+    if latest is None or latest.build_search_document() == latest.search_document:
+        return
+    for _ in rebuild_search_documents(deliveries):
+        pass
@@ -1,3 +1,292 @@
-from django.test import TestCase
+import threading
+import unittest
+from datetime import timedelta
 
-# Create your tests here.
+import numpy as np
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.tests import make_customer, make_order, make_rider
+from .estimates import estimate_trip
+from .geo import covering_cells, geohash_encode, haversine_km
+from .models import Delivery, DeliveryTrack, UserProfile
+from .phones import normalize_phone
+from .rider_locations import nearest_riders, update_rider_location
+from .tracks import _append, _insert_tracks, decode_track, parse_fixes
+from .transitions import DeliveryTransitionError, assign_rider, change_status, claim_next_delivery
+
+# Nairobi CBD
+CBD = (-1.286389, 36.817223)
+
+
+class GeoTests(SimpleTestCase):
+    def test_geohash_matches_reference(self):
+        self.assertEqual(geohash_encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+
+    def test_haversine_is_vectorised(self):
+        distances = haversine_km(*CBD, [CBD[0], -1.2921], [CBD[1], 36.8219])
+        self.assertAlmostEqual(distances[0], 0.0)
+        self.assertAlmostEqual(distances[1], 0.84, places=1)
+
+    def test_covering_cells_include_points_inside_radius(self):
+        cells = covering_cells(*CBD, 3)
+        for bearing in np.linspace(0, 2 * np.pi, 16):
+            lat = CBD[0] + 0.026 * np.sin(bearing)
+            lng = CBD[1] + 0.026 * np.cos(bearing)
+            self.assertIn(geohash_encode(lat, lng), cells)
+        self.assertIsNone(covering_cells(*CBD, 500))
+
+
+class NearestRidersTests(TestCase):
+    def place(self, username, lat, lng, **fields):
+        rider = make_rider(username)
+        UserProfile.objects.filter(pk=rider.pk).update(**{'is_available': True, **fields})
+        update_rider_location(rider, lat, lng)
+        return rider
+
+    def test_ranks_available_riders_within_radius(self):
+        far = self.place('far_rider', -1.30, 36.83)
+        near = self.place('near_rider', -1.2870, 36.8175)
+        self.place('out_of_range', -1.40, 36.90)
+        self.place('offline', -1.2865, 36.8173, is_available=False)
+        stale = self.place('stale', -1.2866, 36.8174)
+        UserProfile.objects.filter(pk=stale.pk).update(last_location_update=timezone.now() - timedelta(hours=1))
+
+        riders = nearest_riders(*CBD, radius=3)
+        self.assertEqual([rider.pk for rider in riders], [near.pk, far.pk])
+        self.assertLess(riders[0].distance_km, riders[1].distance_km)
+        self.assertEqual(len(nearest_riders(*CBD, radius=3, k=1)), 1)
+        self.assertEqual(nearest_riders(*CBD, radius=3, vehicle_types=['car']), [])
+
+    def test_availability_endpoint_stores_coordinates(self):
+        rider = make_rider('moving_rider')
+        client = APIClient()
+        client.force_authenticate(rider.user)
+
+        response = client.post('/api/mobile/rider/availability/', {'latitude': CBD[0], 'longitude': CBD[1]})
+        self.assertEqual(response.status_code, 200)
+        rider.refresh_from_db()
+        self.assertEqual(rider.location_cell, geohash_encode(*CBD))
+
+        response = client.post('/api/mobile/rider/availability/', {'latitude': 123, 'longitude': 0})
+        self.assertEqual(response.status_code, 400)
+
+
+class LocationBatchTests(TestCase):
+    def setUp(self):
+        self.rider = make_rider('batch_rider')
+        self.delivery = make_order(make_customer('batch_customer'), status='picked_up', rider=self.rider)
+        self.client = APIClient()
+        self.client.force_authenticate(self.rider.user)
+        self.start = timezone.now().replace(microsecond=0) - timedelta(hours=1)
+
+    def fixes(self, first, count):
+        return [
+            {
+                'latitude': CBD[0] + index * 0.0001,
+                'longitude': CBD[1] - index * 0.0001,
+                'timestamp': (self.start + timedelta(seconds=5 * index)).isoformat(),
+            }
+            for index in range(first, first + count)
+        ]
+
+    def test_batch_is_stored_as_one_track_row(self):
+        # 7 statements plus the savepoint around the track insert
+        with self.assertNumQueries(9):
+            response = self.client.post('/api/mobile/rider/locations/', {'fixes': self.fixes(0, 300)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'accepted': 300, 'tracks': 1, 'rejected': 0})
+
+        track = DeliveryTrack.objects.get(delivery=self.delivery)
+        self.assertEqual(track.point_count, 300)
+        self.assertEqual(len(bytes(track.data)), 300 * 12)
+        points = decode_track(track)
+        self.assertEqual(points[0][0], self.start)
+        self.assertEqual(points[-1][0], self.start + timedelta(seconds=5 * 299))
+        self.assertAlmostEqual(points[-1][1], CBD[0] + 299 * 0.0001, places=5)
+        self.assertAlmostEqual(points[-1][2], CBD[1] - 299 * 0.0001, places=5)
+
+        rider = UserProfile.objects.get(pk=self.rider.pk)
+        self.assertAlmostEqual(float(rider.current_latitude), CBD[0] + 299 * 0.0001, places=5)
+        self.assertEqual(rider.last_location_update, points[-1][0])
+
+    def test_overlapping_and_invalid_fixes_are_skipped(self):
+        self.client.post('/api/mobile/rider/locations/', {'fixes': self.fixes(0, 10)}, format='json')
+        batch = self.fixes(5, 10) + [{'latitude': 91, 'longitude': 0, 'timestamp': 0}, {'timestamp': 'soon'}]
+        response = self.client.post('/api/mobile/rider/locations/', {'fixes': batch}, format='json')
+        self.assertEqual(response.data['rejected'], 2)
+
+        track = DeliveryTrack.objects.get(delivery=self.delivery)
+        self.assertEqual(track.point_count, 15)
+        times = [point[0] for point in decode_track(track)]
+        self.assertEqual(times, sorted(set(times)))
+
+        # An old batch arriving late does not move the rider backwards
+        self.client.post('/api/mobile/rider/locations/', {'fixes': self.fixes(0, 2)}, format='json')
+        rider = UserProfile.objects.get(pk=self.rider.pk)
+        self.assertEqual(rider.last_location_update, self.start + timedelta(seconds=5 * 14))
+
+    def test_track_created_concurrently_keeps_the_batch(self):
+        # Another batch inserted the track after this one looked for it
+        concurrent = DeliveryTrack(
+            delivery=self.delivery, rider=self.rider,
+            started_at=self.start, last_recorded_at=self.start, data=b'',
+        )
+        mine = DeliveryTrack(
+            delivery=self.delivery, rider=self.rider,
+            started_at=self.start, last_recorded_at=self.start, data=b'',
+        )
+        fixes = parse_fixes(self.fixes(0, 4))[0]
+        _append(concurrent, fixes[:2])
+        concurrent.save()
+        _append(mine, fixes)
+
+        _insert_tracks([mine], fixes)
+        track = DeliveryTrack.objects.get(delivery=self.delivery)
+        self.assertEqual(track.point_count, 4)
+        self.assertEqual(len(decode_track(track)), 4)
+
+    def test_rejects_oversized_batches(self):
+        response = self.client.post('/api/mobile/rider/locations/', {'fixes': self.fixes(0, 1001)}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ClaimQueueTests(TestCase):
+    def test_claims_most_urgent_first(self):
+        customer = make_customer('claim_customer')
+        normal = make_order(customer)
+        urgent = make_order(customer)
+        Delivery.objects.filter(pk=urgent.pk).update(priority=4)
+        rider = make_rider('claim_rider')
+
+        self.assertEqual(claim_next_delivery(rider, rider.user).pk, urgent.pk)
+        self.assertEqual(claim_next_delivery(rider, rider.user).pk, normal.pk)
+        self.assertIsNone(claim_next_delivery(rider, rider.user))
+        self.assertEqual(Delivery.objects.get(pk=normal.pk).rider, rider)
+        self.assertEqual(normal.status_updates.get().status, 'assigned')
+
+    def test_claim_endpoint_requires_available_rider(self):
+        delivery = make_order(make_customer('endpoint_customer'))
+        rider = make_rider('endpoint_rider')
+        client = APIClient()
+        client.force_authenticate(rider.user)
+
+        self.assertEqual(client.post('/api/rider/claim/').status_code, 403)
+        UserProfile.objects.filter(pk=rider.pk).update(is_available=True)
+        response = client.post('/api/rider/claim/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], delivery.pk)
+        empty = client.post('/api/rider/claim/')
+        self.assertEqual((empty.status_code, empty.content), (204, b''))
+
+    def test_assignment_refuses_finished_deliveries(self):
+        delivery = make_order(make_customer('assign_customer'), status='delivered')
+        rider = make_rider('assign_rider')
+        with self.assertRaises(DeliveryTransitionError):
+            assign_rider(delivery.pk, rider, rider.user)
+
+
+class DeliveryStateMachineTests(TestCase):
+    def setUp(self):
+        self.customer = make_customer('state_customer')
+        self.rider = make_rider('state_rider')
+
+    def test_rejects_transitions_outside_the_table(self):
+        delivery = make_order(self.customer)
+        with self.assertRaises(DeliveryTransitionError):
+            change_status(delivery.pk, 'delivered', self.rider.user)
+        with self.assertRaises(DeliveryTransitionError):
+            change_status(delivery.pk, 'teleported', self.rider.user)
+        self.assertEqual(Delivery.objects.get(pk=delivery.pk).status, 'pending')
+
+    def test_delivery_stamps_timestamps_and_counts_completion(self):
+        delivery = make_order(self.customer)
+        assign_rider(delivery.pk, self.rider, self.rider.user)
+        change_status(delivery.pk, 'picked_up', self.rider.user)
+        pickup = Delivery.objects.get(pk=delivery.pk).actual_pickup
+        self.assertIsNotNone(pickup)
+
+        change_status(delivery.pk, 'delivered', self.rider.user)
+        delivery.refresh_from_db()
+        self.assertEqual(delivery.actual_pickup, pickup)
+        self.assertIsNotNone(delivery.actual_delivery)
+        self.assertEqual(UserProfile.objects.get(pk=self.rider.pk).completed_deliveries, 1)
+        with self.assertRaises(DeliveryTransitionError):
+            change_status(delivery.pk, 'cancelled', self.rider.user)
+
+    def test_cancellation_records_time_and_reason(self):
+        delivery = make_order(self.customer)
+        change_status(delivery.pk, 'cancelled', self.customer.user, reason='Customer changed their mind')
+        delivery.refresh_from_db()
+        self.assertIsNotNone(delivery.cancelled_at)
+        self.assertEqual(delivery.cancellation_reason, 'Customer changed their mind')
+
+    def test_returning_to_pending_clears_the_rider(self):
+        delivery = make_order(self.customer)
+        assign_rider(delivery.pk, self.rider, self.rider.user)
+        change_status(delivery.pk, 'pending', self.rider.user)
+        self.assertIsNone(Delivery.objects.get(pk=delivery.pk).rider_id)
+
+
+class TripEstimateTests(TestCase):
+    def test_save_estimates_distance_and_duration(self):
+        delivery = make_order(make_customer('estimate_customer'))
+        self.assertIsNone(delivery.distance_km)
+
+        delivery.pickup_latitude, delivery.pickup_longitude = -1.2864, 36.8172
+        delivery.delivery_latitude, delivery.delivery_longitude = -1.3100, 36.8350
+        delivery.save()
+        delivery.refresh_from_db()
+        straight_line = haversine_km(-1.2864, 36.8172, [-1.3100], [36.8350])[0]
+        self.assertAlmostEqual(float(delivery.distance_km), straight_line * 1.3, places=2)
+        self.assertGreater(delivery.estimated_duration_minutes, 0)
+
+        # A slower vehicle takes longer over the same distance
+        _, by_bicycle = estimate_trip(-1.2864, 36.8172, -1.3100, 36.8350, 'bicycle')
+        self.assertGreater(by_bicycle, delivery.estimated_duration_minutes)
+        self.assertEqual(estimate_trip(None, 36.8172, -1.3100, 36.8350), (None, None))
+
+
+class PhoneNormalizationTests(SimpleTestCase):
+    def test_formats_normalize_to_e164(self):
+        for phone in ('0712 345 678', '712345678', '254712345678', '00254712345678', '+254 (712) 345-678'):
+            self.assertEqual(normalize_phone(phone), '+254712345678', phone)
+        self.assertEqual(normalize_phone('+44 20 7946 0958'), '+442079460958')
+        self.assertEqual(normalize_phone('020 7946 0958', country_code='44'), '+442079460958')
+        for phone in ('', None, 'n/a', '12345', '+1234567890123456'):
+            self.assertEqual(normalize_phone(phone), '', phone)
+
+
+@unittest.skipUnless(
+    connection.features.has_select_for_update_skip_locked,
+    'Needs a backend with SELECT ... FOR UPDATE SKIP LOCKED'
+)
+class ConcurrentClaimTests(TransactionTestCase):
+    def test_parallel_riders_never_share_a_delivery(self):
+        customer = make_customer('race_customer')
+        deliveries = [make_order(customer) for _ in range(40)]
+        riders = [make_rider(f'race_rider_{index}') for index in range(8)]
+        claimed = []
+        lock = threading.Lock()
+
+        def worker(rider):
+            try:
+                while True:
+                    delivery = claim_next_delivery(rider, rider.user)
+                    if delivery is None:
+                        return
+                    with lock:
+                        claimed.append(delivery.pk)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(rider,)) for rider in riders]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(claimed), sorted(delivery.pk for delivery in deliveries))
+        self.assertFalse(Delivery.objects.filter(status='pending').exists())
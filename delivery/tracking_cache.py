@@ -0,0 +1,50 @@
+# delivery/tracking_cache.py
+import re
+
+from django.core.cache import cache
+from django.db import transaction
+
+# Rendered payloads only live briefly; writes invalidate them explicitly
+TRACKING_CACHE_TIMEOUT = 30
+# Unknown numbers are remembered so scanners cannot drive DB load
+TRACKING_MISS_TIMEOUT = 60
+
+TRACKING_VIEWS = ('api', 'page')
+TRACKING_NUMBER_PATTERN = re.compile(r'^[\w-]{1,50}$')
+
+_NOT_FOUND = '__not_found__'
+
+
+def _cache_key(view, tracking_number):
+    return f'tracking:{view}:{tracking_number}'
+
+
+def get_tracking_snapshot(view, tracking_number, build):
+    """
+    Cached tracking payload of one view, or None if no delivery has the number.
+
+    ``build(tracking_number)`` renders the payload from the database and
+    returns None when the delivery does not exist.
+    """
+    if not TRACKING_NUMBER_PATTERN.match(tracking_number):
+        return None
+
+    key = _cache_key(view, tracking_number)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build(tracking_number)
+        if snapshot is None:
+            cache.set(key, _NOT_FOUND, TRACKING_MISS_TIMEOUT)
+            return None
+        cache.set(key, snapshot, TRACKING_CACHE_TIMEOUT)
+    elif snapshot == _NOT_FOUND:
+        return None
+    return snapshot
+
+
+def invalidate_tracking(tracking_number):
+    """Drop cached tracking payloads (and misses) once the write commits"""
+    if not tracking_number:
+        return
+    keys = [_cache_key(view, tracking_number) for view in TRACKING_VIEWS]
+    transaction.on_commit(lambda: cache.delete_many(keys))
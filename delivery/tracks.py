@@ -0,0 +1,186 @@
+# delivery/tracks.py
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .events import publish_rider_position
+from .geo import geohash_encode
+from .models import UserProfile, Delivery, DeliveryTrack
+from .rider_locations import parse_coordinates
+
+# Track coordinates are stored in 1e-5 degrees (about 1.1 m)
+TRACK_SCALE = 100000
+TRACK_DTYPE = np.dtype('<i4')
+
+MAX_FIXES_PER_BATCH = 1000
+# Fixes stamped further ahead than this are treated as bad device clocks
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+
+# Deliveries whose rider is on the way; fixes are appended to their tracks
+TRACKED_STATUSES = ['assigned', 'accepted', 'picked_up', 'in_transit', 'arrived']
+
+
+def parse_fix_time(value):
+    """Aware datetime from an ISO 8601 string or epoch seconds/milliseconds"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        seconds = value / 1000 if value > 1e11 else value
+        return datetime.fromtimestamp(seconds, tz=dt_timezone.utc)
+    parsed = parse_datetime(str(value))
+    if parsed is None:
+        raise ValueError('Invalid timestamp')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
+
+
+def parse_fixes(raw_fixes):
+    """
+    Validated fixes as a list of (recorded_at, lat, lng) sorted by time,
+    plus the number of entries that were rejected.
+    """
+    latest_allowed = timezone.now() + MAX_CLOCK_SKEW
+    fixes = []
+    rejected = 0
+    for raw in raw_fixes:
+        try:
+            lat, lng = parse_coordinates(raw.get('latitude'), raw.get('longitude'))
+            recorded_at = parse_fix_time(raw.get('timestamp'))
+        except (AttributeError, TypeError, ValueError, OverflowError, OSError):
+            rejected += 1
+            continue
+        if recorded_at > latest_allowed:
+            rejected += 1
+            continue
+        fixes.append((recorded_at, lat, lng))
+    fixes.sort(key=lambda fix: fix[0])
+    return fixes, rejected
+
+
+def encode_points(seconds, lats, lngs, previous=(0, 0, 0)):
+    """
+    Delta-encode fixes already in track units.
+
+    ``previous`` is the (seconds, lat, lng) of the fix before the first one;
+    returns the packed bytes.
+    """
+    columns = np.column_stack([
+        np.diff(np.asarray(seconds, dtype=np.int64), prepend=previous[0]),
+        np.diff(np.asarray(lats, dtype=np.int64), prepend=previous[1]),
+        np.diff(np.asarray(lngs, dtype=np.int64), prepend=previous[2]),
+    ])
+    return columns.astype(TRACK_DTYPE).tobytes()
+
+
+def _absolute(data):
+    """(n, 3) array of absolute (seconds, lat, lng) in track units"""
+    deltas = np.frombuffer(bytes(data), dtype=TRACK_DTYPE).reshape(-1, 3)
+    return np.cumsum(deltas, axis=0, dtype=np.int64)
+
+
+def decode_track(track):
+    """The fixes of a DeliveryTrack as a list of (recorded_at, lat, lng)"""
+    points = _absolute(track.data)
+    return [
+        (track.started_at + timedelta(seconds=int(offset)), lat / TRACK_SCALE, lng / TRACK_SCALE)
+        for offset, lat, lng in points.tolist()
+    ]
+
+
+def _append(track, fixes):
+    """Append time-ordered fixes that are newer than the track's last one"""
+    if track.point_count:
+        fixes = [fix for fix in fixes if fix[0] > track.last_recorded_at]
+    if not fixes:
+        return 0
+
+    points = _absolute(track.data)
+    previous = tuple(points[-1]) if len(points) else (0, 0, 0)
+    track.data = bytes(track.data) + encode_points(
+        [int((fix[0] - track.started_at).total_seconds()) for fix in fixes],
+        [round(fix[1] * TRACK_SCALE) for fix in fixes],
+        [round(fix[2] * TRACK_SCALE) for fix in fixes],
+        previous,
+    )
+    track.point_count += len(fixes)
+    track.last_recorded_at = fixes[-1][0]
+    return len(fixes)
+
+
+def _insert_tracks(new_tracks, fixes):
+    """
+    Insert the first tracks of deliveries, appending to the existing track
+    instead where a concurrent batch created it first
+    """
+    if not new_tracks:
+        return
+    try:
+        with transaction.atomic():
+            DeliveryTrack.objects.bulk_create(new_tracks)
+        return
+    except IntegrityError:
+        pass
+    for track in new_tracks:
+        try:
+            with transaction.atomic():
+                track.save(force_insert=True)
+        except IntegrityError:
+            existing = DeliveryTrack.objects.select_for_update().get(delivery_id=track.delivery_id)
+            if _append(existing, fixes):
+                existing.save(update_fields=['data', 'point_count', 'last_recorded_at', 'updated_at'])
+
+
+def ingest_fixes(rider, fixes):
+    """
+    Store a batch of parsed fixes from one rider.
+
+    The newest fix becomes the rider's current position with a single
+    UPDATE (skipped if a newer position is already stored), and the whole
+    batch is appended to the track of each delivery the rider is working
+    on: one write per delivery, whatever the batch size.
+    """
+    if not fixes:
+        return {'accepted': 0, 'tracks': 0}
+
+    recorded_at, lat, lng = fixes[-1]
+    moved = UserProfile.objects.filter(
+        Q(last_location_update__isnull=True) | Q(last_location_update__lte=recorded_at),
+        pk=rider.pk,
+    ).update(
+        current_latitude=round(lat, 6),
+        current_longitude=round(lng, 6),
+        location_cell=geohash_encode(lat, lng),
+        last_location_update=recorded_at,
+        updated_at=timezone.now(),
+    )
+    if moved:
+        publish_rider_position(rider.pk, lat, lng, recorded_at)
+
+    appended = 0
+    with transaction.atomic():
+        delivery_ids = list(
+            Delivery.objects.filter(rider=rider, status__in=TRACKED_STATUSES).values_list('id', flat=True)
+        )
+        tracks = {
+            track.delivery_id: track
+            for track in DeliveryTrack.objects.select_for_update().filter(delivery_id__in=delivery_ids)
+        }
+        new_tracks = []
+        for delivery_id in delivery_ids:
+            track = tracks.get(delivery_id)
+            if track is None:
+                track = DeliveryTrack(
+                    delivery_id=delivery_id, rider=rider,
+                    started_at=fixes[0][0], last_recorded_at=fixes[0][0], data=b'',
+                )
+                _append(track, fixes)
+                new_tracks.append(track)
+            elif _append(track, fixes):
+                track.save(update_fields=['data', 'point_count', 'last_recorded_at', 'updated_at'])
+            appended += 1
+        _insert_tracks(new_tracks, fixes)
+
+    return {'accepted': len(fixes), 'tracks': appended}
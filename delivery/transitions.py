@@ -0,0 +1,170 @@
+# delivery/transitions.py
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .events import publish_delivery_status
+from .models import UserProfile, Delivery, DeliveryStatusUpdate
+from .tracking_cache import invalidate_tracking
+
+# Allowed next statuses for each status. delivered, failed and cancelled
+# are terminal, matching Delivery.is_active.
+TRANSITIONS = {
+    'pending': ('searching', 'assigned', 'cancelled'),
+    'searching': ('pending', 'assigned', 'cancelled'),
+    'assigned': ('pending', 'assigned', 'accepted', 'picked_up', 'cancelled'),
+    'accepted': ('pending', 'assigned', 'picked_up', 'cancelled'),
+    'picked_up': ('in_transit', 'arrived', 'delivered', 'failed'),
+    'in_transit': ('arrived', 'delivered', 'failed'),
+    'arrived': ('delivered', 'failed'),
+    'delivered': (),
+    'failed': (),
+    'cancelled': (),
+}
+
+# Statuses that need a rider on the delivery
+RIDER_STATUSES = {'assigned', 'accepted', 'picked_up', 'in_transit', 'arrived', 'delivered'}
+
+# Timestamp columns stamped (if still empty) when a delivery enters a status
+STATUS_TIMESTAMPS = {
+    'picked_up': ('actual_pickup',),
+    'in_transit': ('actual_pickup',),
+    'arrived': ('actual_pickup',),
+    'delivered': ('actual_pickup', 'actual_delivery'),
+    'cancelled': ('cancelled_at',),
+}
+
+# Statuses from which a delivery can be (re)assigned to a rider
+ASSIGNABLE_STATUSES = [status for status, targets in TRANSITIONS.items() if 'assigned' in targets]
+
+# How often claim_next_delivery retries after losing a row to another rider
+CLAIM_ATTEMPTS = 5
+
+
+def on_open_run():
+    """
+    Deliveries batched onto a run that has no rider yet. Those are handed
+    out with their run, so single-delivery dispatch leaves them alone.
+    """
+    DeliveryRoute = Delivery.routes.rel.related_model
+    return Q(routes__in=DeliveryRoute.objects.filter(is_active=True, rider__isnull=True))
+
+
+class DeliveryTransitionError(Exception):
+    """Raised when a delivery is not in a state that allows the change"""
+
+
+def can_transition(from_status, to_status):
+    return to_status in TRANSITIONS.get(from_status, ())
+
+
+def _locked(delivery_id):
+    """Lock one delivery row for the rest of the current transaction"""
+    try:
+        return Delivery.objects.select_for_update().get(pk=delivery_id)
+    except Delivery.DoesNotExist:
+        raise DeliveryTransitionError('Delivery not found')
+
+
+def _apply(delivery, new_status, user, location='', notes='', reason='', **fields):
+    """
+    Move a locked delivery to ``new_status`` with one conditional UPDATE.
+
+    Validates the transition, stamps the timestamp/cancellation columns
+    the new status implies, counts completed deliveries on the rider and
+    writes the status-update row. Must run inside a transaction.
+    """
+    expected_status = delivery.status
+    if not can_transition(expected_status, new_status):
+        raise DeliveryTransitionError(f'Cannot change a {expected_status} delivery to {new_status}')
+
+    now = timezone.now()
+    fields['status'] = new_status
+    fields['updated_at'] = now
+    if new_status == 'pending':
+        fields['rider'] = None
+    if 'rider' in fields:
+        rider_id = fields['rider'].pk if fields['rider'] is not None else None
+    else:
+        rider_id = delivery.rider_id
+    if new_status in RIDER_STATUSES and rider_id is None:
+        raise DeliveryTransitionError(f'A rider is required for a {new_status} delivery')
+    for field in STATUS_TIMESTAMPS.get(new_status, ()):
+        if getattr(delivery, field) is None:
+            fields[field] = now
+    if new_status == 'cancelled' and (reason or notes):
+        fields['cancellation_reason'] = reason or notes
+
+    updated = Delivery.objects.filter(pk=delivery.pk, status=expected_status).update(**fields)
+    if not updated:
+        raise DeliveryTransitionError('Delivery was changed by another request')
+    for field, value in fields.items():
+        setattr(delivery, field, value)
+
+    if new_status == 'delivered' and delivery.rider_id:
+        UserProfile.objects.filter(pk=delivery.rider_id).update(
+            completed_deliveries=F('completed_deliveries') + 1
+        )
+    if user is not None:
+        DeliveryStatusUpdate.objects.create(
+            delivery=delivery,
+            status=new_status,
+            location=location,
+            notes=notes,
+            updated_by=user,
+        )
+    invalidate_tracking(delivery.tracking_number)
+    publish_delivery_status(delivery)
+    return delivery
+
+
+def assign_rider(delivery_id, rider, user, notes='', only_if_unassigned=False):
+    """
+    Assign ``rider`` to a delivery that is not yet picked up. With
+    ``only_if_unassigned`` a delivery that already has a rider is refused
+    instead of reassigned.
+    """
+    with transaction.atomic():
+        delivery = _locked(delivery_id)
+        if delivery.status not in ASSIGNABLE_STATUSES:
+            raise DeliveryTransitionError(f'Cannot assign a rider to a {delivery.status} delivery')
+        if only_if_unassigned and delivery.rider_id is not None:
+            raise DeliveryTransitionError('Delivery already has a rider')
+        return _apply(delivery, 'assigned', user, notes=notes, rider=rider)
+
+
+def change_status(delivery_id, new_status, user, location='', notes='', reason=''):
+    """Move a delivery to ``new_status``, serialised against concurrent writers"""
+    if new_status not in TRANSITIONS:
+        raise DeliveryTransitionError(f'Invalid status {new_status}')
+    with transaction.atomic():
+        delivery = _locked(delivery_id)
+        return _apply(delivery, new_status, user, location=location, notes=notes, reason=reason)
+
+
+def claim_next_delivery(rider, user):
+    """
+    Assign the most urgent unassigned pending delivery to ``rider``.
+
+    Candidate rows are locked with SKIP LOCKED, so riders claiming at the
+    same time each take a different row instead of queueing behind one
+    another. Deliveries batched onto an open run are left for the run to
+    be claimed whole. Returns None when the queue is empty.
+    """
+    for _ in range(CLAIM_ATTEMPTS):
+        with transaction.atomic():
+            delivery = (
+                Delivery.objects.select_for_update(skip_locked=True)
+                .filter(status='pending', rider__isnull=True)
+                .exclude(on_open_run())
+                .order_by('-priority', 'estimated_pickup', 'id')
+                .first()
+            )
+            if delivery is None:
+                return None
+            try:
+                return _apply(delivery, 'assigned', user, notes='Claimed by rider', rider=rider)
+            except DeliveryTransitionError:
+                # Only reachable on backends without row locks
+                continue
+    return None
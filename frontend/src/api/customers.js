@@ -84,6 +84,11 @@ export const customerAPI = {
       params: { tracking_number: trackingNumber }
     })
   },
+
+  // Live tracking stream (Server-Sent Events) for one order
+  trackOrderStream(trackingNumber) {
+    return new EventSource(`${api.defaults.baseURL}/stream/track/${encodeURIComponent(trackingNumber)}/`)
+  },
   
   // Get specific order details
   getOrder(orderId) {
@@ -0,0 +1,23 @@
+# Index auth_user.email for the duplicate-email check in customer_register
+# (main/views_customer.py). This deliberately adds an index to a table
+# owned by django.contrib.auth, which has no migrations of its own to put
+# it in, so it lives with the app whose view needs it.
+
+from django.db import migrations
+
+INDEX_NAME = 'main_auth_user_email_idx'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('main', '0002_create_roles'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON auth_user (email)',
+            f'DROP INDEX IF EXISTS {INDEX_NAME}',
+        ),
+    ]
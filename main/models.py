@@ -2,6 +2,8 @@ from django.db import models
 from django.contrib.auth.models import User
 import json
 
+from core.cache_versions import bump_version
+
 
 class Role(models.Model):
     """User roles with permissions"""
@@ -22,6 +24,17 @@ class Role(models.Model):
         """Check if role has specific permission"""
         return self.permissions.get(permission_key, False)
 
+    def save(self, *args, **kwargs):
+        """Override save to invalidate cached permissions"""
+        super().save(*args, **kwargs)
+        bump_version('permissions')
+
+    def delete(self, *args, **kwargs):
+        """Override delete to invalidate cached permissions"""
+        result = super().delete(*args, **kwargs)
+        bump_version('permissions')
+        return result
+
 
 class UserRole(models.Model):
     """Link users to roles"""
@@ -37,6 +50,17 @@ class UserRole(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.role.name}"
 
+    def save(self, *args, **kwargs):
+        """Override save to invalidate cached permissions"""
+        super().save(*args, **kwargs)
+        bump_version('permissions')
+
+    def delete(self, *args, **kwargs):
+        """Override delete to invalidate cached permissions"""
+        result = super().delete(*args, **kwargs)
+        bump_version('permissions')
+        return result
+
     @property
     def has_permission(self):
         """Delegate permission check to role"""
@@ -1,3 +1,44 @@
-from django.test import TestCase
+import json
+import logging
+import os
+import tempfile
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from core.logging_utils import BufferedLogWriter
+
+
+class BufferedLogWriterTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'api_errors.log')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read_records(self, path=None):
+        with open(path or self.path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_writes_json_lines_above_level(self):
+        writer = BufferedLogWriter({'api': self.path}, level=logging.INFO)
+        writer.submit('api', logging.DEBUG, 'request dump')
+        writer.submit('api', logging.INFO, 'registration successful')
+        writer.submit('api', logging.ERROR, {'error': 'boom'})
+        self.assertTrue(writer.flush(timeout=5))
+
+        records = self.read_records()
+        self.assertEqual([record['level'] for record in records], ['INFO', 'ERROR'])
+        self.assertEqual(records[1]['message'], {'error': 'boom'})
+        self.assertEqual(writer.stats()['written'], 2)
+
+    def test_rotates_by_size_and_prunes_backups(self):
+        writer = BufferedLogWriter({'api': self.path}, max_bytes=200, backup_count=2)
+        for index in range(20):
+            writer.submit('api', logging.ERROR, f'error number {index}')
+            writer.flush(timeout=5)
+
+        backups = [name for name in os.listdir(self.tmp.name) if name.startswith('api_errors.log.')]
+        self.assertEqual(len(backups), 2)
+        self.assertLessEqual(os.path.getsize(self.path), 200)
+        self.assertEqual(self.read_records()[-1]['message'], 'error number 19')
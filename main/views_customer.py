@@ -6,9 +6,14 @@ from django.contrib.auth.models import User
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 import json
+import logging
 import uuid
 from delivery.models import UserProfile, Package, Delivery, Payment
+from admin_panel.pricing import quote_order
 from core.logging_utils import log_api_error, log_app_error, log_db_error
+from delivery.estimates import parse_trip_coordinates
+from delivery.idempotency import idempotent
+from delivery.tracking_cache import get_tracking_snapshot
 
 def customer_register(request):
     """Customer registration page"""
@@ -24,7 +29,7 @@ def customer_register(request):
             user_type = data.get('user_type', 'customer')
             
             # Check if user exists
-            if UserProfile.objects.filter(user__email=email).exists():
+            if User.objects.filter(email=email, profile__isnull=False).exists():
                 log_app_error('User with this email already exists')
                 return JsonResponse({'error': 'User with this email already exists'}, status=400)
             
@@ -50,7 +55,7 @@ def customer_register(request):
                     identity_number=data.get('identity_number'),
                     status='pending_approval'
                 )
-                log_app_error(f'Rider registration successful for {email}')
+                log_app_error(f'Rider registration successful for {email}', level=logging.INFO)
                 return JsonResponse({'message': 'Rider registration successful. Waiting for approval.'})
             else:
                 user_profile = UserProfile.objects.create(
@@ -61,7 +66,7 @@ def customer_register(request):
                     preferred_language=data.get('preferred_language', 'en'),
                     push_enabled=data.get('push_enabled', True)
                 )
-                log_app_error(f'Customer registration successful for {email}')
+                log_app_error(f'Customer registration successful for {email}', level=logging.INFO)
                 return JsonResponse({'message': 'Customer registered successfully'})
             
         except Exception as e:
@@ -135,52 +140,105 @@ def create_order(request):
             data = json.loads(request.body)
             email = request.session['customer_email']
             user_profile = UserProfile.objects.get(user__email=email)
-            
-            # Create package
-            package = Package.objects.create(
-                description=data['package']['description'],
-                weight=data['package']['weight'],
-                dimensions=data['package']['dimensions'],
-                package_type=data['package']['package_type'],
-                value=data['package'].get('value', 0),
-                special_instructions=data['package'].get('special_instructions', '')
-            )
-            
-            # Calculate delivery fee
-            delivery_fee = float(data['package']['weight']) * 10
-            
-            # Create delivery
-            delivery = Delivery.objects.create(
-                tracking_number=f"PKG{uuid.uuid4().hex[:12].upper()}",
-                package=package,
-                pickup_address=data['delivery']['pickup_address'],
-                delivery_address=data['delivery']['delivery_address'],
-                estimated_pickup=data['delivery']['estimated_pickup'],
-                estimated_delivery=data['delivery']['estimated_delivery'],
-                priority=data['delivery'].get('priority', 1),
-                delivery_fee=delivery_fee,
-                created_by=user_profile.user
-            )
-            
-            # Create payment
-            payment = Payment.objects.create(
-                delivery=delivery,
-                amount=data['payment'].get('amount', delivery_fee),
-                payment_method=data['payment']['payment_method'],
-                status='pending'
-            )
-            
-            return JsonResponse({
-                'message': 'Order created successfully',
-                'tracking_number': delivery.tracking_number
-            })
-            
         except Exception as e:
             log_app_error(f'Error during order creation: {str(e)}')
             return JsonResponse({'error': str(e)}, status=400)
+
+        # Package, delivery and payment are created in one transaction, once per Idempotency-Key
+        return idempotent(
+            request, 'customer_create_order', user_profile.user, data,
+            lambda: _create_order(user_profile, data),
+            lambda body, status: JsonResponse(body, status=status, safe=False),
+        )
     
     return JsonResponse({'error': 'Invalid request'}, status=400)
 
+
+def _create_order(user_profile, data):
+    """Create the package, delivery and payment of a session order"""
+    try:
+        # Create package
+        package = Package.objects.create(
+            description=data['package']['description'],
+            weight=data['package']['weight'],
+            dimensions=data['package']['dimensions'],
+            package_type=data['package']['package_type'],
+            value=data['package'].get('value', 0),
+            special_instructions=data['package'].get('special_instructions', '')
+        )
+        
+        coordinates = parse_trip_coordinates(data['delivery'])
+        delivery_fee = quote_order({
+            **data['package'],
+            'priority': data['delivery'].get('priority', 1),
+            **coordinates,
+        })['delivery_fee']
+        
+        # Create delivery
+        delivery = Delivery.objects.create(
+            tracking_number=f"PKG{uuid.uuid4().hex[:12].upper()}",
+            package=package,
+            pickup_address=data['delivery']['pickup_address'],
+            delivery_address=data['delivery']['delivery_address'],
+            estimated_pickup=data['delivery']['estimated_pickup'],
+            estimated_delivery=data['delivery']['estimated_delivery'],
+            priority=data['delivery'].get('priority', 1),
+            delivery_fee=delivery_fee,
+            created_by=user_profile.user,
+            **coordinates
+        )
+        
+        # Create payment
+        payment = Payment.objects.create(
+            delivery=delivery,
+            amount=data['payment'].get('amount', delivery_fee),
+            payment_method=data['payment']['payment_method'],
+            status='pending'
+        )
+        
+        return JsonResponse({
+            'message': 'Order created successfully',
+            'tracking_number': delivery.tracking_number
+        })
+        
+    except Exception as e:
+        log_app_error(f'Error during order creation: {str(e)}')
+        return JsonResponse({'error': str(e)}, status=400)
+
+def build_order_tracking_data(tracking_number):
+    """Render the tracking page payload, or None for an unknown number"""
+    delivery = Delivery.objects.select_related('package', 'payment').filter(
+        tracking_number=tracking_number
+    ).first()
+    if delivery is None:
+        return None
+
+    order_data = {
+        'tracking_number': delivery.tracking_number,
+        'status': delivery.status,
+        'package': {
+            'description': delivery.package.description,
+            'weight': delivery.package.weight,
+            'package_type': delivery.package.package_type
+        },
+        'delivery_address': delivery.delivery_address,
+        'estimated_delivery': delivery.estimated_delivery,
+        'created_at': delivery.created_at
+    }
+
+    # Add payment info
+    try:
+        payment = delivery.payment
+        order_data['payment'] = {
+            'amount': payment.amount,
+            'payment_method': payment.payment_method,
+            'status': payment.status
+        }
+    except Payment.DoesNotExist:
+        order_data['payment'] = None
+
+    return order_data
+
 @csrf_exempt
 def track_order(request):
     """Track order by tracking number"""
@@ -189,38 +247,12 @@ def track_order(request):
         if not tracking_number:
             return JsonResponse({'error': 'Tracking number required'}, status=400)
         
-        try:
-            delivery = Delivery.objects.get(tracking_number=tracking_number)
-            
-            order_data = {
-                'tracking_number': delivery.tracking_number,
-                'status': delivery.status,
-                'package': {
-                    'description': delivery.package.description,
-                    'weight': delivery.package.weight,
-                    'package_type': delivery.package.package_type
-                },
-                'delivery_address': delivery.delivery_address,
-                'estimated_delivery': delivery.estimated_delivery,
-                'created_at': delivery.created_at
-            }
-            
-            # Add payment info
-            try:
-                payment = Payment.objects.get(delivery=delivery)
-                order_data['payment'] = {
-                    'amount': payment.amount,
-                    'payment_method': payment.payment_method,
-                    'status': payment.status
-                }
-            except Payment.DoesNotExist:
-                order_data['payment'] = None
-            
-            return JsonResponse(order_data)
-            
-        except Delivery.DoesNotExist:
+        order_data = get_tracking_snapshot('page', tracking_number, build_order_tracking_data)
+        if order_data is None:
             log_app_error('Delivery not found during tracking')
             return JsonResponse({'error': 'Delivery not found'}, status=404)
+
+        return JsonResponse(order_data)
         
     log_app_error('Invalid request during order tracking')
     return JsonResponse({'error': 'Invalid request'}, status=400)
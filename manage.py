@@ -2,11 +2,15 @@
 """Django's command-line utility for administrative tasks."""
 import os
 import sys
+import tempfile
 
 
 def main():
     """Run administrative tasks."""
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
+    if sys.argv[1:2] == ['test']:
+        # Keep the log files written during test runs out of the working tree
+        os.environ.setdefault('LOG_DIR', tempfile.mkdtemp(prefix='pindrop-test-logs-'))
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
@@ -2,6 +2,7 @@
 from datetime import timedelta
 from pathlib import Path
 import os
+from corsheaders.defaults import default_headers
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -88,6 +89,20 @@ DATABASES = {
     }
 }
 
+# Cache
+# Version counters for cached settings/permissions live here. With a shared
+# backend (e.g. CACHE_BACKEND=django.core.cache.backends.redis.RedisCache) a
+# write invalidates every worker at once; with the per-process default the
+# counters expire after LOCAL_CACHE_VERSION_TTL seconds instead, which bounds
+# how long other workers keep serving old settings and permissions.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'pindrop'),
+    }
+}
+LOCAL_CACHE_VERSION_TTL = int(os.getenv('LOCAL_CACHE_VERSION_TTL', '30'))
+
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = os.getenv('MAIL_HOST', 'smtp.office365.com')
@@ -134,6 +149,10 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 CORS_ALLOW_CREDENTIALS = True
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+
+# Bulk order manifests can be posted as JSON bodies of a few MB
+DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024
 
 # Static files
 STATIC_URL = 'static/'
@@ -153,4 +172,24 @@ CRISPY_TEMPLATE_PACK = "bootstrap5"
 # Debug Toolbar
 INTERNAL_IPS = ['127.0.0.1', 'localhost']
 
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Analytics
+# Day/week/month buckets on the admin dashboard are computed in this zone
+ANALYTICS_TIME_ZONE = os.getenv('ANALYTICS_TIME_ZONE', 'Africa/Nairobi')
+
+# Real-time events
+# 'local' only reaches subscribers in the publishing process; use
+# 'postgres' (LISTEN/NOTIFY) when serving from more than one process
+EVENT_BACKEND = os.getenv('EVENT_BACKEND', 'local')
+
+# Trip estimates
+# Road distance is taken as the straight-line distance times this factor
+DELIVERY_DETOUR_FACTOR = float(os.getenv('DELIVERY_DETOUR_FACTOR', '1.3'))
+
+# Idempotency-Key responses are replayed for this long
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.getenv('IDEMPOTENCY_KEY_TTL_HOURS', '24'))
+
+# Phone numbers
+# Country calling code assumed for numbers entered without one
+PHONE_DEFAULT_COUNTRY_CODE = os.getenv('PHONE_DEFAULT_COUNTRY_CODE', '254')